@@ -0,0 +1,167 @@
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+LOCK_KEY = "cache_guard:lock:{}"
+METRIC_KEY = "cache_guard:metrics:{}:{}:{}"
+METRIC_BUCKET_SECONDS = 60
+METRIC_TTL = 60 * 60 * 2
+METRICS = ('hit', 'miss', 'stale', 'early_refresh', 'lock_wait', 'lock_timeout')
+
+
+class CacheGuard:
+    """
+    Keeps the workers from all recomputing the same cache entry at once
+    when it expires or is invalidated at peak.
+
+    Recomputation is single-flight: the worker that takes the entry's lock
+    (a cache.add, so it holds across processes) computes it, and the others
+    serve the entry they already have, however stale, until it is stored
+    again; with no entry to serve, or with `serve_stale` off, they wait for
+    it instead, and compute it themselves only if that takes longer than
+    CACHE_LOCK_WAIT seconds. Entries are also refreshed early, at random,
+    as they near their expiry (the XFetch rule: the longer an entry took to
+    compute, the earlier it may be refreshed), so a busy entry is usually
+    recomputed by one worker while the others are still served the old one.
+
+    Entries are dicts. The guard adds the time the entry took to compute
+    and when it expires, and keeps it CACHE_STALE_TIMEOUT seconds past
+    that so there is something to serve while it is recomputed.
+    """
+
+    def __init__(self, name, serve_stale=True):
+        self.name = name
+        self.serve_stale = serve_stale
+
+    def _count(self, metric, amount=1):
+        if not amount:
+            return
+        key = METRIC_KEY.format(self.name, metric, int(time.time() // METRIC_BUCKET_SECONDS))
+        try:
+            try:
+                cache.incr(key, amount)
+            except ValueError:
+                if not cache.add(key, amount, METRIC_TTL):
+                    cache.incr(key, amount)
+        except Exception as e:
+            print(f"Cache metric update failed: {e}")
+
+    def _due(self, entry, now):
+        """Whether `entry` is expired, or picked for an early refresh."""
+        expires = entry.get('expires')
+        if expires is None:
+            return False
+        early = -entry.get('delta', 0) * settings.CACHE_EARLY_REFRESH_BETA * math.log(1 - random.random())
+        return now + early >= expires
+
+    def _acquire(self, keys):
+        """The locks taken among those of `keys`, by key."""
+        locks = {}
+        for key in keys:
+            token = uuid.uuid4().hex
+            if cache.add(LOCK_KEY.format(key), token, settings.CACHE_LOCK_TIMEOUT):
+                locks[key] = token
+        return locks
+
+    def _release(self, locks):
+        # Only the locks still ours: one that outlived CACHE_LOCK_TIMEOUT may have been taken by another worker.
+        held = cache.get_many([LOCK_KEY.format(key) for key in locks])
+        cache.delete_many([
+            LOCK_KEY.format(key) for key, token in locks.items() if held.get(LOCK_KEY.format(key)) == token
+        ])
+
+    def _wait(self, keys, is_current):
+        """
+        The entries of `keys` stored by other workers within CACHE_LOCK_WAIT
+        seconds, by key. Keys whose lock is released without an entry, as
+        when the computation failed, are not waited for any longer.
+        """
+        deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+        pending, found = list(keys), {}
+        while pending and time.monotonic() < deadline:
+            time.sleep(settings.CACHE_LOCK_POLL)
+            now = time.time()
+            values = cache.get_many(pending + [LOCK_KEY.format(key) for key in pending])
+            entries = is_current({key: values[key] for key in pending if key in values})
+            found.update((key, entry) for key, entry in entries.items() if entry.get('expires', now + 1) > now)
+            pending = [key for key in pending if key not in found and LOCK_KEY.format(key) in values]
+        return found
+
+    def get_many(self, keys, build, timeout, is_current=None):
+        """
+        The entries of `keys`, by key. `build` is called with the keys to
+        compute and returns their entries by key; keys it leaves out are
+        missing from the result as well, and are not stored. `is_current`
+        is called with entries by key and returns those still valid, e.g.
+        by their tag versions; entries are only checked for expiry without
+        it.
+        """
+        is_current = is_current or (lambda entries: entries)
+        now = time.time()
+        found = cache.get_many(keys)
+        current = is_current(found)
+        entries = {key: entry for key, entry in current.items() if not self._due(entry, now)}
+        self._count('hit', len(entries))
+        wanted = [key for key in keys if key not in entries]
+        if not wanted:
+            return entries
+
+        self._count('early_refresh', sum(1 for key in wanted if key in current and current[key]['expires'] > now))
+        locks = self._acquire(wanted)
+        others = [key for key in wanted if key not in locks]
+        if self.serve_stale:
+            stale = {key: found[key] for key in others if key in found}
+        else:
+            # Only the entries picked for an early refresh, which are still current and unexpired.
+            stale = {key: current[key] for key in others if key in current and current[key].get('expires', now + 1) > now}
+        entries.update(stale)
+        self._count('stale', len(stale))
+
+        waiting = [key for key in others if key not in stale]
+        if waiting:
+            self._count('lock_wait', len(waiting))
+            entries.update(self._wait(waiting, is_current))
+        # Keys whose lock holder took too long are computed here as well, without the lock.
+        late = [key for key in waiting if key not in entries]
+        self._count('lock_timeout', len(late))
+
+        computing = list(locks) + late
+        if not computing:
+            return entries
+        self._count('miss', len(computing))
+        try:
+            started = time.monotonic()
+            built = build(computing)
+            delta = time.monotonic() - started
+            expires = time.time() + timeout
+            for entry in built.values():
+                entry.update(delta=delta, expires=expires)
+            cache.set_many(built, timeout + settings.CACHE_STALE_TIMEOUT)
+        finally:
+            self._release(locks)
+        entries.update(built)
+        return entries
+
+    def get(self, key, build, timeout, is_current=None):
+        """The entry of `key`, computed by calling `build()`, or None if it returns None."""
+        def build_many(keys):
+            entry = build()
+            return {} if entry is None else {key: entry}
+        return self.get_many([key], build_many, timeout, is_current).get(key)
+
+    def metrics(self, minutes=15):
+        """Per-metric totals over the last `minutes` minutes, with the share of lookups answered from the cache."""
+        bucket = int(time.time() // METRIC_BUCKET_SECONDS)
+        buckets = range(bucket - minutes + 1, bucket + 1)
+        values = cache.get_many([METRIC_KEY.format(self.name, metric, b) for metric in METRICS for b in buckets])
+        totals = {
+            metric: sum(values.get(METRIC_KEY.format(self.name, metric, b), 0) for b in buckets)
+            for metric in METRICS
+        }
+        lookups = totals['hit'] + totals['stale'] + totals['miss']
+        totals['hit_rate'] = round((totals['hit'] + totals['stale']) / lookups, 4) if lookups else 0.0
+        return totals
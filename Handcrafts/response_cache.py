@@ -0,0 +1,169 @@
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .cache_guard import CacheGuard
+
+RESPONSE_CACHE_KEY = "response_cache:response:{}"
+FRAGMENT_CACHE_KEY = "response_cache:fragment:{}"
+TAG_VERSION_CACHE_KEY = "response_cache:tag:{}"
+
+
+def _tag_key(tag):
+    return TAG_VERSION_CACHE_KEY.format(tag)
+
+
+def tag_versions(tags):
+    """The current version of each of `tags`, creating the missing ones."""
+    keys = {_tag_key(tag): tag for tag in tags}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in found.items()}
+
+
+def current_entries(entries):
+    """The entries, by key, whose tag versions are all still current, checked with one cache read."""
+    tag_keys = {_tag_key(tag) for entry in entries.values() for tag in entry['tags']}
+    current = cache.get_many(tag_keys) if tag_keys else {}
+    return {
+        key: entry for key, entry in entries.items()
+        if all(current.get(_tag_key(tag)) == version for tag, version in entry['tags'].items())
+    }
+
+
+def invalidate_tags(*tags):
+    """Drops every response and fragment tagged with any of `tags`."""
+    if tags:
+        cache.delete_many([_tag_key(tag) for tag in set(tags)])
+
+
+class TaggedResponseCache:
+    """
+    Rendered GET responses in the shared cache, each tagged with the data it
+    was built from (e.g. 'products:category:4', 'warehouses').
+
+    Every tag has a version token in the cache. An entry remembers the
+    versions of its tags as they were before the response was computed and
+    is served only while they are all unchanged, so invalidate() drops every
+    entry of a tag at once, across processes, with a single delete. The
+    versions are random tokens rather than counters, so a token evicted
+    from the cache can never come back with a value an old entry expects.
+    """
+
+    def __init__(self, timeout=None):
+        self._timeout = timeout
+
+    @property
+    def timeout(self):
+        return self._timeout if self._timeout is not None else settings.RESPONSE_CACHE_TIMEOUT
+
+    def key(self, request):
+        # Keyed on what the response depends on besides the tags: the URL and the format asked for.
+        raw = f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+        return RESPONSE_CACHE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+    def invalidate(self, *tags):
+        """Drops every entry tagged with any of `tags`."""
+        invalidate_tags(*tags)
+
+    def page(self, tags, timeout=None):
+        """
+        Decorates a view method like cache_page, with tagged entries.
+        `tags` is a list of tags, or a function of (view, request) returning
+        them, called only when the response has to be computed. Concurrent
+        misses of one URL are computed once, through response_guard.
+        """
+        response_cache = self if timeout is None else TaggedResponseCache(timeout)
+
+        def decorator(view_method):
+            @wraps(view_method)
+            def wrapper(view, request, *args, **kwargs):
+                if request.method != 'GET':
+                    return view_method(view, request, *args, **kwargs)
+
+                computed = {}
+
+                def build():
+                    # Read before computing, so an invalidation that lands meanwhile leaves the entry outdated.
+                    versions = tag_versions(tags(view, request) if callable(tags) else tags)
+                    response = computed['response'] = view_method(view, request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return None
+                    if hasattr(response, 'render'):
+                        # Rendered now rather than on the way out, so the entry is stored before the lock is released.
+                        response = view.finalize_response(request, response, *args, **kwargs).render()
+                    return {
+                        'tags': versions,
+                        'status': response.status_code,
+                        'content': response.content,
+                        'content_type': response['Content-Type'],
+                    }
+
+                entry = response_guard.get(response_cache.key(request), build, response_cache.timeout, current_entries)
+                if 'response' in computed:
+                    return computed['response']
+                return HttpResponse(entry['content'], status=entry['status'], content_type=entry['content_type'])
+            return wrapper
+        return decorator
+
+
+class FragmentCache:
+    """
+    Parts of responses, such as the public card of a supplier or the ids of
+    the suppliers one user follows, cached and tagged one by one like the
+    entries of TaggedResponseCache, so that a view can compose a response
+    from shared fragments and a small per-user overlay, each invalidated on
+    its own.
+    """
+
+    def __init__(self, timeout=None):
+        self._timeout = timeout
+
+    @property
+    def timeout(self):
+        return self._timeout if self._timeout is not None else settings.RESPONSE_CACHE_TIMEOUT
+
+    def get_many(self, names, build, tags):
+        """
+        The value of each of `names`, by name. `build` is called with the
+        names that are not cached and returns their values by name; names
+        it leaves out are missing from the result as well. `tags` is called
+        with a name and returns the tags of its value.
+        """
+        keys = {FRAGMENT_CACHE_KEY.format(name): name for name in names}
+        values = {}
+
+        def build_entries(missing_keys):
+            missing = [keys[key] for key in missing_keys]
+            name_tags = {name: list(tags(name)) for name in missing}
+            # Read before building, so an invalidation that lands meanwhile leaves the fragments outdated.
+            versions = tag_versions({tag for tagged in name_tags.values() for tag in tagged})
+            built = build(missing)
+            values.update(built)
+            return {
+                FRAGMENT_CACHE_KEY.format(name): {'tags': {tag: versions[tag] for tag in name_tags[name]}, 'value': value}
+                for name, value in built.items()
+                if all(tag in versions for tag in name_tags[name])
+            }
+
+        entries = fragment_guard.get_many(list(keys), build_entries, self.timeout, current_entries)
+        values.update((keys[key], entry['value']) for key, entry in entries.items())
+        return values
+
+    def get(self, name, build, tags):
+        """The value of `name`, built by calling `build()` when it is not cached, with `tags`."""
+        return self.get_many([name], lambda names: {name: build()}, lambda name: tags)[name]
+
+
+response_guard = CacheGuard('responses')
+fragment_guard = CacheGuard('fragments')
+response_cache = TaggedResponseCache()
+fragment_cache = FragmentCache()
@@ -65,6 +65,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Static file handling for production
     'whitenoise.runserver_nostatic',
@@ -251,7 +252,19 @@ CACHES = {
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         }
-    }
+    },
+    # Order number sequences (orders/numbering.py). A counter that is evicted
+    # or flushed restarts its minute and reissues numbers that then clash on
+    # checkout, so give them a Redis database of their own, never cleared with
+    # the cache, on an instance with maxmemory-policy noeviction (the keys
+    # carry a TTL, so volatile-* policies would evict them too).
+    "order_numbers": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": env('ORDER_NUMBER_REDIS_URL', default=REDIS_URL),
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        }
+    },
 }
 # --- Session configuration ---
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
@@ -265,12 +278,87 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'recommendations.tasks.update_recommendations_task',
         'schedule': crontab(hour=1, minute=30), # Runs every day at 1:30 AM
     },
-    'cancel-pending-orders': {
-        'task': 'orders.tasks.cancel_pending_credit_card_orders_task',
-        'schedule': crontab(hour=0, minute=0),  # Run every day at midnight
+    'release-expired-stock-reservations': {
+        'task': 'orders.tasks.release_expired_stock_reservations_task',
+        'schedule': crontab(minute='*/5'),  # Runs every 5 minutes
+    },
+    'settle-delivered-shipments': {
+        'task': 'orders.tasks.settle_delivered_shipments_task',
+        'schedule': crontab(minute='*'),  # Runs every minute
+    },
+    'roll-up-ledger-shards': {
+        'task': 'returnrequest.tasks.roll_up_ledger_shards_task',
+        'schedule': crontab(minute='*/10'),  # Runs every 10 minutes
+    },
+    'flush-cart-store': {
+        'task': 'orders.tasks.flush_cart_store_task',
+        'schedule': crontab(minute='*'),  # Runs every minute
+    },
+    'reconcile-coupon-counters': {
+        'task': 'orders.tasks.reconcile_coupon_counters_task',
+        'schedule': crontab(minute='*/10'),  # Runs every 10 minutes
     },
 }
 
+# --- Stock Reservations ---
+# How long stock is held for a pending credit card checkout. The Stripe
+# checkout session expires at the same time, so it must be at least 30 minutes.
+STOCK_RESERVATION_TTL = timedelta(minutes=env.int('STOCK_RESERVATION_TTL_MINUTES', default=60))
+
+# --- Ledger ---
+# System account that takes the other side of money entering or leaving the
+# wallets (card payments, cash on delivery, payouts), so every entry balances.
+LEDGER_CLEARING_ACCOUNT_EMAIL = env('LEDGER_CLEARING_ACCOUNT_EMAIL', default='clearing@craft.com')
+# The platform account that collects Craft's cut of every order.
+PLATFORM_ACCOUNT_EMAIL = env('PLATFORM_ACCOUNT_EMAIL', default='CraftEG@craft.com')
+# Postings credit one of this many sub-accounts of the platform and clearing
+# accounts instead of their single headline row; a periodic task rolls them up.
+LEDGER_ACCOUNT_SHARDS = env.int('LEDGER_ACCOUNT_SHARDS', default=16)
+# Delivered shipments are settled in batches of this size, every minute or as
+# soon as this many are waiting.
+SETTLEMENT_BATCH_SIZE = env.int('SETTLEMENT_BATCH_SIZE', default=500)
+
+# --- Cart Store ---
+# Carts live in Redis and are written back to the database every minute, this
+# many carts per batch. A cart untouched for CART_STORE_TTL seconds is dropped
+# from Redis and reloaded from the database on its next use.
+CART_FLUSH_BATCH_SIZE = env.int('CART_FLUSH_BATCH_SIZE', default=500)
+CART_STORE_TTL = env.int('CART_STORE_TTL', default=60 * 60 * 24 * 30)
+
+# --- Autocomplete ---
+# Every web worker keeps an in-memory index of product and category names for
+# search suggestions. Changes made by other workers are picked up at most this
+# many seconds late, and the index is rebuilt from the database at this interval
+# so popularity stays current.
+AUTOCOMPLETE_SYNC_INTERVAL = env.int('AUTOCOMPLETE_SYNC_INTERVAL', default=1)
+AUTOCOMPLETE_REBUILD_INTERVAL = env.int('AUTOCOMPLETE_REBUILD_INTERVAL', default=60 * 60)
+
+# --- Fuzzy Search ---
+# With ?fuzzy=1 product names match when the trigram word similarity of the
+# search to part of the name reaches this value (0 to 1; pg_trgm's own default
+# is 0.6). Lower values tolerate more typos and return more noise.
+FUZZY_SEARCH_THRESHOLD = env.float('FUZZY_SEARCH_THRESHOLD', default=0.4)
+
+# --- Response Cache ---
+# Lifetime of the tagged response cache entries (Handcrafts/response_cache.py).
+# Model signals drop the entries whose data changed, so this only bounds how
+# long unused entries are kept.
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', default=60 * 60 * 24 * 7)
+
+# --- Cache Stampede Protection ---
+# Cached responses, fragments and cart quotes (Handcrafts/cache_guard.py) are
+# recomputed by one worker at a time, under a lock held for at most
+# CACHE_LOCK_TIMEOUT seconds. The others serve the previous entry, kept
+# CACHE_STALE_TIMEOUT seconds past its expiry, or poll every CACHE_LOCK_POLL
+# seconds for up to CACHE_LOCK_WAIT seconds before computing it themselves.
+# Entries are refreshed early at random as they near their expiry; a higher
+# CACHE_EARLY_REFRESH_BETA refreshes them earlier.
+CACHE_LOCK_TIMEOUT = env.int('CACHE_LOCK_TIMEOUT', default=30)
+CACHE_LOCK_WAIT = env.float('CACHE_LOCK_WAIT', default=3)
+CACHE_LOCK_POLL = env.float('CACHE_LOCK_POLL', default=0.05)
+CACHE_STALE_TIMEOUT = env.int('CACHE_STALE_TIMEOUT', default=60 * 5)
+CACHE_EARLY_REFRESH_BETA = env.float('CACHE_EARLY_REFRESH_BETA', default=1.0)
+
 
 # ==============================================================================
 # STATIC & MEDIA FILES
@@ -0,0 +1,97 @@
+from django.contrib.contenttypes.models import ContentType
+
+from Handcrafts.response_cache import fragment_cache
+from products.cache_tags import products_tag
+from products.models import ProductCard
+from .models import Follow, Supplier
+
+
+def supplier_tag(supplier_id):
+    return f"supplier:{supplier_id}"
+
+
+def user_tag(user_id):
+    return f"user:{user_id}"
+
+
+def follows_tag(content_type_id, object_id):
+    return f"follows:{content_type_id}:{object_id}"
+
+
+def follower_of(user):
+    """The Customer or Supplier that `user` follows suppliers as, or None."""
+    if hasattr(user, 'customer'):
+        return user.customer
+    if hasattr(user, 'supplier'):
+        return user.supplier
+    return None
+
+
+def followed_supplier_ids(follower):
+    """Ids of the suppliers `follower` follows; the per-user part of the supplier and feed endpoints."""
+    content_type = ContentType.objects.get_for_model(follower)
+    tag = follows_tag(content_type.pk, follower.pk)
+    return set(fragment_cache.get(
+        tag,
+        lambda: list(Follow.objects.filter(
+            follower_content_type=content_type, follower_object_id=follower.pk
+        ).values_list('supplier_id', flat=True)),
+        [tag],
+    ))
+
+
+def supplier_cards(supplier_ids, request):
+    """
+    The public cards of the suppliers shown by SuppliersList, by supplier
+    id. The photo URL is absolute, so the cards are kept per host.
+    """
+    host = request.get_host()
+
+    def build(names):
+        suppliers = Supplier.objects.filter(pk__in=[name.rsplit(':', 1)[1] for name in names]).select_related('user')
+        return {
+            f"supplier_card:{host}:{supplier.pk}": {
+                'id': supplier.pk,
+                'full_name': supplier.user.get_full_name,
+                'SupplierPhoto': request.build_absolute_uri(supplier.SupplierPhoto.url) if supplier.SupplierPhoto else None,
+                'CategoryTitle': supplier.CategoryTitle,
+            }
+            for supplier in suppliers
+        }
+
+    cards = fragment_cache.get_many(
+        [f"supplier_card:{host}:{pk}" for pk in supplier_ids], build,
+        lambda name: [supplier_tag(name.rsplit(':', 1)[1])],
+    )
+    return {card['id']: card for card in cards.values()}
+
+
+def supplier_profile(supplier_id):
+    """The public part of SupplierDetail, with the supplier's product cards, or None if there is no such supplier."""
+
+    def build():
+        supplier = Supplier.objects.select_related('user').filter(pk=supplier_id).first()
+        if supplier is None:
+            return None
+        return {
+            "id": supplier.id,
+            'full_name': supplier.user.get_full_name,
+            'SupplierPhoto': supplier.SupplierPhoto.url if supplier.SupplierPhoto else None,
+            'SupplierCover': supplier.SupplierCover.url if supplier.SupplierCover else None,
+            'CategoryTitle': supplier.CategoryTitle,
+            'ExperienceYears': supplier.ExperienceYears,
+            'Orders': supplier.Orders,
+            'Rating': supplier.Rating,
+            'SupplierProducts': [
+                {
+                    'id': card.product_id,
+                    'photo': card.image_url,
+                    'ProductName': card.name,
+                    'UnitPrice': card.price,
+                } for card in ProductCard.objects.filter(supplier=supplier).order_by('product_id')
+            ]
+        }
+
+    return fragment_cache.get(
+        f"supplier_profile:{supplier_id}", build, [supplier_tag(supplier_id), products_tag('supplier', supplier_id)]
+    )
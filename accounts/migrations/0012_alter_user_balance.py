@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_rename_supplier_follow_supplier_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='Balance',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=14),
+        ),
+    ]
@@ -22,7 +22,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     first_name = models.CharField(max_length=100, verbose_name=_("First Name"))
     last_name = models.CharField(max_length=100, verbose_name=_("Last Name"))
     PhoneNO = models.CharField(max_length=14, verbose_name=_("Phone number"))
-    Balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
+    Balance = models.DecimalField(max_digits=14, decimal_places=2, default=0.0)
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
     is_verified = models.BooleanField(default=False)
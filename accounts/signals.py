@@ -1,6 +1,10 @@
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from Handcrafts.response_cache import invalidate_tags
 from reviews.models import Review
+from .fragments import follows_tag, supplier_tag, user_tag
+from .models import Follow, Supplier, User
 
 @receiver(post_save, sender=Review)
 def update_supplier_rating_on_save(sender, instance, **kwargs):
@@ -14,4 +18,36 @@ def update_supplier_rating_on_delete(sender, instance, **kwargs):
     if instance.supplier:
         instance.supplier.update_rating()
     if instance.delivery:
-        instance.delivery.update_rating()
\ No newline at end of file
+        instance.delivery.update_rating()
+
+
+@receiver(post_save, sender=Supplier)
+@receiver(post_delete, sender=Supplier)
+def invalidate_supplier_fragments(sender, instance, **kwargs):
+    tag = supplier_tag(instance.pk)
+    transaction.on_commit(lambda: invalidate_tags(tag))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_fragments_on_rename(sender, instance, created, update_fields=None, **kwargs):
+    # Fragments show users by name; logins and other saves that leave it alone are skipped.
+    if created or (update_fields is not None and not {'first_name', 'last_name'} & set(update_fields)):
+        return
+    tags = [user_tag(instance.pk)]
+    supplier_id = Supplier.objects.filter(user_id=instance.pk).values_list('id', flat=True).first()
+    if supplier_id is not None:
+        tags.append(supplier_tag(supplier_id))
+    transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+@receiver(post_delete, sender=User)
+def invalidate_user_fragments_on_delete(sender, instance, **kwargs):
+    tag = user_tag(instance.pk)
+    transaction.on_commit(lambda: invalidate_tags(tag))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_state(sender, instance, **kwargs):
+    tag = follows_tag(instance.follower_content_type_id, instance.follower_object_id)
+    transaction.on_commit(lambda: invalidate_tags(tag))
@@ -5,7 +5,7 @@ from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.mail import EmailMessage
 from django.http import FileResponse, Http404, JsonResponse
-from django.shortcuts import get_object_or_404, render
+from django.shortcuts import render
 from django.utils.decorators import method_decorator
 from django.utils.timezone import now, timedelta
 from django.views.decorators.cache import cache_page
@@ -20,6 +20,7 @@ from rest_framework.pagination import PageNumberPagination
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from . import permissions
+from .fragments import follower_of, followed_supplier_ids, supplier_cards, supplier_profile
 from .models import Address, Customer, Delivery, Follow, OneTimePassword, Supplier, User
 from .permissions import IsCustomerorSupplier
 from .serializers import (
@@ -295,43 +296,22 @@ class SuppliersList(ListAPIView):
         user = self.request.user
         return Supplier.objects.filter(user__is_verified=True, user__is_active=True).exclude(user=user).order_by('id')
 
-    @method_decorator(cache_page(60 * 15))
     def get(self, request, *args, **kwargs):
-        response = super().get(request, *args, **kwargs)
-        user = request.user
-        transformed_data = []
-
-        for supplier in response.data.get('results', []):
-            if isinstance(supplier, dict):
-                supplier_id = supplier.get('id', '')
-
-                if hasattr(user, 'customer'):
-                    follower_content_type = ContentType.objects.get_for_model(Customer)
-                    follower_object_id = user.customer.id
-                elif hasattr(user, 'supplier'):
-                    follower_content_type = ContentType.objects.get_for_model(Supplier)
-                    follower_object_id = user.supplier.id
-                else:
-                    continue
-
-                is_followed = Follow.objects.filter(
-                    follower_content_type=follower_content_type,
-                    follower_object_id=follower_object_id,
-                    supplier=supplier_id
-                ).exists()
-
-                transformed_supplier = {
-                    "id": supplier_id,
-                    'full_name': supplier['user']['full_name'] if 'user' in supplier else '',
-                    'SupplierPhoto': supplier.get('SupplierPhoto', ''),
-                    'CategoryTitle': supplier.get('CategoryTitle', ''),
-                    'followed_by_user': is_followed
-                }
-                transformed_data.append(transformed_supplier)
-            else:
-                print(f"Invalid supplier data: {supplier}")
+        # Only the ids of the page come from the database; the suppliers' cards are shared
+        # between users and cached, and the follow state is the user's own cached overlay.
+        queryset = self.filter_queryset(self.get_queryset())
+        supplier_ids = self.paginate_queryset(queryset.values_list('id', flat=True))
 
-        return Response(transformed_data)
+        follower = follower_of(request.user)
+        if follower is None:
+            return Response([])
+
+        cards = supplier_cards(supplier_ids, request)
+        followed = followed_supplier_ids(follower)
+        return Response([
+            {**cards[supplier_id], 'followed_by_user': supplier_id in followed}
+            for supplier_id in supplier_ids if supplier_id in cards
+        ])
 
 
 class TrendingSuppliersAPIView(APIView):
@@ -345,49 +325,20 @@ class TrendingSuppliersAPIView(APIView):
 
 
 class SupplierDetail(APIView):
-    @method_decorator(cache_page(60 * 15))
     def get(self, request, pk):
-        supplier = get_object_or_404(Supplier, pk=pk)
-        user = request.user
-
-        if hasattr(user, 'customer'):
-            follower = user.customer
-            follower_content_type = ContentType.objects.get_for_model(Customer)
-            follower_id = follower.id
-        elif hasattr(user, 'supplier'):
-            follower = user.supplier
-            follower_content_type = ContentType.objects.get_for_model(Supplier)
-            follower_id = follower.id
-        else:
+        # The public profile is cached for everyone; only the follow state is the user's own.
+        profile = supplier_profile(pk)
+        if profile is None:
+            raise Http404
+
+        follower = follower_of(request.user)
+        if follower is None:
             return Response({'message': 'User must be a customer or supplier'}, status=status.HTTP_400_BAD_REQUEST)
 
-        is_followed = Follow.objects.filter(
-            follower_content_type=follower_content_type,
-            follower_object_id=follower_id,
-            supplier=supplier
-        ).exists()
-
-        print(f"Checking follow relationship: User {follower_id} -> Supplier {supplier.id} -> Follow exists: {is_followed}")
-
-        transformed_supplier = {
-            "id": supplier.id,
-            'full_name': supplier.user.get_full_name,
-            'SupplierPhoto': supplier.SupplierPhoto.url if supplier.SupplierPhoto else None,
-            'SupplierCover': supplier.SupplierCover.url if supplier.SupplierCover else None,
-            'CategoryTitle': supplier.CategoryTitle,
-            'ExperienceYears': supplier.ExperienceYears,
-            'Orders': supplier.Orders,
-            'Rating': supplier.Rating,
-            'followed_by_user': is_followed,
-            'SupplierProducts': [
-                {
-                    'id': product.id,
-                    'photo': product.images.first().image.url if product.images.first() else None,
-                    'ProductName': product.ProductName,
-                    'UnitPrice': product.UnitPrice,
-                } for product in supplier.product_set.all()
-            ]
-        }
+        transformed_supplier = dict(profile)
+        products = transformed_supplier.pop('SupplierProducts')
+        transformed_supplier['followed_by_user'] = pk in followed_supplier_ids(follower)
+        transformed_supplier['SupplierProducts'] = products
         return Response(transformed_supplier, status=status.HTTP_200_OK)
 
 
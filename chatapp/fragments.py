@@ -0,0 +1,63 @@
+from django.db.models import Prefetch, Q
+
+from accounts.fragments import user_tag
+from Handcrafts.response_cache import fragment_cache
+from .models import Conversation, Message
+from .serializers import MessageSerializer, UserSerializer
+
+
+def conversation_tag(conversation_id):
+    return f"conversation:{conversation_id}"
+
+
+def conversations_tag(user_id):
+    return f"conversations:{user_id}"
+
+
+def user_conversations(user):
+    """(id, initiator id, receiver id) of the conversations `user` takes part in."""
+    tag = conversations_tag(user.pk)
+    return fragment_cache.get(
+        tag,
+        lambda: list(
+            Conversation.objects.filter(Q(initiator=user) | Q(receiver=user))
+            .order_by('id')
+            .values_list('id', 'initiator_id', 'receiver_id')
+        ),
+        [tag],
+    )
+
+
+def conversation_summaries(conversations):
+    """
+    Both participants and the last message of each of `conversations`, as
+    returned by user_conversations(), by conversation id. The same summary
+    serves both participants; ConversationListSerializer's other_user is
+    picked from it per user.
+    """
+    participants = {pk: (initiator_id, receiver_id) for pk, initiator_id, receiver_id in conversations}
+
+    def conversation_id(name):
+        return int(name.rsplit(':', 1)[1])
+
+    def build(names):
+        queryset = Conversation.objects.filter(pk__in=[conversation_id(name) for name in names]).prefetch_related(
+            Prefetch('messages', queryset=Message.objects.order_by('-timestamp')[:1], to_attr='last_messages')
+        ).select_related('initiator', 'receiver')
+        summaries = {}
+        for conversation in queryset:
+            last_message = conversation.last_messages[0] if conversation.last_messages else None
+            summaries[f"conversation:{conversation.pk}"] = {
+                'id': conversation.pk,
+                'initiator': UserSerializer(conversation.initiator).data,
+                'receiver': UserSerializer(conversation.receiver).data,
+                'last_message': MessageSerializer(instance=last_message).data if last_message else None,
+            }
+        return summaries
+
+    def tags(name):
+        pk = conversation_id(name)
+        return [conversation_tag(pk)] + [user_tag(user_id) for user_id in participants[pk] if user_id]
+
+    summaries = fragment_cache.get_many([f"conversation:{pk}" for pk in participants], build, tags)
+    return {conversation_id(name): summary for name, summary in summaries.items()}
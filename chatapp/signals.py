@@ -0,0 +1,23 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Handcrafts.response_cache import invalidate_tags
+from .fragments import conversation_tag, conversations_tag
+from .models import Conversation, Message
+
+
+@receiver(post_save, sender=Conversation)
+@receiver(post_delete, sender=Conversation)
+def invalidate_conversation_fragments(sender, instance, **kwargs):
+    tags = [conversation_tag(instance.pk)] + [
+        conversations_tag(user_id) for user_id in (instance.initiator_id, instance.receiver_id) if user_id
+    ]
+    transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def invalidate_conversation_on_message(sender, instance, **kwargs):
+    tag = conversation_tag(instance.conversation_id)
+    transaction.on_commit(lambda: invalidate_tags(tag))
@@ -1,14 +1,13 @@
-from django.db.models import Prefetch, Q
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
 from accounts.models import User
+from .fragments import conversation_summaries, user_conversations
 from .models import Conversation, Message
-from .serializers import ConversationListSerializer, ConversationSerializer
+from .serializers import ConversationSerializer
 from .tasks import send_chat_notification_task
 
 
@@ -52,13 +51,16 @@ def get_conversation(request, convo_id):
 
 
 @api_view(['GET'])
-@method_decorator(cache_page(60 * 1))
 def conversations(request):
-    conversation_list = Conversation.objects.filter(
-        Q(initiator=request.user) | Q(receiver=request.user)
-    ).prefetch_related(
-        Prefetch('messages', queryset=Message.objects.order_by('-timestamp')[:1])
-    ).select_related('initiator', 'receiver')
-
-    serializer = ConversationListSerializer(instance=conversation_list, many=True, context={'request': request})
-    return Response(serializer.data)
\ No newline at end of file
+    # Shaped like ConversationListSerializer: the user's conversation ids are their own cached
+    # overlay, and each conversation's summary is shared by both participants.
+    conversation_list = user_conversations(request.user)
+    summaries = conversation_summaries(conversation_list)
+    data = []
+    for conversation_id, initiator_id, _ in conversation_list:
+        summary = summaries.get(conversation_id)
+        if summary is None:
+            continue
+        other_user = summary['receiver'] if initiator_id == request.user.id else summary['initiator']
+        data.append({'id': conversation_id, 'other_user': other_user, 'last_message': summary['last_message']})
+    return Response(data)
\ No newline at end of file
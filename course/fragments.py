@@ -0,0 +1,56 @@
+from accounts.fragments import supplier_tag
+from Handcrafts.response_cache import fragment_cache
+
+from .models import Course, Enrollment
+from .serializers import CourseSerializer
+
+
+def course_tag(course_id):
+    return f"course:{course_id}"
+
+
+def enrollments_tag(user_id):
+    return f"enrollments:{user_id}"
+
+
+def enrolled_courses(user):
+    """(course id, supplier id) of the courses `user` is enrolled in, oldest enrollment first."""
+    tag = enrollments_tag(user.pk)
+    return fragment_cache.get(
+        tag,
+        lambda: list(
+            Enrollment.objects.filter(EnrolledUser=user)
+            .order_by("EnrollmentID")
+            .values_list("Course_id", "Course__Supplier_id")
+        ),
+        [tag],
+    )
+
+
+def course_cards(courses, request):
+    """
+    CourseSerializer data of `courses`, (course id, supplier id) pairs, by
+    course id. Shared by every enrolled user; the nested supplier photo URL
+    is absolute, so the cards are kept per host.
+    """
+    host = request.get_host()
+    supplier_ids = dict(courses)
+
+    def course_id(name):
+        return int(name.rsplit(":", 1)[1])
+
+    def build(names):
+        queryset = Course.objects.select_related("Supplier", "Supplier__user").filter(
+            pk__in=[course_id(name) for name in names]
+        )
+        return {
+            f"course_card:{host}:{course.pk}": CourseSerializer(course, context={"request": request}).data
+            for course in queryset
+        }
+
+    def tags(name):
+        supplier_id = supplier_ids[course_id(name)]
+        return [course_tag(course_id(name))] + ([supplier_tag(supplier_id)] if supplier_id else [])
+
+    cards = fragment_cache.get_many([f"course_card:{host}:{pk}" for pk, _ in courses], build, tags)
+    return {course_id(name): card for name, card in cards.items()}
@@ -1,7 +1,11 @@
+from django.db import transaction
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from Handcrafts.response_cache import invalidate_tags
 from reviews.models import Review
+from .fragments import course_tag, enrollments_tag
+from .models import Course, Enrollment
 from .tasks import update_course_rating_task
 
 
@@ -16,4 +20,18 @@ def update_course_rating_on_save(sender, instance, **kwargs):
 def update_course_rating_on_delete(sender, instance, **kwargs):
     if instance.course:
         # ✨ Offload rating calculation to Celery
-        update_course_rating_task.delay(instance.course.id)
\ No newline at end of file
+        update_course_rating_task.delay(instance.course.id)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_card(sender, instance, **kwargs):
+    tag = course_tag(instance.pk)
+    transaction.on_commit(lambda: invalidate_tags(tag))
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_enrollments(sender, instance, **kwargs):
+    tag = enrollments_tag(instance.EnrolledUser_id)
+    transaction.on_commit(lambda: invalidate_tags(tag))
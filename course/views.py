@@ -11,6 +11,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .fragments import course_cards, enrolled_courses
 from .models import Course, CourseVideos, Enrollment, Supplier, User
 from .serializers import CourseSerializer, CourseVideosSerializer, SimpleCoursesSerializer
 from .permissions import IsSupplier
@@ -233,6 +234,8 @@ class EnrolledCoursesAPIView(generics.ListAPIView):
     serializer_class = CourseSerializer
     pagination_class = StandardResultsSetPagination
 
-    @method_decorator(cache_page(60 * 15))
     def get(self, request, *args, **kwargs):
-        return super().get(request, *args, **kwargs)
+        # The user's enrollments are their own cached overlay; the course cards are shared.
+        page = self.paginate_queryset(enrolled_courses(request.user))
+        cards = course_cards(page, request)
+        return self.get_paginated_response([cards[course_id] for course_id, _ in page if course_id in cards])
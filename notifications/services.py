@@ -14,6 +14,22 @@ def create_notification_for_user(user, message, related_object=None, image=None)
     )
 
 
+def create_notifications_for_users(user_messages, related_object=None, image=None):
+    """
+    Creates one notification per (user, message) pair in a single bulk query
+    and then fires a single signal to send them all.
+    """
+    notifications_to_create = [
+        Notification(user=user, message=message, related_object=related_object, image=image)
+        for user, message in user_messages
+    ]
+    if not notifications_to_create:
+        return
+
+    created_notifications = Notification.objects.bulk_create(notifications_to_create)
+    notifications_created.send(sender=None, notifications=created_notifications)
+
+
 def create_notifications_for_all_suppliers(message, related_object=None, image=None):
     """
     Finds all supplier users, creates notifications in a single bulk query,
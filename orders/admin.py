@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Wishlist, WishlistItem, Cart, CartItems, Order, OrderItem, Coupon, Warehouse, Shipment, ShipmentItem,CouponUsage
+from .models import Wishlist, WishlistItem, Cart, CartItems, Order, OrderItem, Coupon, Warehouse, Shipment, ShipmentItem,CouponUsage, StockReservation, StockReservationItem, CancellationJob, SupplierOrderInbox, CouponCampaign, CampaignCode
 
 @admin.register(Wishlist)
 class WishlistAdmin(admin.ModelAdmin):
@@ -62,7 +62,7 @@ class ShipmentItemAdmin(admin.ModelAdmin):
 @admin.register(Coupon)
 class CouponAdmin(admin.ModelAdmin):
     list_display = ('code', 'supplier', 'discount', 'discount_type', 'valid_from', 'valid_to', 'active', 'max_uses', 'uses_count')
-    list_filter = ('active', 'valid_from', 'valid_to', 'discount_type', 'supplier')
+    list_filter = ('active', 'valid_from', 'valid_to', 'discount_type', 'scope', 'supplier')
     search_fields = ('code', 'supplier__user__email', 'products__ProductName')
     readonly_fields = ('uses_count',)
     filter_horizontal = ('products',)
@@ -77,9 +77,23 @@ class CouponAdmin(admin.ModelAdmin):
             'fields': ('max_uses', 'uses_count', 'max_uses_per_user')
         }),
         ('Applicable Products', {
-            'fields': ('products',)
+            'fields': ('scope', 'category', 'products')
         }),
     )
+@admin.register(CouponCampaign)
+class CouponCampaignAdmin(admin.ModelAdmin):
+    list_display = ('name', 'supplier', 'prefix', 'codes_requested', 'codes_generated', 'status', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('name', 'supplier__user__email')
+    readonly_fields = ('coupon', 'codes_generated', 'status', 'created_at')
+
+@admin.register(CampaignCode)
+class CampaignCodeAdmin(admin.ModelAdmin):
+    list_display = ('code', 'campaign', 'redeemed_by', 'redeemed_at')
+    list_filter = ('campaign',)
+    search_fields = ('code',)
+    raw_id_fields = ('campaign', 'redeemed_by')
+
 @admin.register(CouponUsage)
 class CouponUsageAdmin(admin.ModelAdmin):
     list_display = ('user', 'coupon', 'used_at')
@@ -91,4 +105,33 @@ class CouponUsageAdmin(admin.ModelAdmin):
 class WarehouseAdmin(admin.ModelAdmin):
     list_display = ('name', 'Address', 'contact_person', 'contact_phone', 'delivery_fee')
     search_fields = ('name', 'contact_person', 'contact_phone')
-    ordering = ('name',)
\ No newline at end of file
+    ordering = ('name',)
+
+class StockReservationItemInline(admin.TabularInline):
+    model = StockReservationItem
+    extra = 0
+    fields = ('product', 'quantity',)
+    readonly_fields = ('product', 'quantity',)
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'expires_at', 'created_at')
+    list_filter = ('status', 'expires_at')
+    search_fields = ('user__email',)
+    readonly_fields = ('created_at', 'updated_at')
+    inlines = [StockReservationItemInline]
+
+
+@admin.register(CancellationJob)
+class CancellationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'cutoff', 'cancelled_count', 'restocked_units', 'refunded_amount', 'updated_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'updated_at', 'finished_at', 'last_created_at', 'last_order_id')
+
+
+@admin.register(SupplierOrderInbox)
+class SupplierOrderInboxAdmin(admin.ModelAdmin):
+    list_display = ('order', 'supplier', 'status_bucket', 'order_created_at', 'updated_at')
+    list_filter = ('status_bucket',)
+    search_fields = ('order__order_number', 'supplier__user__email')
+    readonly_fields = ('updated_at',)
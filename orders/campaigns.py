@@ -0,0 +1,117 @@
+import hashlib
+import hmac
+import secrets
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import CampaignCode, Coupon, CouponCampaign
+
+CODE_CHUNK_SIZE = 5000
+MAX_CAMPAIGN_CODES = 1000000
+# Crockford's base32: no I, L, O or U, so codes survive being read out or typed.
+CODE_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+CODE_LENGTH = 13  # 13 base32 digits hold the 64-bit block
+FEISTEL_ROUNDS = 4
+HALF_MASK = (1 << 32) - 1
+
+
+def _round(key, round_number, half):
+    digest = hmac.new(key, round_number.to_bytes(1, 'big') + half.to_bytes(4, 'big'), hashlib.sha256).digest()
+    return int.from_bytes(digest[:4], 'big')
+
+
+def _permute(value, key):
+    """A keyed Feistel permutation of 64-bit integers: distinct inputs always give distinct outputs."""
+    left, right = value >> 32, value & HALF_MASK
+    for round_number in range(FEISTEL_ROUNDS):
+        left, right = right, left ^ _round(key, round_number, right)
+    return (left << 32) | right
+
+
+def _encode(value):
+    digits = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, 32)
+        digits.append(CODE_ALPHABET[digit])
+    return ''.join(reversed(digits))
+
+
+def _code_key():
+    return hashlib.sha256(f"coupon-campaign:{settings.SECRET_KEY}".encode()).digest()
+
+
+def iter_campaign_codes(campaign, start, stop):
+    """
+    Yields the codes number `start` to `stop` - 1 of `campaign`. Codes are
+    the campaign id and the sequence number run through a permutation keyed
+    by SECRET_KEY, so they are unique across all campaigns by construction,
+    need no lookup to generate and cannot be guessed from one another.
+    """
+    key = _code_key()
+    for sequence in range(start, stop):
+        body = _encode(_permute((campaign.pk << 32) | sequence, key))
+        yield f"{campaign.prefix}-{body}" if campaign.prefix else body
+
+
+@transaction.atomic
+def create_campaign(supplier, name, prefix, codes_requested, rules, products=()):
+    """
+    Creates a campaign and the hidden coupon holding its rules. One code
+    redeems one use, so the coupon allows as many uses as there are codes.
+    Codes are generated afterwards by generate_campaign_codes().
+    """
+    coupon = Coupon.objects.create(
+        supplier=supplier,
+        code=f"campaign-{secrets.token_hex(16)}",
+        max_uses=codes_requested,
+        **rules,
+    )
+    if products:
+        coupon.products.set(products)
+    return CouponCampaign.objects.create(
+        supplier=supplier, coupon=coupon, name=name, prefix=prefix, codes_requested=codes_requested
+    )
+
+
+def generate_campaign_codes(campaign_id, chunk_size=CODE_CHUNK_SIZE):
+    """
+    Writes the codes of a campaign in chunks of `chunk_size`, one
+    transaction and one bulk INSERT per chunk, and marks it ready. The
+    campaign row is locked while a chunk is written and its count of codes
+    is committed with the chunk, so concurrent or interrupted runs pick up
+    where the last chunk ended. Returns the campaign.
+    """
+    while True:
+        with transaction.atomic():
+            campaign = CouponCampaign.objects.select_for_update().get(pk=campaign_id)
+            if campaign.codes_generated >= campaign.codes_requested:
+                if campaign.status != CouponCampaign.CampaignStatus.READY:
+                    campaign.status = CouponCampaign.CampaignStatus.READY
+                    campaign.save(update_fields=['status'])
+                return campaign
+
+            stop = min(campaign.codes_generated + chunk_size, campaign.codes_requested)
+            CampaignCode.objects.bulk_create([
+                CampaignCode(campaign=campaign, code=code)
+                for code in iter_campaign_codes(campaign, campaign.codes_generated, stop)
+            ])
+            campaign.codes_generated = stop
+            campaign.save(update_fields=['codes_generated'])
+
+
+def resolve_campaign_code(code):
+    """
+    Returns the rules coupon of an unredeemed campaign code with the code's
+    id set as `campaign_code_id`, or None. One lookup on the unique index.
+    """
+    row = (
+        CampaignCode.objects.select_related('campaign__coupon__supplier')
+        .filter(code=code, redeemed_at__isnull=True)
+        .first()
+    )
+    if row is None:
+        return None
+    coupon = row.campaign.coupon
+    coupon.campaign_code_id = row.pk
+    return coupon
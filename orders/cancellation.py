@@ -0,0 +1,149 @@
+import datetime
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from returnrequest import ledger
+from returnrequest.models import Transaction
+
+from .dispatch import dispatch_board
+from .inbox import sync_supplier_inbox
+from .models import CancellationJob, Order, OrderItem, Shipment
+from .services import _restock_helper
+
+CANCELLABLE_STATUSES = [Order.OrderStatus.CREATED, Order.OrderStatus.In_Transmit]
+CASHBACK_RATE = Decimal('0.05')
+CARD_PAYMENT_WINDOW = datetime.timedelta(hours=24)
+
+
+def cancellation_legs(payment_method, paid, user_id, final_amount, platform_id):
+    """The ledger legs that undo the payment and the cashback of one cancelled order."""
+    cashback_amount = final_amount * CASHBACK_RATE
+    if payment_method == Order.PaymentMethod.BALANCE:
+        return [
+            ledger.Leg(user_id, Transaction.TransactionType.CASH_BACK, -cashback_amount),
+            ledger.Leg(user_id, Transaction.TransactionType.RETURNED_PRODUCT, final_amount),
+            ledger.Leg(platform_id, Transaction.TransactionType.RETURNED_PRODUCT, -final_amount),
+        ]
+    if payment_method == Order.PaymentMethod.CREDIT_CARD and paid:
+        # The card money comes back through clearing.
+        return [
+            ledger.Leg(user_id, Transaction.TransactionType.RETURNED_CASH_BACK, -cashback_amount),
+            ledger.Leg(user_id, Transaction.TransactionType.RETURNED_PRODUCT, final_amount),
+        ]
+    return [ledger.Leg(user_id, Transaction.TransactionType.RETURNED_CASH_BACK, -cashback_amount)]
+
+
+@transaction.atomic
+def cancel_orders(order_ids):
+    """
+    Cancels a chunk of orders in one transaction and returns what was done.
+
+    Orders are locked in id order and only those still in a cancellable
+    status are taken, so an order is cancelled and refunded exactly once.
+    Their open shipments are cancelled with one UPDATE, the stock of all
+    their items comes back with one aggregated restock, and the refunds are
+    posted with a single post_many().
+    """
+    orders = list(
+        Order.objects.select_for_update()
+        .filter(id__in=order_ids, status__in=CANCELLABLE_STATUSES)
+        .order_by('id')
+        .values_list('id', 'order_number', 'user_id', 'payment_method', 'paid', 'final_amount')
+    )
+    summary = {'cancelled': len(orders), 'restocked_units': 0, 'refunded_amount': Decimal('0.00')}
+    if not orders:
+        return summary
+
+    cancelled_ids = [order[0] for order in orders]
+    Order.objects.filter(id__in=cancelled_ids).update(
+        status=Order.OrderStatus.CANCELLED, paid=False, updated_at=timezone.now()
+    )
+    Shipment.objects.filter(order_id__in=cancelled_ids).exclude(
+        status=Shipment.ShipmentStatus.DELIVERED_SUCCESSFULLY
+    ).update(status=Shipment.ShipmentStatus.CANCELLED)
+    sync_supplier_inbox(cancelled_ids)
+    transaction.on_commit(lambda: dispatch_board.sync(Shipment.objects.filter(order_id__in=cancelled_ids)))
+
+    quantities = dict(
+        OrderItem.objects.filter(order_id__in=cancelled_ids)
+        .values('product_id')
+        .annotate(total=Sum('quantity'))
+        .values_list('product_id', 'total')
+    )
+    _restock_helper(quantities)
+    summary['restocked_units'] = sum(quantities.values())
+
+    platform_id = ledger.platform_account_id()
+    postings = []
+    for order_id, order_number, user_id, payment_method, paid, final_amount in orders:
+        legs = cancellation_legs(payment_method, paid, user_id, final_amount, platform_id)
+        postings.append(ledger.Posting(legs, f"Cancellation of order {order_number}", Order(pk=order_id)))
+        summary['refunded_amount'] += sum(
+            leg.amount for leg in legs
+            if leg.user_id == user_id and leg.transaction_type == Transaction.TransactionType.RETURNED_PRODUCT
+        )
+    ledger.post_many(postings)
+    return summary
+
+
+def expired_card_orders(cutoff):
+    """Unpaid credit card orders created at or before `cutoff`."""
+    return Order.objects.filter(
+        payment_method=Order.PaymentMethod.CREDIT_CARD,
+        paid=False,
+        status=Order.OrderStatus.CREATED,
+        created_at__lte=cutoff,
+    )
+
+
+def cancel_expired_card_orders(chunk_size=1000, max_chunks=None, progress=None):
+    """
+    Cancels unpaid credit card orders past the payment window, one chunk per
+    transaction, and returns the CancellationJob that tracks the run.
+
+    The job keeps a (created_at, id) cursor that is committed together with
+    each chunk, so a run that crashes is resumed from its last chunk by the
+    next call instead of starting over. `progress` is called after every
+    chunk with the job, the chunk summary and the seconds the chunk took.
+    """
+    job, _ = CancellationJob.objects.get_or_create(
+        status=CancellationJob.JobStatus.RUNNING,
+        defaults={'cutoff': timezone.now() - CARD_PAYMENT_WINDOW},
+    )
+
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        started = time.monotonic()
+        with transaction.atomic():
+            job = CancellationJob.objects.select_for_update().get(pk=job.pk)
+            if job.status != CancellationJob.JobStatus.RUNNING:
+                break
+
+            candidates = expired_card_orders(job.cutoff)
+            if job.last_created_at is not None:
+                candidates = candidates.filter(
+                    Q(created_at__gt=job.last_created_at)
+                    | Q(created_at=job.last_created_at, id__gt=job.last_order_id)
+                )
+            chunk = list(candidates.order_by('created_at', 'id').values_list('id', 'created_at')[:chunk_size])
+            if not chunk:
+                job.status = CancellationJob.JobStatus.COMPLETED
+                job.finished_at = timezone.now()
+                job.save()
+                break
+
+            summary = cancel_orders([order_id for order_id, _ in chunk])
+            job.last_order_id, job.last_created_at = chunk[-1]
+            job.cancelled_count += summary['cancelled']
+            job.restocked_units += summary['restocked_units']
+            job.refunded_amount += summary['refunded_amount']
+            job.save()
+
+        chunks += 1
+        if progress:
+            progress(job, summary, time.monotonic() - started)
+    return job
@@ -0,0 +1,297 @@
+import hashlib
+import json
+from dataclasses import dataclass, replace
+
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from products.models import Product
+
+from .models import Cart, CartItems
+
+CART_ITEMS_KEY = "orders:cart:{}:items"
+CART_META_KEY = "orders:cart:{}:meta"
+DIRTY_CARTS_KEY = "orders:cart:dirty"
+MAX_LINE_QUANTITY = 10
+
+
+def line_id(product_id, color, size):
+    """The id of the cart line holding `product_id` in one color and size."""
+    return hashlib.blake2s(f"{product_id}|{color or ''}|{size or ''}".encode(), digest_size=8).hexdigest()
+
+
+@dataclass
+class CartLine:
+    """One line of a stored cart. It is priced from its Product, at the price checkout charges."""
+    id: str
+    Product_id: int
+    Quantity: int
+    Color: str
+    Size: str
+    Product: object = None
+
+    @classmethod
+    def from_json(cls, pk, raw):
+        data = json.loads(raw)
+        return cls(pk, data['product'], data['quantity'], data['color'], data['size'])
+
+    def to_json(self):
+        return json.dumps({
+            'product': self.Product_id, 'quantity': self.Quantity, 'color': self.Color, 'size': self.Size,
+        })
+
+    @property
+    def sub_total(self):
+        return self.Quantity * self.Product.UnitPrice
+
+
+def attach_products(lines):
+    """
+    Sets Product on `lines` with one query and drops the lines whose product
+    is gone, so the lines are priced at the current UnitPrice.
+    """
+    products = Product.objects.prefetch_related('images').in_bulk({line.Product_id for line in lines})
+    for line in lines:
+        line.Product = products.get(line.Product_id)
+    return [line for line in lines if line.Product is not None]
+
+
+class CartStoreError(Exception):
+    """A cart change that was refused; the message is safe to show to the user."""
+
+
+class CartStore:
+    """
+    Shopping carts kept in Redis, one pair of hashes per user:
+
+        orders:cart:<user>:items   line id -> line (product, quantity, color, size)
+        orders:cart:<user>:meta    the database cart id
+
+    Adding, changing or removing a line touches one field of the items
+    hash, so cart traffic needs no database round trip beyond the product
+    lookup of an add. Lines carry no price: reading a cart loads its
+    products anyway, and prices the lines from them as checkout does. Changed carts are
+    marked dirty and flush() writes them back to CartItems in batches;
+    checkout calls persist() first, so create_order_from_cart() always
+    reads the current cart from the database. When the default cache is
+    not Redis, available() is False and the views use CartItems directly.
+    """
+
+    def _client(self):
+        try:
+            return get_redis_connection("default")
+        except NotImplementedError:
+            return None
+
+    def available(self):
+        return self._client() is not None
+
+    def _ensure_loaded(self, client, user_id):
+        """Copies the database cart of `user_id` into Redis unless it is already there."""
+        meta_key = CART_META_KEY.format(user_id)
+        if client.exists(meta_key):
+            return
+        cart, _ = Cart.objects.get_or_create(User_id=user_id)
+        lines = {}
+        for item in CartItems.objects.filter(CartID=cart, Product__isnull=False).select_related('Product'):
+            pk = line_id(item.Product_id, item.Color, item.Size)
+            if pk in lines:
+                lines[pk].Quantity += item.Quantity
+            else:
+                lines[pk] = CartLine(pk, item.Product_id, item.Quantity, item.Color or '', item.Size or '')
+
+        def load(pipe):
+            # Another request may have loaded the cart in the meantime; its copy may already have changes.
+            if pipe.exists(meta_key):
+                return
+            pipe.multi()
+            if lines:
+                pipe.hset(CART_ITEMS_KEY.format(user_id), mapping={pk: line.to_json() for pk, line in lines.items()})
+            pipe.hset(meta_key, mapping={'cart': str(cart.pk)})
+            self._touch(pipe, user_id)
+
+        client.transaction(load, meta_key)
+
+    def _touch(self, pipe, user_id):
+        pipe.expire(CART_ITEMS_KEY.format(user_id), settings.CART_STORE_TTL)
+        pipe.expire(CART_META_KEY.format(user_id), settings.CART_STORE_TTL)
+
+    def _change(self, client, user_id, pk, change):
+        """
+        Replaces line `pk` with `change(line)` under WATCH, where line is None
+        if the cart has no such line and a returned None removes it. The
+        cart is marked dirty.
+        """
+        self._ensure_loaded(client, user_id)
+        items_key = CART_ITEMS_KEY.format(user_id)
+        meta_key = CART_META_KEY.format(user_id)
+
+        def apply(pipe):
+            raw = pipe.hget(items_key, pk)
+            old = CartLine.from_json(pk, raw) if raw else None
+            new = change(old)
+            pipe.multi()
+            if new is None:
+                pipe.hdel(items_key, pk)
+            else:
+                pipe.hset(items_key, pk, new.to_json())
+            pipe.sadd(DIRTY_CARTS_KEY, user_id)
+            self._touch(pipe, user_id)
+            return new
+
+        return client.transaction(apply, items_key, meta_key, value_from_callable=True)
+
+    def get(self, user):
+        """Returns the database cart id and the lines of the cart of `user`."""
+        client = self._client()
+        self._ensure_loaded(client, user.id)
+        pipe = client.pipeline(transaction=True)
+        pipe.hgetall(CART_ITEMS_KEY.format(user.id))
+        pipe.hget(CART_META_KEY.format(user.id), 'cart')
+        raw_lines, cart_id = pipe.execute()
+        lines = [CartLine.from_json(pk.decode(), raw) for pk, raw in raw_lines.items()]
+        return cart_id.decode(), lines
+
+    def get_line(self, user, pk):
+        client = self._client()
+        self._ensure_loaded(client, user.id)
+        raw = client.hget(CART_ITEMS_KEY.format(user.id), pk)
+        return CartLine.from_json(pk, raw) if raw else None
+
+    def add(self, user, product, quantity, color='', size=''):
+        """Adds `quantity` of `product` to the cart of `user`, merging with the line of the same color and size."""
+        if product.Supplier.user_id == user.id:
+            raise CartStoreError("You cannot add your own product to the cart")
+        if quantity <= 0 or quantity > MAX_LINE_QUANTITY:
+            raise CartStoreError("Quantity Must be above 0 and less than or equal to 10")
+        if quantity > product.Stock:
+            raise CartStoreError(f"Quantity of {product.ProductName} exceeds available stock.")
+
+        def change(line):
+            current = line.Quantity if line else 0
+            if current + quantity > product.Stock:
+                raise CartStoreError(f"Adding this quantity of {product.ProductName} exceeds available stock.")
+            return CartLine(line_id(product.id, color, size), product.id, current + quantity,
+                            color or '', size or '', product)
+
+        return self._change(self._client(), user.id, line_id(product.id, color, size), change)
+
+    def update(self, user, pk, quantity):
+        """Sets the quantity of a line; a quantity of 0 removes it. Returns None if there is no such line."""
+        def change(line):
+            if line is None:
+                raise KeyError(pk)
+            return replace(line, Quantity=quantity) if quantity else None
+
+        try:
+            return self._change(self._client(), user.id, pk, change)
+        except KeyError:
+            return None
+
+    def remove(self, user, pk):
+        """Removes a line and returns whether it was in the cart."""
+        def change(line):
+            if line is None:
+                raise KeyError(pk)
+            return None
+
+        try:
+            self._change(self._client(), user.id, pk, change)
+        except KeyError:
+            return False
+        return True
+
+    def discard(self, user_id, cart_items):
+        """Takes the lines of a placed order out of the stored cart."""
+        try:
+            client = self._client()
+            if client is None or not client.exists(CART_META_KEY.format(user_id)):
+                return
+            for pk in {line_id(item.Product_id, item.Color, item.Size) for item in cart_items}:
+                self._change(client, user_id, pk, lambda line: None)
+        except Exception as e:
+            print(f"Cart store discard failed: {e}")
+
+    def persist(self, user):
+        """
+        Writes the cart of `user` back to CartItems now; called before checkout
+        reads it. The write-back locks the cart row, so it also waits for a
+        flush() that is writing the same cart.
+        """
+        client = self._client()
+        if client is None:
+            return
+        client.srem(DIRTY_CARTS_KEY, user.id)
+        try:
+            self._write_back(client, user.id)
+        except Exception:
+            client.sadd(DIRTY_CARTS_KEY, user.id)
+            raise
+
+    def clear(self, user_id):
+        """Drops the stored cart of `user_id`, e.g. after its database cart was deleted."""
+        client = self._client()
+        if client is None:
+            return
+        pipe = client.pipeline(transaction=True)
+        pipe.delete(CART_ITEMS_KEY.format(user_id), CART_META_KEY.format(user_id))
+        pipe.srem(DIRTY_CARTS_KEY, user_id)
+        pipe.execute()
+
+    def flush(self, batch_size=None):
+        """Writes back up to `batch_size` dirty carts and returns how many were written."""
+        client = self._client()
+        if client is None:
+            return 0
+        written = 0
+        for user_id in client.spop(DIRTY_CARTS_KEY, batch_size or settings.CART_FLUSH_BATCH_SIZE) or []:
+            user_id = int(user_id)
+            try:
+                self._write_back(client, user_id)
+                written += 1
+            except Exception as e:
+                print(f"Cart write-back failed for user {user_id}: {e}")
+                client.sadd(DIRTY_CARTS_KEY, user_id)
+        return written
+
+    def _write_back(self, client, user_id):
+        pipe = client.pipeline(transaction=True)
+        pipe.hgetall(CART_ITEMS_KEY.format(user_id))
+        pipe.hget(CART_META_KEY.format(user_id), 'cart')
+        raw_lines, cart_id = pipe.execute()
+        if cart_id is None:
+            # The cart expired from Redis; the database copy is all there is.
+            return
+        lines = {pk.decode(): CartLine.from_json(pk.decode(), raw) for pk, raw in raw_lines.items()}
+        # Lines of products deleted since they were added are dropped rather than written.
+        products = set(Product.objects.filter(id__in=[line.Product_id for line in lines.values()]).values_list('id', flat=True))
+
+        with transaction.atomic():
+            cart = Cart.objects.select_for_update().filter(pk=cart_id.decode()).first()
+            if cart is None:
+                cart = Cart.objects.select_for_update().get_or_create(User_id=user_id)[0]
+                client.hset(CART_META_KEY.format(user_id), 'cart', str(cart.pk))
+
+            stale, changed = [], []
+            for item in CartItems.objects.filter(CartID=cart):
+                line = lines.pop(line_id(item.Product_id, item.Color, item.Size), None)
+                if line is None:
+                    stale.append(item.pk)
+                elif item.Quantity != line.Quantity:
+                    item.Quantity = line.Quantity
+                    changed.append(item)
+            added = [
+                CartItems(CartID=cart, Product_id=line.Product_id, Quantity=line.Quantity,
+                          Color=line.Color, Size=line.Size)
+                for line in lines.values() if line.Product_id in products
+            ]
+            if not (stale or changed or added):
+                return
+            CartItems.objects.filter(pk__in=stale).delete()
+            CartItems.objects.bulk_update(changed, ['Quantity'])
+            CartItems.objects.bulk_create(added)
+            cart.bump_version()
+
+
+cart_store = CartStore()
@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+
+from .models import Coupon
+from .pricing import CouponScope
+
+MAX_INDEXED_COUPONS = 10000
+
+
+class CouponEligibilityIndex:
+    """
+    Process-local coupon id -> CouponScope, so pricing decides per cart line
+    with a set or id lookup whether a coupon applies.
+
+    Supplier-wide and category coupons need nothing beyond the coupon row.
+    A product-list coupon's product ids are read with one query the first
+    time it is priced and kept as a frozenset. Entries are keyed by the
+    coupon's updated_at, which every edit of the coupon or of its product
+    list moves (see signals.py), so a changed coupon is re-read on its next
+    use without any cross-process invalidation. The least recently used
+    entries are dropped past MAX_INDEXED_COUPONS.
+    """
+
+    def __init__(self, max_size=MAX_INDEXED_COUPONS):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._scopes = OrderedDict()
+
+    def scope(self, coupon):
+        if coupon.scope == Coupon.Scope.SUPPLIER:
+            return CouponScope(Coupon.Scope.SUPPLIER)
+        if coupon.scope == Coupon.Scope.CATEGORY:
+            return CouponScope(Coupon.Scope.CATEGORY, category_id=coupon.category_id)
+
+        key = (coupon.pk, coupon.updated_at)
+        with self._lock:
+            scope = self._scopes.get(coupon.pk)
+            if scope is not None and scope[0] == key:
+                self._scopes.move_to_end(coupon.pk)
+                return scope[1]
+
+        product_ids = frozenset(
+            Coupon.products.through.objects.filter(coupon_id=coupon.pk).values_list('product_id', flat=True)
+        )
+        scope = CouponScope(Coupon.Scope.PRODUCTS, product_ids=product_ids)
+        with self._lock:
+            self._scopes[coupon.pk] = (key, scope)
+            self._scopes.move_to_end(coupon.pk)
+            while len(self._scopes) > self.max_size:
+                self._scopes.popitem(last=False)
+        return scope
+
+
+coupon_index = CouponEligibilityIndex()
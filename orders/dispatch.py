@@ -0,0 +1,355 @@
+import uuid
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from .models import Order, Shipment
+
+PICKUP_BOARD_KEY = "orders:dispatch:pickup:{}"
+ORDER_BOARD_KEY = "orders:dispatch:orders:{}"
+BOARD_READY_KEY = "orders:dispatch:ready"
+BOARD_KEY_PATTERN = "orders:dispatch:*:*"
+REBUILD_KEY_SUFFIX = ":rebuild:"
+REBUILD_KEY_TTL = 60 * 60
+
+# Shipments a courier of the destination governorate can accept.
+PICKUP_STATUSES = [
+    Shipment.ShipmentStatus.READY_TO_SHIP,
+    Shipment.ShipmentStatus.DELIVERED_TO_Second_WAREHOUSE,
+]
+# Shipments in these statuses no longer keep their order on the board of their origin governorate.
+OFF_BOARD_STATUSES = [
+    Shipment.ShipmentStatus.DELIVERED_SUCCESSFULLY,
+    Shipment.ShipmentStatus.ON_MY_WAY,
+    Shipment.ShipmentStatus.DELIVERED_TO_First_WAREHOUSE,
+    Shipment.ShipmentStatus.CANCELLED,
+    Shipment.ShipmentStatus.In_Transmit,
+]
+
+
+def is_claimable(status, delivery_person_id):
+    return delivery_person_id is None and status in PICKUP_STATUSES
+
+
+def awaits_courier(status, delivery_person_id):
+    return delivery_person_id is None and status not in OFF_BOARD_STATUSES
+
+
+class BoardSequence:
+    """
+    What a courier sees in a list endpoint: their own rows, read with a short
+    indexed query, followed by the rows of a board, newest first.
+
+    It supports count() and slicing, so the DRF paginators can page it. A
+    slice costs one ZREVRANGE and hydrates only the ids of that page through
+    `queryset`, which re-checks the board condition so stale ids are dropped.
+    Rows that are both the courier's own and on the board are listed once.
+    """
+
+    def __init__(self, client, key, queryset, own_queryset):
+        self.client = client
+        self.key = key
+        self.queryset = queryset
+        self.own = list(own_queryset)
+        self._own_ids = {str(obj.pk) for obj in self.own}
+
+        pipe = client.pipeline(transaction=False)
+        for pk in self._own_ids:
+            pipe.zrevrank(key, pk)
+        pipe.zcard(key)
+        *ranks, self._board_size = pipe.execute()
+        self._own_ranks = sorted(rank for rank in ranks if rank is not None)
+
+    def count(self):
+        return len(self.own) + self._board_size - len(self._own_ranks)
+
+    def __len__(self):
+        return self.count()
+
+    def _raw_index(self, index):
+        # Position on the board of the index-th entry that is not one of the courier's own.
+        for rank in self._own_ranks:
+            if rank > index:
+                break
+            index += 1
+        return index
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            rows = self[index:index + 1]
+            if not rows:
+                raise IndexError(index)
+            return rows[0]
+
+        start, stop, _ = index.indices(self.count())
+        rows = self.own[start:stop]
+        board_start = max(start - len(self.own), 0)
+        wanted = stop - len(self.own) - board_start
+        if wanted <= 0:
+            return rows
+
+        raw_start = self._raw_index(board_start)
+        members = self.client.zrevrange(self.key, raw_start, raw_start + wanted + len(self._own_ranks) - 1)
+        ids = [member.decode() for member in members]
+        ids = [pk for pk in ids if pk not in self._own_ids][:wanted]
+        hydrated = self.queryset.in_bulk([uuid.UUID(pk) for pk in ids])
+        return rows + [hydrated[uuid.UUID(pk)] for pk in ids if uuid.UUID(pk) in hydrated]
+
+
+class DispatchBoard:
+    """
+    Redis sorted sets of the work waiting for couriers, one per governorate
+    and scored by creation time:
+
+        orders:dispatch:pickup:<to_state>     shipments a courier can accept
+        orders:dispatch:orders:<from_state>   orders with a shipment waiting for a courier
+
+    The boards are kept in line on every Shipment transition (see signals.py
+    and the bulk updates that call sync()), so a courier's poll reads one
+    range in O(log n) instead of joining the shipments table. Until
+    rebuild() has run, or when Redis cannot be reached, the list endpoints
+    fall back to the ORM queries.
+    """
+
+    def _client(self):
+        try:
+            return get_redis_connection("default")
+        except NotImplementedError:
+            # The default cache is not Redis (local development): there is no board.
+            return None
+
+    def is_ready(self, client):
+        return bool(client.exists(BOARD_READY_KEY))
+
+    def sync(self, shipments, deleted=False):
+        """
+        Brings both boards in line with `shipments` (instances or a queryset).
+        Pass deleted=True from post_delete so the rows are only taken off.
+        """
+        shipments = list(shipments)
+        if not shipments:
+            return
+        try:
+            client = self._client()
+            if client is None:
+                return
+            pipe = client.pipeline(transaction=False)
+            states_by_order = defaultdict(set)
+            for shipment in shipments:
+                key = PICKUP_BOARD_KEY.format(shipment.to_state)
+                if not deleted and is_claimable(shipment.status, shipment.delivery_person_id):
+                    pipe.zadd(key, {str(shipment.pk): shipment.created_at.timestamp()})
+                else:
+                    pipe.zrem(key, str(shipment.pk))
+                if shipment.order_id:
+                    states_by_order[shipment.order_id].add(shipment.from_state)
+            self._sync_orders(pipe, states_by_order)
+            pipe.execute()
+        except Exception as e:
+            print(f"Dispatch board update failed: {e}")
+            self._invalidate()
+
+    def _sync_orders(self, pipe, states_by_order):
+        # An order stays on a governorate's board while any of its shipments from there awaits a courier.
+        rows = Shipment.objects.filter(order_id__in=states_by_order.keys()).values_list(
+            'order_id', 'from_state', 'status', 'delivery_person_id', 'order__created_at'
+        )
+        waiting = {}
+        for order_id, from_state, status, delivery_person_id, created_at in rows:
+            states_by_order[order_id].add(from_state)
+            if awaits_courier(status, delivery_person_id):
+                waiting[(order_id, from_state)] = created_at.timestamp()
+
+        for order_id, states in states_by_order.items():
+            for state in states:
+                key = ORDER_BOARD_KEY.format(state)
+                score = waiting.get((order_id, state))
+                if score is not None:
+                    pipe.zadd(key, {str(order_id): score})
+                else:
+                    pipe.zrem(key, str(order_id))
+
+    def _invalidate(self):
+        # A board that missed an update must not be served until it is rebuilt.
+        try:
+            client = self._client()
+            if client is not None:
+                client.delete(BOARD_READY_KEY)
+        except Exception as e:
+            print(f"Dispatch board invalidation failed: {e}")
+
+    def rebuild(self, chunk_size=5000):
+        """
+        Rebuilds every board from the database into temporary keys and swaps
+        them in atomically, dropping the boards of governorates with no work
+        left. Updates made while it runs may be overwritten by the swap;
+        hydration ignores stale ids and the next transition fixes the rest.
+        Returns the number of entries written per board kind.
+        """
+        client = self._client()
+        if client is None:
+            raise RuntimeError("The dispatch board needs the default cache to be Redis.")
+        suffix = f"{REBUILD_KEY_SUFFIX}{uuid.uuid4().hex}"
+        temporary = set()
+        counts = {'pickup': 0, 'orders': 0}
+
+        def write(kind, key_format, rows):
+            pipe = client.pipeline(transaction=False)
+            for index, (pk, state, created_at) in enumerate(rows, 1):
+                key = key_format.format(state) + suffix
+                temporary.add(key)
+                pipe.zadd(key, {str(pk): created_at.timestamp()})
+                pipe.expire(key, REBUILD_KEY_TTL)
+                counts[kind] += 1
+                if index % chunk_size == 0:
+                    pipe.execute()
+            pipe.execute()
+
+        write('pickup', PICKUP_BOARD_KEY, (
+            Shipment.objects.filter(delivery_person__isnull=True, status__in=PICKUP_STATUSES)
+            .values_list('id', 'to_state', 'created_at')
+            .iterator(chunk_size=chunk_size)
+        ))
+        write('orders', ORDER_BOARD_KEY, (
+            Shipment.objects.filter(order__isnull=False, delivery_person__isnull=True)
+            .exclude(status__in=OFF_BOARD_STATUSES)
+            .values_list('order_id', 'from_state', 'order__created_at')
+            .iterator(chunk_size=chunk_size)
+        ))
+
+        live = {key[:-len(suffix)] for key in temporary}
+        stale = [
+            key for key in (key.decode() for key in client.scan_iter(match=BOARD_KEY_PATTERN, count=1000))
+            if REBUILD_KEY_SUFFIX not in key and key not in live
+        ]
+        pipe = client.pipeline(transaction=True)
+        for key in stale:
+            pipe.delete(key)
+        for key in temporary:
+            pipe.rename(key, key[:-len(suffix)])
+            pipe.persist(key[:-len(suffix)])
+        pipe.set(BOARD_READY_KEY, 1)
+        pipe.execute()
+        return counts
+
+    def _sequence(self, key, queryset, own_queryset):
+        try:
+            client = self._client()
+            if client is None or not self.is_ready(client):
+                return None
+            return BoardSequence(client, key, queryset, own_queryset)
+        except Exception as e:
+            print(f"Dispatch board read failed: {e}")
+            return None
+
+    def claimable_shipments(self, delivery):
+        """
+        The courier's shipments on their way followed by the shipments they
+        can accept, or None when the board cannot be used.
+        """
+        shipments = Shipment.objects.select_related('order', 'return_request').prefetch_related('items')
+        return self._sequence(
+            PICKUP_BOARD_KEY.format(delivery.governorate),
+            shipments.filter(
+                to_state=delivery.governorate, delivery_person__isnull=True, status__in=PICKUP_STATUSES
+            ),
+            shipments.filter(delivery_person=delivery, status=Shipment.ShipmentStatus.ON_MY_WAY).order_by('-created_at'),
+        )
+
+    def waiting_orders(self, delivery):
+        """
+        Orders with shipments from the courier's governorate assigned to them,
+        followed by those waiting for a courier, or None when the board cannot be used.
+        """
+        waiting = Shipment.objects.filter(
+            from_state=delivery.governorate, delivery_person__isnull=True
+        ).exclude(status__in=OFF_BOARD_STATUSES)
+        own = Shipment.objects.filter(
+            from_state=delivery.governorate, delivery_person=delivery
+        ).exclude(status__in=OFF_BOARD_STATUSES)
+        return self._sequence(
+            ORDER_BOARD_KEY.format(delivery.governorate),
+            Order.objects.filter(id__in=waiting.values('order_id')),
+            Order.objects.filter(id__in=own.values('order_id')).order_by('-created_at'),
+        )
+
+
+dispatch_board = DispatchBoard()
+
+
+def claim_shipment(shipment_id, delivery):
+    """
+    Assigns a claimable shipment of the courier's governorate to them with one
+    conditional statement,
+
+        UPDATE shipment SET delivery_person = %s, status = 'on my way'
+        WHERE id = %s AND delivery_person IS NULL AND ... RETURNING order_id, supplier_id
+
+    so of any number of couriers racing for a shipment exactly one gets a
+    row back. Returns (order_id, supplier_id), or None when the shipment is
+    already taken or cannot be claimed by this courier.
+    """
+    try:
+        shipment_id = uuid.UUID(str(shipment_id))
+    except ValueError:
+        return None
+
+    meta = Shipment._meta
+    # UPDATE ... RETURNING is PostgreSQL syntax; elsewhere the claim is read back after the update.
+    if connection.vendor != 'postgresql':
+        claimed = Shipment.objects.filter(
+            pk=shipment_id, delivery_person__isnull=True,
+            to_state=delivery.governorate, status__in=PICKUP_STATUSES,
+        ).update(delivery_person=delivery, status=Shipment.ShipmentStatus.ON_MY_WAY)
+        row = Shipment.objects.filter(pk=shipment_id).values_list('order_id', 'supplier_id').first() if claimed else None
+    else:
+        qn = connection.ops.quote_name
+
+        def column(name):
+            return qn(meta.get_field(name).column)
+
+        statuses = ', '.join(['%s'] * len(PICKUP_STATUSES))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {qn(meta.db_table)} SET {column('delivery_person')} = %s, {column('status')} = %s "
+                f"WHERE {column('id')} = %s AND {column('delivery_person')} IS NULL "
+                f"AND {column('to_state')} = %s AND {column('status')} IN ({statuses}) "
+                f"RETURNING {column('order')}, {column('supplier')}",
+                [
+                    delivery.pk, Shipment.ShipmentStatus.ON_MY_WAY,
+                    meta.pk.get_db_prep_value(shipment_id, connection),
+                    delivery.governorate, *PICKUP_STATUSES,
+                ],
+            )
+            row = cursor.fetchone()
+        if row is not None:
+            row = (meta.get_field('order').to_python(row[0]), row[1])
+
+    if row is None:
+        return None
+    # The UPDATE bypasses post_save, so the board is told directly.
+    transaction.on_commit(lambda: dispatch_board.sync(Shipment.objects.filter(pk=shipment_id)))
+    return row
+
+
+def roll_up_order_status(order_id, shipment_status, order_status):
+    """
+    Moves an order to `order_status` once all of its shipments reached
+    `shipment_status`, and returns the order's (user_id, order_number).
+
+    The order row is locked first, so two couriers finishing the last two
+    shipments of an order at the same time cannot both miss the rollup; the
+    shipments are then counted with a single aggregate query.
+    """
+    user_id, order_number = (
+        Order.objects.select_for_update().filter(pk=order_id).values_list('user_id', 'order_number').get()
+    )
+    counts = Shipment.objects.filter(order_id=order_id).aggregate(
+        total=Count('id'), reached=Count('id', filter=Q(status=shipment_status))
+    )
+    if counts['total'] == counts['reached']:
+        Order.objects.filter(pk=order_id).update(status=order_status, updated_at=timezone.now())
+    return user_id, order_number
@@ -0,0 +1,52 @@
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .models import Shipment, SupplierOrderInbox
+
+
+def sync_supplier_inbox(order_ids, prune=False):
+    """
+    Recomputes the inbox rows of the suppliers of `order_ids` from their
+    shipments with one query and one upsert. Runs in the caller's
+    transaction, so the inbox changes together with the shipments. Pass
+    prune=True after shipments were deleted to drop the rows of suppliers
+    left without one.
+    """
+    order_ids = set(order_ids)
+    if not order_ids:
+        return
+
+    statuses = defaultdict(set)
+    created = {}
+    for order_id, supplier_id, status, order_created_at in Shipment.objects.filter(
+        order_id__in=order_ids, supplier__isnull=False
+    ).values_list('order_id', 'supplier_id', 'status', 'order__created_at'):
+        statuses[(supplier_id, order_id)].add(status)
+        created[order_id] = order_created_at
+
+    now = timezone.now()
+    SupplierOrderInbox.objects.bulk_create(
+        [
+            SupplierOrderInbox(
+                supplier_id=supplier_id,
+                order_id=order_id,
+                status_bucket=SupplierOrderInbox.bucket_for(shipment_statuses),
+                order_created_at=created[order_id],
+                updated_at=now,
+            )
+            for (supplier_id, order_id), shipment_statuses in statuses.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['supplier', 'order'],
+        update_fields=['status_bucket', 'updated_at'],
+    )
+
+    if prune:
+        stale_ids = [
+            pk for pk, supplier_id, order_id in SupplierOrderInbox.objects.filter(
+                order_id__in=order_ids
+            ).values_list('id', 'supplier_id', 'order_id')
+            if (supplier_id, order_id) not in statuses
+        ]
+        SupplierOrderInbox.objects.filter(id__in=stale_ids).delete()
@@ -0,0 +1,110 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from orders.numbering import MAX_BORROWED_TICKS, MAX_SEQUENCE, ORDER_NUMBER_PREFIX, OrderNumberGenerator, order_numbers
+
+BENCH_TABLE = "order_number_bench"
+
+
+class _SimulatedClockGenerator(OrderNumberGenerator):
+    """
+    Advances one tick per MAX_SEQUENCE numbers so the burst limit does not cut
+    the run short. It starts at a random past tick, whose counters real orders
+    never use again.
+    """
+
+    def __init__(self, samples):
+        super().__init__()
+        self._calls = 0
+        self._start = random.randrange(OrderNumberGenerator()._now_tick() - samples // MAX_SEQUENCE - 1)
+
+    def _now_tick(self):
+        self._calls += 1
+        return self._start + self._calls // MAX_SEQUENCE
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the time-ordered order number generator with the legacy random "
+        "generator, which checks every candidate against a table of existing numbers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000000, 10000000, 50000000],
+                            help="Existing order counts to measure at.")
+        parser.add_argument('--samples', type=int, default=10000, help="Order numbers generated per measurement.")
+        parser.add_argument('--chunk-size', type=int, default=500000, help="Rows inserted per statement while filling.")
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+            cursor.execute(f"CREATE TABLE {BENCH_TABLE} (order_number varchar(20) PRIMARY KEY)")
+
+        self.stdout.write(
+            f"Time-ordered capacity: {MAX_SEQUENCE} numbers/minute across all processes, "
+            f"bursts of up to {MAX_SEQUENCE * (MAX_BORROWED_TICKS + 1):,}; "
+            f"{order_numbers.fallbacks()} random fallback(s) in the last 15 minutes."
+        )
+        try:
+            existing = 0
+            for size in sorted(options['sizes']):
+                existing = self._fill(existing, size, options['chunk_size'])
+                self._measure(existing, options['samples'])
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+
+    def _fill(self, existing, size, chunk_size):
+        started = time.perf_counter()
+        while existing < size:
+            rows = min(chunk_size, size - existing)
+            with transaction.atomic(), connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute(
+                        f"INSERT INTO {BENCH_TABLE} "
+                        f"SELECT %s || lpad(floor(random() * 1e10)::bigint::text, 10, '0') "
+                        f"FROM generate_series(1, %s) ON CONFLICT DO NOTHING",
+                        [ORDER_NUMBER_PREFIX, rows],
+                    )
+                else:
+                    cursor.execute(
+                        f"INSERT OR IGNORE INTO {BENCH_TABLE} "
+                        f"SELECT %s || substr('0000000000' || (abs(random()) %% 10000000000), -10, 10) "
+                        f"FROM (WITH RECURSIVE seq(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM seq WHERE x < %s) SELECT x FROM seq)",
+                        [ORDER_NUMBER_PREFIX, rows],
+                    )
+                existing += cursor.rowcount
+        self.stdout.write(f"\n{existing:,} existing orders (filled in {time.perf_counter() - started:.1f}s)")
+        return existing
+
+    def _measure(self, existing, samples):
+        with connection.cursor() as cursor:
+            candidates = 0
+            started = time.perf_counter()
+            for _ in range(samples):
+                while True:
+                    candidates += 1
+                    order_number = ORDER_NUMBER_PREFIX + ''.join(random.choices(string.digits, k=10))
+                    cursor.execute(f"SELECT 1 FROM {BENCH_TABLE} WHERE order_number = %s LIMIT 1", [order_number])
+                    if cursor.fetchone() is None:
+                        break
+            legacy = time.perf_counter() - started
+
+        generator = _SimulatedClockGenerator(samples)
+        started = time.perf_counter()
+        numbers = [generator.next() for _ in range(samples)]
+        ordered = time.perf_counter() - started
+
+        assert len(set(numbers)) == samples and numbers == sorted(numbers), "time-ordered numbers must be unique and increasing"
+        self.stdout.write(
+            f"  legacy random:  {samples / legacy:>12,.0f} numbers/s, "
+            f"{legacy / samples * 1e6:8.1f} us each, {candidates / samples:.4f} queries each"
+        )
+        self.stdout.write(
+            f"  time-ordered:   {samples / ordered:>12,.0f} numbers/s, "
+            f"{ordered / samples * 1e6:8.1f} us each, 0 queries and 1 cache increment each"
+        )
@@ -0,0 +1,63 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from orders.pricing import CouponTerms, PricedLine, price_order
+
+GOVERNORATES = [
+    "Alexandria", "Aswan", "Asyut", "Beheira", "Beni Suef", "Cairo",
+    "Dakahlia", "Damietta", "Faiyum", "Gharbia", "Giza", "Ismailia",
+    "Kafr El Sheikh", "Luxor", "Matrouh", "Minya", "Monufia", "New Valley",
+    "North Sinai", "Port Said", "Qalyubia", "Qena", "Red Sea", "Sharqia",
+    "Sohag", "South Sinai", "Suez"
+]
+
+
+class Command(BaseCommand):
+    help = "Measures the throughput of the pure pricing kernel in quotes per second."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quotes', type=int, default=100000, help="Number of quotes to price.")
+        parser.add_argument('--lines', type=int, default=10, help="Cart lines per quote.")
+        parser.add_argument('--suppliers', type=int, default=3, help="Distinct suppliers per quote.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        fees = {
+            (source, destination): Decimal('50.00') if source == destination else Decimal('120.00')
+            for source in GOVERNORATES for destination in GOVERNORATES
+        }
+
+        def delivery_fee(supplier_state, customer_state):
+            return fees[(supplier_state, customer_state)]
+
+        carts = []
+        for _ in range(1000):
+            supplier_states = {supplier_id: rng.choice(GOVERNORATES) for supplier_id in range(options['suppliers'])}
+            lines = [
+                PricedLine(
+                    price=Decimal(rng.randint(1000, 100000)) / 100,
+                    quantity=rng.randint(1, 10),
+                    supplier_id=supplier_id,
+                    supplier_state=supplier_states[supplier_id],
+                )
+                for supplier_id in (rng.randrange(options['suppliers']) for _ in range(options['lines']))
+            ]
+            carts.append((lines, rng.choice(GOVERNORATES)))
+        coupon = CouponTerms(supplier_id=0, discount_type='percentage', discount=Decimal('10.00'),
+                             min_purchase_amount=Decimal('0.00'))
+
+        quotes = options['quotes']
+        started = time.perf_counter()
+        for index in range(quotes):
+            lines, customer_state = carts[index % len(carts)]
+            price_order(lines, customer_state, delivery_fee, coupon if index % 2 else None)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Priced {quotes} quotes of {options['lines']} lines in {elapsed:.3f}s "
+            f"({quotes / elapsed:,.0f} quotes/s, {elapsed / quotes * 1e6:.1f} us/quote)."
+        ))
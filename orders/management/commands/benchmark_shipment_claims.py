@@ -0,0 +1,134 @@
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from accounts.models import Address, Delivery, Supplier, User
+from orders.dispatch import PICKUP_STATUSES, claim_shipment, roll_up_order_status
+from orders.models import Order, Shipment
+
+
+class Command(BaseCommand):
+    help = (
+        "Races couriers for the same shipments and checks that every shipment is claimed exactly "
+        "once, comparing the conditional claim with the old read-then-save claim. It creates its "
+        "own users, orders and shipments and deletes them afterwards; run it on a development database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shipments', type=int, default=1000, help="Shipments raced for per run.")
+        parser.add_argument('--couriers', type=int, default=8, help="Concurrent couriers, one thread each.")
+
+    def handle(self, *args, **options):
+        prefix = f"bench-claims-{uuid.uuid4().hex[:8]}"
+        shipment_ids, couriers = self._create_fixture(prefix, options['shipments'], options['couriers'])
+        try:
+            for mode in ('legacy', 'conditional'):
+                Shipment.objects.filter(id__in=shipment_ids).update(
+                    delivery_person=None, status=Shipment.ShipmentStatus.READY_TO_SHIP
+                )
+                self._report(mode, shipment_ids, *self._race(mode, shipment_ids, couriers))
+        finally:
+            User.objects.filter(email__startswith=prefix).delete()
+
+    def _create_fixture(self, prefix, shipment_count, courier_count):
+        governorate = prefix
+
+        def user(name, **fields):
+            return User(email=f"{prefix}-{name}@example.com", first_name='Bench', last_name=name,
+                        password=make_password(None), **fields)
+
+        customer, supplier_user = User.objects.bulk_create([user('customer'), user('supplier', is_supplier=True)])
+        courier_users = User.objects.bulk_create([user(f'courier{i}', is_delivery=True) for i in range(courier_count)])
+        address = Address.objects.create(user=customer, State=governorate, City=governorate, Street='Bench')
+        supplier = Supplier.objects.create(user=supplier_user, CategoryTitle='Bench')
+        couriers = Delivery.objects.bulk_create([
+            Delivery(user=courier, VehicleModel='Bench', plateNO=str(i), governorate=governorate,
+                     DeliveryContract='bench', DeliveryIdentity='bench', accepted_delivery=True)
+            for i, courier in enumerate(courier_users)
+        ])
+
+        # Two shipments per order, so the status rollup has work to do.
+        orders = [Order(user=customer, address=address) for _ in range((shipment_count + 1) // 2)]
+        for order in orders:
+            order.order_number = order.generate_order_number()
+        Order.objects.bulk_create(orders)
+        shipments = Shipment.objects.bulk_create([
+            Shipment(order=orders[i // 2], supplier=supplier, from_state=governorate, to_state=governorate,
+                     status=Shipment.ShipmentStatus.READY_TO_SHIP)
+            for i in range(shipment_count)
+        ])
+        return [shipment.id for shipment in shipments], couriers
+
+    def _race(self, mode, shipment_ids, couriers):
+        barrier = threading.Barrier(len(couriers))
+        wins = Counter()
+        errors = Counter()
+        lock = threading.Lock()
+
+        def run(delivery):
+            won, failed = [], 0
+            barrier.wait()
+            for shipment_id in shipment_ids:
+                try:
+                    if self._claim(mode, shipment_id, delivery):
+                        won.append(shipment_id)
+                except Exception:
+                    failed += 1
+            connection.close()
+            with lock:
+                wins.update(won)
+                errors[delivery.pk] += failed
+
+        threads = [threading.Thread(target=run, args=(delivery,)) for delivery in couriers]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return wins, sum(errors.values()), time.perf_counter() - started, len(couriers)
+
+    def _claim(self, mode, shipment_id, delivery):
+        with transaction.atomic():
+            if mode == 'conditional':
+                claimed = claim_shipment(shipment_id, delivery)
+                if claimed is None:
+                    return False
+                roll_up_order_status(claimed[0], Shipment.ShipmentStatus.ON_MY_WAY, Order.OrderStatus.ON_MY_WAY)
+                return True
+
+            # What ShipmentViewSet.accept used to do.
+            try:
+                shipment = Shipment.objects.get(
+                    pk=shipment_id, delivery_person=None, to_state=delivery.governorate, status__in=PICKUP_STATUSES
+                )
+            except Shipment.DoesNotExist:
+                return False
+            shipment.delivery_person = delivery
+            shipment.status = Shipment.ShipmentStatus.ON_MY_WAY
+            shipment.save()
+            order = shipment.order
+            if not order.shipments.exclude(status=Shipment.ShipmentStatus.ON_MY_WAY).exists():
+                order.status = Order.OrderStatus.ON_MY_WAY
+                order.save()
+            return True
+
+    def _report(self, mode, shipment_ids, wins, errors, elapsed, courier_count):
+        attempts = len(shipment_ids) * courier_count
+        claims = sum(wins.values())
+        duplicates = sum(count - 1 for count in wins.values() if count > 1)
+        unclaimed = len(shipment_ids) - len(wins)
+        assigned = Shipment.objects.filter(id__in=shipment_ids, delivery_person__isnull=False).count()
+        self.stdout.write(
+            f"{mode:>12}: {claims} claim(s) for {len(shipment_ids)} shipment(s) by {courier_count} courier(s), "
+            f"{duplicates} double claim(s), {unclaimed} unclaimed, {errors} error(s), {assigned} assigned; "
+            f"{claims / elapsed:,.0f} claims/s, {attempts / elapsed:,.0f} attempts/s"
+        )
+        if mode == 'conditional':
+            exactly_once = not duplicates and not unclaimed and assigned == len(shipment_ids)
+            style = self.style.SUCCESS if exactly_once else self.style.ERROR
+            self.stdout.write(style(f"Exactly-once claims: {'yes' if exactly_once else 'no'}"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from orders.cancellation import cancel_expired_card_orders
+from orders.models import CancellationJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Cancels unpaid credit card orders past the payment window in chunks, restocking their "
+        "products and reversing their cashback. An interrupted run resumes from its last chunk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Orders cancelled per transaction.")
+        parser.add_argument('--max-chunks', type=int, default=None, help="Stop after this many chunks.")
+        parser.add_argument('--stats', action='store_true', help="Only print the progress of the running or last job.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            job = CancellationJob.objects.first()
+            self.stdout.write(self._describe(job) if job else "No cancellation job has run yet.")
+            return
+
+        job = cancel_expired_card_orders(options['chunk_size'], options['max_chunks'], self._report)
+        self.stdout.write(self.style.SUCCESS(self._describe(job)))
+
+    def _report(self, job, summary, elapsed):
+        rate = summary['cancelled'] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Chunk: {summary['cancelled']} order(s), {summary['restocked_units']} unit(s) restocked "
+            f"in {elapsed:.3f}s ({rate:,.0f} orders/s); {job.cancelled_count} cancelled so far"
+        )
+
+    def _describe(self, job):
+        return (
+            f"Job {job.id} {job.status}: cutoff {job.cutoff:%Y-%m-%d %H:%M}, {job.cancelled_count} order(s) "
+            f"cancelled, {job.restocked_units} unit(s) restocked, {job.refunded_amount} refunded."
+        )
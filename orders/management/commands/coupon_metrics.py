@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from orders.redemption import METRICS, coupon_redemptions
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints coupon quote, redemption and rejection counts over the last minutes, including "
+        "invalid codes answered from the negative cache. --reconcile first resets the Redis "
+        "counters from the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=15, help="Length of the window, in minutes.")
+        parser.add_argument('--reconcile', action='store_true', help="Reset the coupon counters from the database first.")
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            self.stdout.write(f"Reconciled the counters of {coupon_redemptions.reconcile()} coupon(s).")
+
+        metrics = coupon_redemptions.metrics(options['minutes'])
+        self.stdout.write(f"Last {options['minutes']} minute(s):")
+        for metric in METRICS:
+            self.stdout.write(f"  {metric:>15}: {metrics[metric]}")
+        self.stdout.write(
+            f"  {metrics['redemptions_per_minute']} redemption(s)/minute, "
+            f"{metrics['rejection_rate']:.2%} of redemption attempts rejected"
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import Shipment
+from orders.settlement import retry_failed_settlements, settle_delivered_shipments, settlement_metrics, settlement_queue
+
+
+class Command(BaseCommand):
+    help = "Settles queued delivered shipments in batches and reports settlement metrics."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Shipments per batch (defaults to SETTLEMENT_BATCH_SIZE).")
+        parser.add_argument('--max-batches', type=int, default=0, help="Stop after this many batches (0 drains the queue).")
+        parser.add_argument('--stats', action='store_true', help="Only print the queue depth and the last batch metrics.")
+        parser.add_argument('--retry-failed', action='store_true', help="Put the shipments that could not be settled back in the queue first.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(f"Queued shipments: {settlement_queue().count()}")
+            failed = Shipment.objects.filter(settled_at__isnull=True).exclude(settlement_error='').count()
+            self.stdout.write(f"Shipments that could not be settled: {failed}")
+            self.stdout.write(f"Last batch: {settlement_metrics()}")
+            return
+        if options['retry_failed']:
+            self.stdout.write(f"Requeued {retry_failed_settlements()} shipment(s).")
+
+        batches = 0
+        while not options['max_batches'] or batches < options['max_batches']:
+            metrics = settle_delivered_shipments(options['batch_size'])
+            if not metrics['claimed']:
+                break
+            batches += 1
+            self.stdout.write(
+                f"Batch {batches}: {metrics['batch_size']} shipment(s), {metrics['failed']} failed, "
+                f"{metrics['ledger_rows']} ledger rows, {metrics['rows_per_second']} rows/s, lag {metrics['lag_seconds']}s"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Settled {batches} batch(es)."))
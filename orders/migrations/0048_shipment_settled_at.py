@@ -0,0 +1,33 @@
+# Generated by Django 5.0.3 on 2026-10-18 20:34
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Coalesce, Now
+
+
+def mark_delivered_shipments_settled(apps, schema_editor):
+    # Shipments delivered before the settlement queue were paid out one by one.
+    Shipment = apps.get_model('orders', 'Shipment')
+    Shipment.objects.filter(status='delivered successfully').update(
+        settled_at=Coalesce(F('delivery_confirmed_at'), Now())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0047_cart_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='settled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_delivered_shipments_settled, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(condition=models.Q(('settled_at__isnull', True), ('status', 'delivered successfully')), fields=['delivery_confirmed_at'], name='shipment_settlement_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.3 on 2026-10-18 20:47
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0048_shipment_settled_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CancellationJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed')], default='running', max_length=20)),
+                ('cutoff', models.DateTimeField()),
+                ('last_created_at', models.DateTimeField(blank=True, null=True)),
+                ('last_order_id', models.UUIDField(blank=True, null=True)),
+                ('cancelled_count', models.PositiveIntegerField(default=0)),
+                ('restocked_units', models.PositiveBigIntegerField(default=0)),
+                ('refunded_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('paid', False), ('payment_method', 'Credit Card'), ('status', 'created')), fields=['created_at', 'id'], name='order_unpaid_card_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cancellationjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'running')), fields=('status',), name='one_running_cancellation_job'),
+        ),
+    ]
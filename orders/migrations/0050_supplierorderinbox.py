@@ -0,0 +1,56 @@
+# Generated by Django 5.0.3 on 2026-10-18 20:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_supplier_inbox(apps, schema_editor):
+    Shipment = apps.get_model('orders', 'Shipment')
+    SupplierOrderInbox = apps.get_model('orders', 'SupplierOrderInbox')
+
+    rows = {}
+    shipments = (
+        Shipment.objects.filter(order__isnull=False, supplier__isnull=False)
+        .values_list('supplier_id', 'order_id', 'status', 'order__created_at')
+        .iterator(chunk_size=5000)
+    )
+    for supplier_id, order_id, status, order_created_at in shipments:
+        row = rows.get((supplier_id, order_id))
+        if row is None:
+            row = rows[(supplier_id, order_id)] = SupplierOrderInbox(
+                supplier_id=supplier_id, order_id=order_id, status_bucket='completed', order_created_at=order_created_at
+            )
+        if status == 'created':
+            row.status_bucket = 'uncompleted'
+    SupplierOrderInbox.objects.bulk_create(rows.values(), batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_alter_user_balance'),
+        ('orders', '0049_cancellationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierOrderInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status_bucket', models.CharField(choices=[('uncompleted', 'Uncompleted'), ('completed', 'Completed')], default='uncompleted', max_length=20)),
+                ('order_created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='supplier_inbox', to='orders.order')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_inbox', to='accounts.supplier')),
+            ],
+            options={
+                'ordering': ['-order_created_at', '-order_id'],
+                'indexes': [models.Index(fields=['supplier', 'status_bucket', '-order_created_at', '-order'], name='supplier_inbox_bucket_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='supplierorderinbox',
+            constraint=models.UniqueConstraint(fields=('supplier', 'order'), name='unique_supplier_order_inbox'),
+        ),
+        migrations.RunPython(fill_supplier_inbox, migrations.RunPython.noop),
+    ]
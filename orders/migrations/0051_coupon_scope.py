@@ -0,0 +1,37 @@
+# Generated by Django 5.0.3 on 2026-10-18 21:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def drop_materialized_coupon_products(apps, schema_editor):
+    # Every existing coupon listed all of its supplier's products; it becomes supplier-wide instead.
+    Coupon = apps.get_model('orders', 'Coupon')
+    Coupon.products.through.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0050_supplierorderinbox'),
+        ('products', '0013_product_products_pr_product_971b37_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='coupons', to='products.category'),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='scope',
+            field=models.CharField(choices=[('supplier', 'Supplier'), ('category', 'Category'), ('products', 'Products')], default='supplier', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(drop_materialized_coupon_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 21:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0051_coupon_scope'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='couponusage',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='couponusage',
+            index=models.Index(fields=['user', 'coupon'], name='coupon_usage_user_idx'),
+        ),
+    ]
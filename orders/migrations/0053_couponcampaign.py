@@ -0,0 +1,44 @@
+# Generated by Django 5.0.3 on 2026-10-18 21:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_alter_user_balance'),
+        ('orders', '0052_couponusage_per_use'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CouponCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('prefix', models.CharField(blank=True, max_length=12)),
+                ('codes_requested', models.PositiveIntegerField()),
+                ('codes_generated', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('generating', 'Generating'), ('ready', 'Ready')], default='generating', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('coupon', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='campaign', to='orders.coupon')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coupon_campaigns', to='accounts.supplier')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CampaignCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, unique=True)),
+                ('redeemed_at', models.DateTimeField(blank=True, null=True)),
+                ('redeemed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='codes', to='orders.couponcampaign')),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.3 on 2026-10-18 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0053_couponcampaign'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='shipment',
+            name='shipment_settlement_queue_idx',
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='settlement_error',
+            field=models.CharField(blank=True, max_length=250),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(condition=models.Q(('settled_at__isnull', True), ('settlement_error', ''), ('status', 'delivered successfully')), fields=['delivery_confirmed_at'], name='shipment_settlement_queue_idx'),
+        ),
+    ]
@@ -1,22 +1,24 @@
 from django.utils.translation import gettext_lazy as _
 from django.db import models
-from products.models import Product
+from products.models import Category, Product
 from accounts.models import User, Address, Supplier, Delivery
 import uuid
 from django.contrib.auth import get_user_model
-from django.db.models import Q, CheckConstraint
+from django.db.models import F, Q, CheckConstraint
 import random
+import secrets
 import string
 from django.core.validators import MinValueValidator
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from returnrequest.models import ReturnRequest
+from .numbering import order_numbers
 
 class OrderManager(models.Manager):
     def for_delivery_person(self, user):
         return self.filter(
             Q(shipments__from_state=user.delivery.governorate) &
-            (Q(shipments__delivery_person=user) | Q(shipments__delivery_person__isnull=True)) &
+            (Q(shipments__delivery_person=user.delivery) | Q(shipments__delivery_person__isnull=True)) &
             ~Q(shipments__status__in=[
                 Shipment.ShipmentStatus.DELIVERED_SUCCESSFULLY,
                 Shipment.ShipmentStatus.ON_MY_WAY,
@@ -59,10 +61,15 @@ class Cart(models.Model):
     id = models.UUIDField(default=uuid.uuid4, primary_key=True)
     User = models.OneToOneField(User, on_delete=models.CASCADE)
     Created_at = models.DateTimeField(auto_now_add=True,blank=True, null=True)
+    version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"Cart ID:{self.id} for {self.User.get_full_name}"
 
+    def bump_version(self):
+        Cart.objects.filter(pk=self.pk).update(version=F('version') + 1)
+        self.version += 1
+
 class CartItems(models.Model):
     CartID = models.ForeignKey(Cart, on_delete=models.CASCADE,related_name="items", null=True, blank=True)
     Product = models.ForeignKey(Product, on_delete=models.CASCADE,related_name='cartitems',null=True, blank=True)
@@ -112,6 +119,15 @@ class Order(models.Model):
         return f"Order ID: {self.order_number} for {self.user.email}"
 
     def generate_order_number(self):
+        order_number = order_numbers.next()
+        if order_number:
+            return order_number
+
+        # The sequence is unreachable or used up: fall back to a random number checked against the table.
+        order_numbers.fallback()
+        return self.random_order_number()
+
+    def random_order_number(self):
         prefix = '20'
         while True:
             unique_part = ''.join(random.choices(string.digits, k=10))
@@ -121,7 +137,14 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
-        indexes = [models.Index(fields=["user", "created_at"])]
+        indexes = [
+            models.Index(fields=["user", "created_at"]),
+            models.Index(
+                fields=["created_at", "id"],
+                name="order_unpaid_card_idx",
+                condition=Q(payment_method="Credit Card", paid=False, status="created"),
+            ),
+        ]
 
 @receiver(pre_save, sender=Order)
 def set_order_number(sender, instance, **kwargs):
@@ -153,9 +176,20 @@ class Shipment(models.Model):
     delivery_confirmed_at = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=50, choices=ShipmentStatus.choices, default=ShipmentStatus.CREATED)
     order_total_value = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
+    settled_at = models.DateTimeField(null=True, blank=True)
+    # Why the shipment could not be settled; such shipments leave the settlement queue until it is cleared.
+    settlement_error = models.CharField(max_length=250, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
+        indexes = [
+            # The settlement queue: delivered shipments whose payments have not been posted yet.
+            models.Index(
+                fields=['delivery_confirmed_at'],
+                condition=Q(status='delivered successfully', settled_at__isnull=True, settlement_error=''),
+                name='shipment_settlement_queue_idx',
+            ),
+        ]
         constraints = [
             CheckConstraint(
                 check=(
@@ -166,9 +200,14 @@ class Shipment(models.Model):
             )
         ]
 
+    @staticmethod
+    def generate_confirmation_code():
+        # The code proves delivery to the customer, so it must not be predictable.
+        return ''.join(secrets.choice(string.digits) for _ in range(4))
+
     def save(self, *args, **kwargs):
         if not self.confirmation_code:
-            self.confirmation_code = ''.join(random.choices(string.digits, k=4))
+            self.confirmation_code = self.generate_confirmation_code()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -223,6 +262,11 @@ class Coupon(models.Model):
         PERCENTAGE = 'percentage'
         FIXED_AMOUNT = 'fixed_amount'
 
+    class Scope(models.TextChoices):
+        SUPPLIER = 'supplier'    # every product of the supplier, including ones added later
+        CATEGORY = 'category'    # the supplier's products in `category`
+        PRODUCTS = 'products'    # only the products listed in `products`
+
     supplier = models.ForeignKey(Supplier, related_name='coupons', on_delete=models.CASCADE)
     code = models.CharField(max_length=50, unique=True)
     discount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
@@ -235,7 +279,10 @@ class Coupon(models.Model):
     uses_count = models.IntegerField(default=0)
     max_uses_per_user = models.IntegerField(default=1)
     terms = models.TextField()
+    scope = models.CharField(max_length=10, choices=Scope.choices, default=Scope.SUPPLIER)
+    category = models.ForeignKey(Category, related_name='coupons', on_delete=models.CASCADE, null=True, blank=True)
     products = models.ManyToManyField(Product, related_name='coupons', blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.code
@@ -246,7 +293,41 @@ class CouponUsage(models.Model):
     used_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('user', 'coupon')
+        # One row per use, so a coupon can allow a user more than one (max_uses_per_user).
+        indexes = [models.Index(fields=['user', 'coupon'], name='coupon_usage_user_idx')]
+
+class CouponCampaign(models.Model):
+    """
+    A batch of single-use codes sharing the rules of one hidden coupon. The
+    codes are generated in the background (see orders/campaigns.py).
+    """
+    class CampaignStatus(models.TextChoices):
+        GENERATING = 'generating'
+        READY = 'ready'
+
+    supplier = models.ForeignKey(Supplier, related_name='coupon_campaigns', on_delete=models.CASCADE)
+    coupon = models.OneToOneField(Coupon, related_name='campaign', on_delete=models.CASCADE)
+    name = models.CharField(max_length=100)
+    prefix = models.CharField(max_length=12, blank=True)
+    codes_requested = models.PositiveIntegerField()
+    codes_generated = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=CampaignStatus.choices, default=CampaignStatus.GENERATING)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.name} ({self.codes_generated}/{self.codes_requested} codes)"
+
+class CampaignCode(models.Model):
+    campaign = models.ForeignKey(CouponCampaign, related_name='codes', on_delete=models.CASCADE)
+    code = models.CharField(max_length=50, unique=True)
+    redeemed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    redeemed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.code
 
 class Warehouse(models.Model):
     name = models.CharField(max_length=100)
@@ -256,4 +337,91 @@ class Warehouse(models.Model):
     delivery_fee= models.DecimalField(max_digits=5, decimal_places=2)
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class StockReservation(models.Model):
+    class ReservationStatus(models.TextChoices):
+        HELD = 'held'
+        CONSUMED = 'consumed'
+        RELEASED = 'released'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="stock_reservations")
+    status = models.CharField(max_length=20, choices=ReservationStatus.choices, default=ReservationStatus.HELD)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "expires_at"])]
+
+    def __str__(self):
+        return f"Stock reservation {self.id} ({self.status}) for {self.user.email}"
+
+
+class StockReservationItem(models.Model):
+    reservation = models.ForeignKey(StockReservation, on_delete=models.CASCADE, related_name="items")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_reservation_items")
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.ProductName} reserved"
+
+
+class CancellationJob(models.Model):
+    class JobStatus(models.TextChoices):
+        RUNNING = 'running'
+        COMPLETED = 'completed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=20, choices=JobStatus.choices, default=JobStatus.RUNNING)
+    cutoff = models.DateTimeField()
+    last_created_at = models.DateTimeField(null=True, blank=True)
+    last_order_id = models.UUIDField(null=True, blank=True)
+    cancelled_count = models.PositiveIntegerField(default=0)
+    restocked_units = models.PositiveBigIntegerField(default=0)
+    refunded_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0.0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["status"], condition=Q(status="running"), name="one_running_cancellation_job"),
+        ]
+
+    def __str__(self):
+        return f"Cancellation job {self.id} ({self.status}): {self.cancelled_count} order(s)"
+
+
+class SupplierOrderInbox(models.Model):
+    class StatusBucket(models.TextChoices):
+        UNCOMPLETED = 'uncompleted'
+        COMPLETED = 'completed'
+
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name="order_inbox")
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="supplier_inbox")
+    status_bucket = models.CharField(max_length=20, choices=StatusBucket.choices, default=StatusBucket.UNCOMPLETED)
+    order_created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-order_created_at", "-order_id"]
+        constraints = [
+            models.UniqueConstraint(fields=["supplier", "order"], name="unique_supplier_order_inbox"),
+        ]
+        indexes = [
+            models.Index(fields=["supplier", "status_bucket", "-order_created_at", "-order"], name="supplier_inbox_bucket_idx"),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id} in the {self.status_bucket} inbox of {self.supplier}"
+
+    @classmethod
+    def bucket_for(cls, shipment_statuses):
+        """An order waits on its supplier while any of the supplier's shipments for it is still created."""
+        if Shipment.ShipmentStatus.CREATED in shipment_statuses:
+            return cls.StatusBucket.UNCOMPLETED
+        return cls.StatusBucket.COMPLETED
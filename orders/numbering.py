@@ -0,0 +1,149 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache, caches
+from django.utils.connection import ConnectionProxy
+
+ORDER_NUMBER_PREFIX = '20'
+
+# The 10 digits after the prefix hold a 33-bit value:
+#
+#     | 24 bits: minutes since EPOCH | 9 bits: sequence |
+#
+# 2**33 < 10**10, so the value always fits in 10 zero-padded digits. 24 bits
+# of minutes last about 32 years. The sequence of a minute is one counter in
+# the shared cache for the whole cluster, so any number of processes share its
+# 512 numbers, and bursts borrow from the following minutes. Ten digits hold
+# 10**10 numbers in all, so over 32 years no layout sustains more than about
+# 10 numbers a second; borrowing lets peaks far above that through as long as
+# the average stays below it.
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc).timestamp()
+TICK_SECONDS = 60
+TIME_BITS = 24
+SEQUENCE_BITS = 9
+
+MAX_SEQUENCE = 1 << SEQUENCE_BITS
+MAX_TICK = (1 << TIME_BITS) - 1
+
+# The cluster may run this many ticks (a day) ahead of the clock during a burst.
+MAX_BORROWED_TICKS = 60 * 24
+# A tick's counter outlives the last moment it can be issued from, the end of the tick.
+SEQUENCE_TTL = (MAX_BORROWED_TICKS + 2) * TICK_SECONDS
+SEQUENCE_CACHE_KEY = "orders:order_number:sequence:{}"
+# The counters live in a cache of their own (see CACHES in settings): an
+# evicted or flushed counter restarts its minute and reissues numbers.
+sequence_cache = ConnectionProxy(caches, 'order_numbers')
+
+FALLBACK_METRIC_KEY = "orders:order_number:fallbacks:{}"
+METRIC_BUCKET_SECONDS = 60
+METRIC_TTL = 60 * 60 * 2
+
+
+class OrderNumberGenerator:
+    """
+    Issues time-ordered order numbers without touching the database.
+
+    Every number takes the next value of its minute's counter in the shared
+    cache, one atomic increment, so numbers are unique and increasing across
+    all processes. Once a minute's sequence is used up, numbers come from the
+    next minute's counter, up to MAX_BORROWED_TICKS ahead; the process skips
+    the minutes it found full on later calls. next() returns None when the
+    cache is unreachable or the borrowing window is used up; callers then
+    fall back to a checked random number and report it with fallback().
+    If a counter is lost anyway, the numbers it reissues clash on the
+    unique index and skip_past() moves it beyond the ones already used.
+    """
+
+    def __init__(self):
+        # The first tick this process has not seen full yet.
+        self._tick = -1
+
+    def _now_tick(self):
+        return int((time.time() - EPOCH) // TICK_SECONDS)
+
+    def _format(self, tick, sequence):
+        return f"{ORDER_NUMBER_PREFIX}{(tick << SEQUENCE_BITS) | sequence:010d}"
+
+    def _parse(self, order_number):
+        """The (tick, sequence) of a generated `order_number`, or None if it is not one."""
+        digits = order_number[len(ORDER_NUMBER_PREFIX):]
+        if not order_number.startswith(ORDER_NUMBER_PREFIX) or len(digits) != 10 or not digits.isdigit():
+            return None
+        return divmod(int(digits), MAX_SEQUENCE)
+
+    def _take(self, tick):
+        """The next sequence number of `tick`, which may be past MAX_SEQUENCE."""
+        key = SEQUENCE_CACHE_KEY.format(tick)
+        try:
+            return sequence_cache.incr(key) - 1
+        except ValueError:
+            if sequence_cache.add(key, 1, SEQUENCE_TTL):
+                return 0
+            return sequence_cache.incr(key) - 1
+
+    def next(self):
+        now_tick = self._now_tick()
+        tick = max(now_tick, self._tick)
+        try:
+            while tick <= min(now_tick + MAX_BORROWED_TICKS, MAX_TICK):
+                sequence = self._take(tick)
+                if sequence < MAX_SEQUENCE:
+                    self._tick = tick
+                    return self._format(tick, sequence)
+                tick += 1
+        except Exception as e:
+            print(f"Order number sequence failed: {e}")
+        return None
+
+    def tick_bounds(self, order_number):
+        """
+        The first and last numbers of the minute `order_number` was issued
+        in, or None unless it is a number next() could still issue.
+        """
+        parsed = self._parse(order_number)
+        if parsed is None:
+            return None
+        now_tick = self._now_tick()
+        if not now_tick - 1 <= parsed[0] <= now_tick + MAX_BORROWED_TICKS:
+            return None
+        return self._format(parsed[0], 0), self._format(parsed[0], MAX_SEQUENCE - 1)
+
+    def skip_past(self, order_number):
+        """
+        Moves the counter of `order_number`'s minute past it, so the minute
+        no longer issues it or any number before it. Called with the highest
+        number of the minute in the table after a number clashed.
+        """
+        parsed = self._parse(order_number)
+        if parsed is None:
+            return
+        tick, sequence = parsed
+        key = SEQUENCE_CACHE_KEY.format(tick)
+        try:
+            # The counter holds how many numbers were taken, so it has to reach sequence + 1.
+            if sequence_cache.add(key, sequence + 1, SEQUENCE_TTL):
+                return
+            behind = sequence + 1 - (sequence_cache.get(key) or 0)
+            if behind > 0:
+                sequence_cache.incr(key, behind)
+        except Exception as e:
+            print(f"Order number sequence could not skip past {order_number}: {e}")
+
+    def fallback(self):
+        """Counts and logs an order number that had to come from the random fallback."""
+        print("Order number sequence unavailable, falling back to a random order number.")
+        key = FALLBACK_METRIC_KEY.format(int(time.time() // METRIC_BUCKET_SECONDS))
+        try:
+            cache.add(key, 0, METRIC_TTL)
+            cache.incr(key)
+        except Exception as e:
+            print(f"Order number metric update failed: {e}")
+
+    def fallbacks(self, minutes=15):
+        """How many order numbers came from the random fallback over the last `minutes` minutes."""
+        bucket = int(time.time() // METRIC_BUCKET_SECONDS)
+        keys = [FALLBACK_METRIC_KEY.format(b) for b in range(bucket - minutes + 1, bucket + 1)]
+        return sum(cache.get_many(keys).values())
+
+
+order_numbers = OrderNumberGenerator()
@@ -0,0 +1,86 @@
+from collections import namedtuple
+from decimal import Decimal
+
+from rest_framework.exceptions import ValidationError
+
+ZERO = Decimal('0.00')
+HUNDRED = Decimal('100.00')
+
+PERCENTAGE = 'percentage'
+FIXED_AMOUNT = 'fixed_amount'
+
+SCOPE_SUPPLIER = 'supplier'
+SCOPE_CATEGORY = 'category'
+SCOPE_PRODUCTS = 'products'
+
+# (UnitPrice, Quantity, supplier user id, supplier state, product id, category id) for one cart line.
+PricedLine = namedtuple(
+    'PricedLine', ['price', 'quantity', 'supplier_id', 'supplier_state', 'product_id', 'category_id'],
+    defaults=[None, None],
+)
+
+# Which of the supplier's products a coupon covers: all of them, those of one
+# category, or an explicit set of product ids.
+CouponScope = namedtuple('CouponScope', ['kind', 'category_id', 'product_ids'], defaults=[None, frozenset()])
+
+# The parts of a validated coupon that affect the price. A missing scope means supplier-wide.
+CouponTerms = namedtuple(
+    'CouponTerms', ['supplier_id', 'discount_type', 'discount', 'min_purchase_amount', 'scope'],
+    defaults=[None],
+)
+
+
+def covers(scope, line):
+    """Whether a coupon of `scope` applies to `line` of its supplier; one set or id lookup."""
+    if scope is None or scope.kind == SCOPE_SUPPLIER:
+        return True
+    if scope.kind == SCOPE_CATEGORY:
+        return line.category_id is not None and line.category_id == scope.category_id
+    return line.product_id in scope.product_ids
+
+
+def price_order(lines, customer_state, delivery_fee, coupon=None):
+    """
+    Pure pricing kernel: no ORM access, only plain values in and out.
+
+    `lines` is an iterable of PricedLine, `delivery_fee(supplier_state, customer_state)`
+    returns the fee of one supplier's shipment and `coupon` is an optional CouponTerms.
+    The coupon's minimum purchase applies to its supplier's shipment, and its
+    discount to the lines of that shipment its scope covers.
+    """
+    supplier_totals = {}
+    supplier_states = {}
+    eligible_total = ZERO
+    for line in lines:
+        line_total = line.price * line.quantity
+        supplier_totals[line.supplier_id] = supplier_totals.get(line.supplier_id, ZERO) + line_total
+        supplier_states[line.supplier_id] = line.supplier_state
+        if coupon is not None and coupon.supplier_id == line.supplier_id and covers(coupon.scope, line):
+            eligible_total += line_total
+
+    total_amount = ZERO
+    discount_amount = ZERO
+    total_delivery_fee = ZERO
+
+    for supplier_id, shipment_total in supplier_totals.items():
+        shipment_discount = ZERO
+
+        if coupon is not None and coupon.supplier_id == supplier_id:
+            if shipment_total < coupon.min_purchase_amount:
+                raise ValidationError({"message": f"Minimum purchase amount of {coupon.min_purchase_amount} not met for this coupon."})
+
+            if coupon.discount_type == PERCENTAGE:
+                shipment_discount = (coupon.discount / HUNDRED) * eligible_total
+            elif coupon.discount_type == FIXED_AMOUNT:
+                shipment_discount = min(coupon.discount, eligible_total)
+
+        total_amount += shipment_total
+        discount_amount += shipment_discount
+        total_delivery_fee += delivery_fee(supplier_states[supplier_id], customer_state)
+
+    return {
+        'total_amount': total_amount,
+        'discount_amount': discount_amount,
+        'delivery_fee': total_delivery_fee,
+        'final_amount': total_amount - discount_amount + total_delivery_fee,
+    }
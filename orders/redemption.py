@@ -0,0 +1,279 @@
+import datetime
+import hashlib
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework.exceptions import ValidationError
+
+from .campaigns import resolve_campaign_code
+from .models import CampaignCode, Coupon, CouponUsage
+
+COUPON_CODE_CACHE_KEY = "orders:coupon:code:{}"
+COUPON_CODE_TTL = 60
+# Codes that match no coupon are remembered this long, so repeated guesses skip the database.
+INVALID_CODE_TTL = 60 * 5
+COUNTER_KEY = "orders:coupon:{}:uses"
+USER_COUNTERS_KEY = "orders:coupon:{}:users"
+# Counters outlive the coupon by this much, then expire on their own.
+COUNTER_GRACE = datetime.timedelta(days=1)
+
+METRIC_KEY = "orders:coupon:metrics:{}:{}"
+METRIC_BUCKET_SECONDS = 60
+METRIC_TTL = 60 * 60 * 2
+METRICS = ('quoted', 'redeemed', 'released', 'exhausted', 'user_limit', 'invalid', 'invalid_cached')
+
+EXHAUSTED_MESSAGE = "This coupon has exceeded its total usage limit."
+USER_LIMIT_MESSAGE = "Coupon usage limit reached for this user."
+INVALID_MESSAGE = "Invalid or expired coupon."
+USED_CODE_MESSAGE = "This coupon code has already been used."
+
+SEED_NEEDED, EXHAUSTED, USER_LIMIT, REDEEMED = -1, 0, 2, 1
+
+# KEYS: global counter, per-user counters. ARGV: max uses, max uses per user, user id, delta.
+# With a delta of 0 it only checks; with 1 it checks and takes one use; with -1 it gives one back.
+REDEEM_SCRIPT = """
+local uses = redis.call('GET', KEYS[1])
+local mine = redis.call('HGET', KEYS[2], ARGV[3])
+if not uses or not mine then
+    return -1
+end
+local delta = tonumber(ARGV[4])
+if delta >= 0 then
+    if tonumber(uses) >= tonumber(ARGV[1]) then
+        return 0
+    end
+    if tonumber(mine) >= tonumber(ARGV[2]) then
+        return 2
+    end
+end
+if delta ~= 0 then
+    redis.call('INCRBY', KEYS[1], delta)
+    redis.call('HINCRBY', KEYS[2], ARGV[3], delta)
+end
+return 1
+"""
+
+
+def _code_key(template, code):
+    # Codes are user input; hash them so any string makes a valid cache key.
+    return template.format(hashlib.sha1(code.encode()).hexdigest())
+
+
+class Redemption:
+    """One use of a coupon taken from the counters, to be recorded with the order or given back."""
+
+    def __init__(self, coupon, user, code):
+        self.coupon = coupon
+        self.user = user
+        self.code = code
+
+    def record(self):
+        """
+        Writes the use to the database, inside the order's transaction. The
+        guarded UPDATE keeps max_uses even when the Redis counters are off.
+        """
+        updated = Coupon.objects.filter(pk=self.coupon.pk, uses_count__lt=F('max_uses')).update(
+            uses_count=F('uses_count') + 1
+        )
+        if not updated:
+            raise ValidationError({"message": EXHAUSTED_MESSAGE})
+        if CouponUsage.objects.filter(user=self.user, coupon=self.coupon).count() >= self.coupon.max_uses_per_user:
+            raise ValidationError({"message": USER_LIMIT_MESSAGE})
+        CouponUsage.objects.create(user=self.user, coupon=self.coupon)
+
+        campaign_code_id = getattr(self.coupon, 'campaign_code_id', None)
+        if campaign_code_id is not None:
+            # Campaign codes are single-use: the first order to commit takes the code.
+            redeemed = CampaignCode.objects.filter(pk=campaign_code_id, redeemed_at__isnull=True).update(
+                redeemed_by=self.user, redeemed_at=timezone.now()
+            )
+            if not redeemed:
+                raise ValidationError({"message": USED_CODE_MESSAGE})
+            transaction.on_commit(lambda: cache.delete(_code_key(COUPON_CODE_CACHE_KEY, self.code)))
+
+
+class CouponRedemptions:
+    """
+    Looks up, checks and redeems coupons, and the single-use codes of
+    coupon campaigns, which share the counters of their campaign's coupon.
+
+    Codes are resolved through the cache: known codes for COUPON_CODE_TTL
+    (dropped on every coupon change, see signals.py) and codes that match
+    no coupon for INVALID_CODE_TTL, so brute-forced codes cost one query
+    each at most. When the default cache is Redis, each coupon has a global
+    use counter and a hash of per-user counters, seeded from the database;
+    checking and taking a use is one Lua script, so max_uses and
+    max_uses_per_user hold however many checkouts race. The database stays
+    the record: reconcile() resets the counters from it, and the guarded
+    UPDATE in Redemption.record() catches anything the counters let through.
+    """
+
+    def __init__(self):
+        self._script = None
+
+    def _client(self):
+        try:
+            return get_redis_connection("default")
+        except NotImplementedError:
+            return None
+
+    def _count(self, metric):
+        key = METRIC_KEY.format(metric, int(time.time() // METRIC_BUCKET_SECONDS))
+        try:
+            cache.add(key, 0, METRIC_TTL)
+            cache.incr(key)
+        except Exception as e:
+            print(f"Coupon metric update failed: {e}")
+
+    def lookup(self, code):
+        """Returns the valid coupon with `code` or raises a ValidationError."""
+        code_key = _code_key(COUPON_CODE_CACHE_KEY, code)
+        coupon = cache.get(code_key)
+        if coupon is None:
+            coupon = Coupon.objects.select_related('supplier').filter(code=code, campaign__isnull=True).first()
+            if coupon is None:
+                coupon = resolve_campaign_code(code)
+            # False marks a code with no coupon.
+            cache.set(code_key, coupon or False, COUPON_CODE_TTL if coupon else INVALID_CODE_TTL)
+        elif coupon is False:
+            self._count('invalid_cached')
+
+        now = timezone.now()
+        if not coupon or not coupon.active or not coupon.valid_from <= now <= coupon.valid_to:
+            self._count('invalid')
+            raise ValidationError({"message": INVALID_MESSAGE})
+        return coupon
+
+    def forget(self, code):
+        cache.delete(_code_key(COUPON_CODE_CACHE_KEY, code))
+
+    def _seed(self, client, coupon, user_id):
+        expires_at = int((coupon.valid_to + COUNTER_GRACE).timestamp())
+        uses = Coupon.objects.filter(pk=coupon.pk).values_list('uses_count', flat=True).first() or 0
+        mine = CouponUsage.objects.filter(coupon_id=coupon.pk, user_id=user_id).count()
+        pipe = client.pipeline(transaction=False)
+        pipe.set(COUNTER_KEY.format(coupon.pk), uses, nx=True)
+        pipe.hsetnx(USER_COUNTERS_KEY.format(coupon.pk), user_id, mine)
+        pipe.expireat(COUNTER_KEY.format(coupon.pk), expires_at)
+        pipe.expireat(USER_COUNTERS_KEY.format(coupon.pk), expires_at)
+        pipe.execute()
+
+    def _run(self, client, coupon, user_id, delta):
+        keys = [COUNTER_KEY.format(coupon.pk), USER_COUNTERS_KEY.format(coupon.pk)]
+        args = [coupon.max_uses, coupon.max_uses_per_user, user_id, delta]
+        if self._script is None:
+            self._script = client.register_script(REDEEM_SCRIPT)
+        result = self._script(keys=keys, args=args, client=client)
+        if result == SEED_NEEDED:
+            self._seed(client, coupon, user_id)
+            result = self._script(keys=keys, args=args, client=client)
+        return result
+
+    def _raise_for(self, result):
+        if result == EXHAUSTED:
+            self._count('exhausted')
+            raise ValidationError({"message": EXHAUSTED_MESSAGE})
+        if result == USER_LIMIT:
+            self._count('user_limit')
+            raise ValidationError({"message": USER_LIMIT_MESSAGE})
+
+    def check(self, coupon, user):
+        """Raises a ValidationError if `user` can no longer use `coupon`; takes nothing."""
+        self._count('quoted')
+        client = self._client()
+        if client is not None:
+            self._raise_for(self._run(client, coupon, user.id, 0))
+            return
+        if coupon.uses_count >= coupon.max_uses:
+            self._raise_for(EXHAUSTED)
+        if CouponUsage.objects.filter(user=user, coupon=coupon).count() >= coupon.max_uses_per_user:
+            self._raise_for(USER_LIMIT)
+
+    @contextmanager
+    def redeem(self, code, user):
+        """
+        Takes one use of the coupon with `code` for `user` and yields a
+        Redemption to record() in the order's transaction, or None without a
+        code. The use is given back if the block raises. Enter it outside
+        the transaction, so the use is only kept once the order is committed.
+        """
+        if not code:
+            yield None
+            return
+        coupon = self.lookup(code)
+        client = self._client()
+        if client is not None:
+            self._raise_for(self._run(client, coupon, user.id, 1))
+        try:
+            yield Redemption(coupon, user, code)
+        except BaseException:
+            if client is not None:
+                self._release(client, coupon, user.id)
+            raise
+        self._count('redeemed')
+
+    def _release(self, client, coupon, user_id):
+        try:
+            self._run(client, coupon, user_id, -1)
+            self._count('released')
+        except Exception as e:
+            print(f"Coupon use of {coupon.code} could not be given back: {e}")
+
+    def reconcile(self, chunk_size=500):
+        """
+        Resets the counters of every coupon still valid from uses_count and
+        CouponUsage. Returns the number of coupons reconciled.
+        """
+        client = self._client()
+        if client is None:
+            return 0
+        coupons = Coupon.objects.filter(valid_to__gte=timezone.now() - COUNTER_GRACE).order_by('pk')
+        reconciled, last_pk = 0, 0
+        while True:
+            chunk = list(coupons.filter(pk__gt=last_pk).values_list('pk', 'uses_count', 'valid_to')[:chunk_size])
+            if not chunk:
+                return reconciled
+            per_user = {}
+            usages = (
+                CouponUsage.objects.filter(coupon_id__in=[pk for pk, _, _ in chunk])
+                .values_list('coupon_id', 'user_id')
+                .annotate(uses=Count('id'))
+                .order_by()
+            )
+            for coupon_id, user_id, uses in usages:
+                per_user.setdefault(coupon_id, {})[user_id] = uses
+
+            pipe = client.pipeline(transaction=True)
+            for pk, uses_count, valid_to in chunk:
+                expires_at = int((valid_to + COUNTER_GRACE).timestamp())
+                pipe.set(COUNTER_KEY.format(pk), uses_count)
+                pipe.delete(USER_COUNTERS_KEY.format(pk))
+                if per_user.get(pk):
+                    pipe.hset(USER_COUNTERS_KEY.format(pk), mapping=per_user[pk])
+                pipe.expireat(COUNTER_KEY.format(pk), expires_at)
+                pipe.expireat(USER_COUNTERS_KEY.format(pk), expires_at)
+            pipe.execute()
+            reconciled += len(chunk)
+            last_pk = chunk[-1][0]
+
+    def metrics(self, minutes=15):
+        """Per-metric totals over the last `minutes` minutes, with redemptions per minute."""
+        bucket = int(time.time() // METRIC_BUCKET_SECONDS)
+        buckets = range(bucket - minutes + 1, bucket + 1)
+        values = cache.get_many([METRIC_KEY.format(metric, b) for metric in METRICS for b in buckets])
+        totals = {
+            metric: sum(values.get(METRIC_KEY.format(metric, b), 0) for b in buckets)
+            for metric in METRICS
+        }
+        totals['redemptions_per_minute'] = round(totals['redeemed'] / minutes, 2)
+        attempts = totals['redeemed'] + totals['exhausted'] + totals['user_limit']
+        totals['rejection_rate'] = round((totals['exhausted'] + totals['user_limit']) / attempts, 4) if attempts else 0.0
+        return totals
+
+
+coupon_redemptions = CouponRedemptions()
@@ -0,0 +1,145 @@
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.core.cache import cache
+from rest_framework.exceptions import ValidationError
+
+from .models import Shipment, Warehouse
+
+CROSS_STATE_SURCHARGE = Decimal('20.00')
+ROUTING_VERSION_CACHE_KEY = "orders:warehouse_routing:version"
+# Response cache tag of the warehouse list.
+WAREHOUSES_TAG = 'warehouses'
+
+
+@dataclass(frozen=True)
+class RouteLeg:
+    """
+    One shipment of a delivery plan. A missing warehouse means the leg starts
+    at the supplier (from_warehouse) or ends at the customer (to_warehouse).
+    """
+    from_warehouse: Warehouse = None
+    to_warehouse: Warehouse = None
+    status: str = Shipment.ShipmentStatus.CREATED
+
+
+@dataclass(frozen=True)
+class DeliveryPlan:
+    delivery_fee: Decimal
+    legs: tuple
+
+
+class WarehouseRoutingTable:
+    """
+    Process-local governorate -> warehouse table plus the precomputed
+    (supplier state, customer state) -> DeliveryPlan matrix.
+
+    The table is built with a single query and dropped by the Warehouse
+    save/delete signals. Other processes notice the change through a version
+    counter in the shared cache, which is checked at most once every
+    `check_interval` seconds, so lookups are plain dictionary reads.
+    Warehouses handed out by the table are shared and must be treated as read-only.
+    """
+
+    def __init__(self, check_interval=30):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _build(self):
+        warehouses = {
+            warehouse.name: warehouse
+            for warehouse in Warehouse.objects.select_related('Address')
+        }
+        plans = {}
+        for source_state, source in warehouses.items():
+            for destination_state, destination in warehouses.items():
+                if source_state == destination_state:
+                    plans[(source_state, destination_state)] = DeliveryPlan(
+                        delivery_fee=destination.delivery_fee,
+                        legs=(RouteLeg(status=Shipment.ShipmentStatus.CREATED),),
+                    )
+                else:
+                    plans[(source_state, destination_state)] = DeliveryPlan(
+                        delivery_fee=destination.delivery_fee + source.delivery_fee + CROSS_STATE_SURCHARGE,
+                        legs=(
+                            RouteLeg(from_warehouse=source, status=Shipment.ShipmentStatus.In_Transmit),
+                            RouteLeg(to_warehouse=destination, status=Shipment.ShipmentStatus.CREATED),
+                        ),
+                    )
+        return {
+            'warehouses': warehouses,
+            'warehouses_by_id': {warehouse.id: warehouse for warehouse in warehouses.values()},
+            'address_ids': {warehouse.Address_id for warehouse in warehouses.values()},
+            'plans': plans,
+        }
+
+    def _shared_version(self):
+        cache.add(ROUTING_VERSION_CACHE_KEY, 0, timeout=None)
+        return cache.get(ROUTING_VERSION_CACHE_KEY)
+
+    def _get_snapshot(self):
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < self.check_interval:
+            return self._snapshot
+
+        with self._lock:
+            if self._snapshot is not None and now - self._checked_at < self.check_interval:
+                return self._snapshot
+            version = self._shared_version()
+            if self._snapshot is None or version != self._version:
+                self._snapshot = self._build()
+                self._version = version
+            self._checked_at = now
+            return self._snapshot
+
+    def invalidate(self):
+        """
+        Drops the local table and tells every other process to rebuild theirs.
+        """
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = 0.0
+        cache.add(ROUTING_VERSION_CACHE_KEY, 0, timeout=None)
+        cache.incr(ROUTING_VERSION_CACHE_KEY)
+
+    def version(self):
+        """The version of the table lookups are answered from; it changes whenever a warehouse does."""
+        self._get_snapshot()
+        return self._version
+
+    def warehouse(self, state_name):
+        try:
+            return self._get_snapshot()['warehouses'][state_name]
+        except KeyError:
+            raise ValidationError(f"Warehouse not found for state: {state_name}")
+
+    def warehouse_by_id(self, warehouse_id):
+        try:
+            return self._get_snapshot()['warehouses_by_id'][warehouse_id]
+        except KeyError:
+            raise ValidationError(f"Warehouse not found: {warehouse_id}")
+
+    def warehouses(self, state_names):
+        return {state_name: self.warehouse(state_name) for state_name in state_names}
+
+    def plan(self, supplier_state, customer_state):
+        try:
+            return self._get_snapshot()['plans'][(supplier_state, customer_state)]
+        except KeyError:
+            for state_name in (customer_state, supplier_state):
+                self.warehouse(state_name)
+            raise
+
+    def delivery_fee(self, supplier_state, customer_state):
+        return self.plan(supplier_state, customer_state).delivery_fee
+
+    def is_warehouse_address(self, address_id):
+        return address_id in self._get_snapshot()['address_ids']
+
+
+routing_table = WarehouseRoutingTable()
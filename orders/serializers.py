@@ -1,7 +1,9 @@
 from .models import Order, OrderItem, Cart, CartItems, Wishlist, WishlistItem, Warehouse, Shipment, ShipmentItem
 from accounts.serializers import AddressSerializer
 from products.models import Product
-from .models import Coupon
+from .models import Coupon, CouponCampaign
+from .campaigns import MAX_CAMPAIGN_CODES, create_campaign
+from .cart_store import CartLine, CartStoreError, cart_store
 from rest_framework import serializers
 from django.utils.translation import gettext_lazy as _
 from accounts.models import User
@@ -97,6 +99,16 @@ class CartItemSerializer(serializers.ModelSerializer):
             return cart_item.Quantity * cart_item.Product.UnitPrice
         return 0
 
+class CartLineSerializer(serializers.Serializer):
+    """A line of a cart kept in the cart store, priced at the current UnitPrice of its product."""
+    id = serializers.CharField(read_only=True)
+    Quantity = serializers.IntegerField(read_only=True)
+    product = SimpleProductSerializer(source="Product", many=False, read_only=True)
+    sub_total = serializers.SerializerMethodField(method_name="total")
+
+    def total(self, line):
+        return line.sub_total
+
 class CartSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     items = CartItemSerializer(many=True, read_only=True)
@@ -128,6 +140,16 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         quantity = self.validated_data["Quantity"]
         color = self.validated_data.get("Color", "")
         size = self.validated_data.get("Size", "")
+
+        if cart_store.available():
+            product = Product.objects.select_related('Supplier').filter(id=Product_id).first()
+            if not product:
+                raise serializers.ValidationError({"detail":"There is no product associated with the given ID"})
+            try:
+                self.instance = cart_store.add(user, product, quantity, color, size)
+            except CartStoreError as e:
+                raise serializers.ValidationError({"detail": str(e)})
+            return self.instance
         
         cart, _ = Cart.objects.get_or_create(User=user)
         product = Product.objects.get(id=Product_id)
@@ -156,8 +178,14 @@ class AddCartItemSerializer(serializers.ModelSerializer):
                 Size=size
             )
 
+        cart.bump_version()
         return self.instance
 
+    def to_representation(self, instance):
+        if isinstance(instance, CartLine):
+            return {"id": instance.id, "Quantity": instance.Quantity, "Color": instance.Color, "Size": instance.Size}
+        return super().to_representation(instance)
+
     class Meta:
         model = CartItems
         fields = ["id", "Product_id", "Quantity", "Color", "Size"]
@@ -275,7 +303,7 @@ class CouponSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'code', 'discount', 'discount_type', 'valid_from', 'valid_to',
             'active', 'min_purchase_amount', 'max_uses', 'max_uses_per_user',
-            'products'
+            'scope', 'category', 'products'
         ]
         read_only_fields = ['supplier', 'uses_count']
 
@@ -285,6 +313,22 @@ class CouponSerializer(serializers.ModelSerializer):
         
         if data.get('discount_type') == 'percentage' and data.get('discount') > 100:
             raise serializers.ValidationError("Percentage discount cannot be more than 100.")
+
+        scope = data.get('scope', self.instance.scope if self.instance else Coupon.Scope.SUPPLIER)
+        if scope == Coupon.Scope.CATEGORY and not data.get('category', getattr(self.instance, 'category', None)):
+            raise serializers.ValidationError("A category coupon needs a category.")
+        if scope == Coupon.Scope.PRODUCTS:
+            products = data.get('products')
+            if products is None and self.instance:
+                products = self.instance.products.all()
+            if not products:
+                raise serializers.ValidationError("A product coupon needs at least one product.")
+            supplier = getattr(self.context['request'].user, 'supplier', None)
+            if any(product.Supplier_id != getattr(supplier, 'pk', None) for product in products):
+                raise serializers.ValidationError("A coupon can only cover your own products.")
+        elif 'scope' in data:
+            # The product list only means something for product coupons.
+            data['products'] = []
             
         return data
 
@@ -299,6 +343,38 @@ class CouponSerializer(serializers.ModelSerializer):
         coupon.products.set(products_data)
         return coupon
 
+class CampaignRulesSerializer(CouponSerializer):
+    """The coupon rules shared by every code of a campaign; codes and use counts come from the campaign."""
+    class Meta(CouponSerializer.Meta):
+        fields = [
+            'discount', 'discount_type', 'valid_from', 'valid_to', 'min_purchase_amount',
+            'max_uses_per_user', 'scope', 'category', 'products'
+        ]
+
+class CouponCampaignSerializer(serializers.ModelSerializer):
+    rules = CampaignRulesSerializer(source='coupon')
+
+    class Meta:
+        model = CouponCampaign
+        fields = ['id', 'name', 'prefix', 'codes_requested', 'codes_generated', 'status', 'created_at', 'rules']
+        read_only_fields = ['codes_generated', 'status', 'created_at']
+
+    def validate_prefix(self, value):
+        if value and not value.isalnum():
+            raise serializers.ValidationError("The prefix can only contain letters and digits.")
+        return value.upper()
+
+    def validate_codes_requested(self, value):
+        if not 1 <= value <= MAX_CAMPAIGN_CODES:
+            raise serializers.ValidationError(f"A campaign can have between 1 and {MAX_CAMPAIGN_CODES} codes.")
+        return value
+
+    def create(self, validated_data):
+        user = self.context['request'].user
+        rules = validated_data.pop('coupon')
+        products = rules.pop('products', [])
+        return create_campaign(supplier=user.supplier, rules=rules, products=products, **validated_data)
+
 class OrderDeliverSerializer(serializers.ModelSerializer):
     confirmation_code = serializers.CharField(write_only=True)
     class Meta:
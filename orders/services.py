@@ -1,19 +1,37 @@
-import datetime
-from django.db.models import F
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, Max, QuerySet, Sum, Value, When
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
-from django.db import transaction
+from django.db import IntegrityError, connection, transaction
+from Handcrafts.cache_guard import CacheGuard
 from accounts.models import User, Address
-from .models import Order,Warehouse, CartItems, OrderItem, Shipment, ShipmentItem, Coupon, CouponUsage
+from .models import (
+    Order, CartItems, OrderItem, Shipment, ShipmentItem,
+    StockReservation, StockReservationItem
+)
+from .cart_store import cart_store
+from .coupons import coupon_index
+from .redemption import coupon_redemptions
+from .dispatch import dispatch_board
+from .inbox import sync_supplier_inbox
+from .numbering import order_numbers
+from .pricing import CouponTerms, PricedLine, price_order
+from .routing import routing_table
+from products.models import Product
 from decimal import Decimal
 from collections import defaultdict
+from returnrequest import ledger
 from returnrequest.models import Transaction
-from notifications.services import create_notification_for_user
+from notifications.services import create_notifications_for_users
+
+CART_QUOTE_TTL = 60 * 15
+# Quotes feed order creation, so an outdated one is never served, even while it is being recomputed.
+cart_quote_guard = CacheGuard('cart_quotes', serve_stale=False)
 
 
 def get_craft_user_by_email(email="CraftEG@craft.com"):
     try:
-        return User.objects.get(email=email)
+        return User.objects.get(email__iexact=email)
     except User.DoesNotExist:
         return None
     except Exception as e:
@@ -21,62 +39,68 @@ def get_craft_user_by_email(email="CraftEG@craft.com"):
         return None
 
 def get_warehouse_by_name(state_name):
-    try:
-        return Warehouse.objects.get(name=state_name)
-    except Warehouse.DoesNotExist:
-        raise ValidationError(f"Warehouse not found for state: {state_name}")
+    return routing_table.warehouse(state_name)
 
 def cancel_order_and_restock(order):
     """
-    Cancels an order, sets its status, and restocks the associated products.
+    Cancels an unpaid order, restocks its products and reverses its cashback.
     """
+    from .cancellation import cancel_orders
+
     if order.paid:
         raise ValidationError("Cannot cancel an order that has already been paid.")
 
-    with transaction.atomic():
-        order.status = Order.OrderStatus.CANCELLED
-        order.paid = False
-        order.save()
+    if not cancel_orders([order.id])['cancelled']:
+        raise ValidationError("Only created or in transit orders can be cancelled.")
+    order.status = Order.OrderStatus.CANCELLED
+    order.paid = False
 
-        for order_item in order.items.all():
-            product = order_item.product
-            product.Stock = F('Stock') + order_item.quantity
-            product.save()
-
-def cancel_pending_credit_card_orders():
+def cancel_pending_credit_card_orders(chunk_size=1000):
     """
     Background task to find and cancel unpaid credit card orders older than 24 hours.
-    This should be run periodically (e.g., daily) using a scheduler like Celery.
+    Orders are cancelled in chunks and a crashed run resumes where it stopped.
     """
-    time_threshold = timezone.now() - datetime.timedelta(hours=24)
-    pending_orders = Order.objects.filter(
-        payment_method=Order.PaymentMethod.CREDIT_CARD,
-        paid=False,
-        status=Order.OrderStatus.CREATED,
-        created_at__lte=time_threshold
-    )
+    from .cancellation import cancel_expired_card_orders
 
-    for order in pending_orders:
-        try:
-            cancel_order_and_restock(order)
-            print(f"Successfully cancelled expired order {order.id}")
-        except Exception as e:
-            print(f"Failed to cancel order {order.id}: {e}")
+    return cancel_expired_card_orders(chunk_size=chunk_size)
 
-def create_order_from_cart(user, cart, address_id, coupon_code, payment_method, is_paid=False):
+def create_order_from_cart(user, cart, address_id, coupon_code, payment_method, is_paid=False, reservation=None):
+    """
+    Materializes a cart into an order, its items, shipments and shipment items.
+
+    Everything the order needs (cart lines with their products, suppliers and
+    supplier users, supplier addresses) is loaded up front in a fixed number
+    of queries, warehouses, fees and shipment legs come from the in-memory
+    routing table, and rows are written with bulk_create, so the number of
+    round trips does not grow with the number of cart lines:
+
+        address, cart lines, supplier addresses, quote (cached) or coupon checks,
+        order, order items, shipments, shipment items, notifications,
+        payment transactions, stock update, cart cleanup, coupon usage.
+
+    Stock is taken with one guarded UPDATE, so the whole order fails if any
+    line is out of stock. A reservation made for a card checkout is consumed
+    instead of taking the stock a second time.
+    """
     address = Address.objects.filter(user=user, id=address_id).first()
-    cart_items = CartItems.objects.filter(CartID=cart)
+    cart_items = _load_cart_lines(CartItems.objects.filter(CartID=cart))
 
     if not address:
         raise ValidationError("Address not found or does not belong to the user.")
     
-    if not cart_items.exists():
+    if not cart_items:
         raise ValidationError("Cart is empty. Cannot create order.")
 
-    totals = _calculate_all_order_totals_helper(cart_items, coupon_code, address, user)
+    supplier_addresses = _get_supplier_addresses_helper(cart_items, user)
+    totals = get_cart_quote(cart, cart_items, address, coupon_code, user, supplier_addresses)
 
-    with transaction.atomic():
-        order = Order.objects.create(
+    with coupon_redemptions.redeem(coupon_code, user) as redemption, transaction.atomic():
+        if reservation is not None:
+            _consume_stock_reservation_helper(reservation, cart_items)
+        else:
+            _update_product_stock_helper(cart_items)
+
+        order = _create_order_helper(
             user=user,
             address=address,
             payment_method=payment_method,
@@ -87,175 +111,194 @@ def create_order_from_cart(user, cart, address_id, coupon_code, payment_method,
             paid=is_paid
         )
 
-        order_items_map = {}
-        for item in cart_items:
-            order_item = OrderItem.objects.create(
+        order_items_map = {
+            item.id: OrderItem(
                 order=order,
                 product=item.Product,
                 quantity=item.Quantity,
                 price=item.Product.UnitPrice,
                 color=item.Color,
                 size=item.Size,
-            )
-            order_items_map[item.Product.id] = order_item
+            ) for item in cart_items
+        }
+        OrderItem.objects.bulk_create(order_items_map.values())
 
-        items_by_supplier = defaultdict(list)
-        for item in cart_items:
-            items_by_supplier[item.Product.Supplier.user.id].append(item)
-        supplier_addresses = _get_supplier_addresses_helper(cart_items, user)
+        shipments = []
+        shipment_items = []
+        notifications = []
+        customer_state = address.State
 
-        for supplier_id, items in items_by_supplier.items():
-            supplier_user = User.objects.get(id=supplier_id)
+        for supplier_id, items in _group_cart_lines_by_supplier(cart_items).items():
+            supplier = items[0].Product.Supplier
             supplier_address = supplier_addresses[supplier_id]
             supplier_state = supplier_address.State
-            customer_state = address.State
-            
             shipment_total = sum(item.Product.UnitPrice * item.Quantity for item in items)
-
-            if supplier_state == customer_state:
-                warehouse = get_warehouse_by_name(customer_state)
-                _create_shipment_helper(
-                    order, 
-                    items[0].Product.Supplier,
-                    supplier_addresses[supplier_id], 
-                    address, 
-                    items, 
-                    Shipment.ShipmentStatus.CREATED,
-                    warehouse.delivery_fee,
-                    order_items_map,
-                    shipment_total
+            plan = routing_table.plan(supplier_state, customer_state)
+
+            for leg in plan.legs:
+                from_address = leg.from_warehouse.Address if leg.from_warehouse else supplier_address
+                to_address = leg.to_warehouse.Address if leg.to_warehouse else address
+                shipment, items_for_shipment = _build_shipment_helper(
+                    order, supplier, from_address, to_address, items,
+                    leg.status, order_items_map, shipment_total
                 )
-            else:
-                warehouse_dest = get_warehouse_by_name(customer_state)
-                warehouse_source = get_warehouse_by_name(supplier_state)
-                
-                _create_shipment_helper(
-                    order, 
-                    items[0].Product.Supplier,
-                    warehouse_source.Address, 
-                    address, 
-                    items, 
-                    Shipment.ShipmentStatus.In_Transmit,
-                    warehouse_dest.delivery_fee,
-                    order_items_map,
-                    shipment_total
-                )
-                
-                _create_shipment_helper(
-                    order, 
-                    items[0].Product.Supplier,
-                    supplier_addresses[supplier_id], 
-                    warehouse_dest.Address, 
-                    items, 
-                    Shipment.ShipmentStatus.CREATED,
-                    warehouse_source.delivery_fee,
-                    order_items_map,
-                    shipment_total
-                )
-            
+                shipments.append(shipment)
+                shipment_items.extend(items_for_shipment)
+
             # ✨ NOTIFICATION: Inform the supplier about the new order
-            create_notification_for_user(
-                user=supplier_user,
-                message=f"You have a new order #{order.order_number} containing {len(items)} item(s).",
-                related_object=order
-            )
+            notifications.append((
+                supplier.user,
+                f"You have a new order #{order.order_number} containing {len(items)} item(s)."
+            ))
 
-        _handle_payment_and_Transaction_helper(user, payment_method, totals['final_amount'], is_paid)
-        
-        _update_product_stock_helper(cart_items)
-        cart_items.delete()
+        Shipment.objects.bulk_create(shipments)
+        ShipmentItem.objects.bulk_create(shipment_items)
+        sync_supplier_inbox([order.id])
+        transaction.on_commit(lambda: dispatch_board.sync(shipments))
+
+        _handle_payment_and_Transaction_helper(user, payment_method, totals['final_amount'], is_paid, order=order)
+        CartItems.objects.filter(id__in=[item.id for item in cart_items]).delete()
+        cart.bump_version()
+        transaction.on_commit(lambda: cart_store.discard(user.id, cart_items))
 
         # ✨ NOTIFICATION: Inform the customer that their order was successful
-        create_notification_for_user(
-            user=user,
-            message=f"Your order #{order.order_number} has been placed successfully!",
-            related_object=order
-        )
+        notifications.append((user, f"Your order #{order.order_number} has been placed successfully!"))
+        create_notifications_for_users(notifications, related_object=order)
 
-        if coupon_code:
-            try:
-                coupon = Coupon.objects.get(code=coupon_code)
-                coupon.uses_count = F('uses_count') + 1
-                coupon.save(update_fields=['uses_count'])
-                
-                CouponUsage.objects.create(user=user, coupon=coupon)
-            except Coupon.DoesNotExist:
-                pass
+        if redemption is not None:
+            redemption.record()
 
     return order
 
-def _calculate_all_order_totals_helper(cart_items, coupon_code, customer_address, user):
-    total_amount = Decimal('0.00')
-    discount_amount = Decimal('0.00')
-    delivery_fee = Decimal('0.00')
+def _create_order_helper(attempts=3, **fields):
+    """
+    Creates the order under a savepoint. A generated order number can clash
+    on the unique index: with a random one issued before time-ordered
+    numbering, or when its minute's counter was lost and restarted. The
+    counter then skips past the numbers of that minute already in the table
+    and the order is retried; the last attempt takes a checked random number
+    rather than failing the checkout.
+    """
+    for attempt in range(attempts):
+        order = Order(**fields)
+        if attempt == attempts - 1:
+            order_numbers.fallback()
+            order.order_number = order.random_order_number()
+        try:
+            with transaction.atomic():
+                order.save(force_insert=True)
+            return order
+        except IntegrityError as e:
+            if 'order_number' not in str(e) or attempt == attempts - 1:
+                raise
+            _skip_used_order_numbers(order.order_number)
+
+def _skip_used_order_numbers(order_number):
+    """Moves the sequence of `order_number`'s minute past the highest number of that minute in the table."""
+    bounds = order_numbers.tick_bounds(order_number)
+    if bounds is None:
+        return
+    highest = Order.objects.filter(order_number__range=bounds).aggregate(highest=Max('order_number'))['highest']
+    order_numbers.skip_past(highest or order_number)
+
+def _load_cart_lines(cart_items):
+    """
+    Evaluates cart lines together with their product, supplier and supplier user in one query.
+    """
+    if isinstance(cart_items, QuerySet):
+        cart_items = cart_items.select_related('Product__Supplier__user')
+    return list(cart_items)
 
+def _group_cart_lines_by_supplier(cart_items):
     items_by_supplier = defaultdict(list)
     for item in cart_items:
-        items_by_supplier[item.Product.Supplier.user.id].append(item)
-    
-    supplier_addresses = _get_supplier_addresses_helper(cart_items, user)
+        items_by_supplier[item.Product.Supplier.user_id].append(item)
+    return items_by_supplier
+
+def _calculate_all_order_totals_helper(cart_items, coupon_code, customer_address, user, supplier_addresses=None):
+    """
+    Loads and validates everything the price depends on, then hands plain
+    tuples to the pure pricing kernel.
+    """
+    cart_items = _load_cart_lines(cart_items)
+    if supplier_addresses is None:
+        supplier_addresses = _get_supplier_addresses_helper(cart_items, user)
     
     coupon = None
     if coupon_code:
-        try:
-            coupon = Coupon.objects.get(
-                code=coupon_code,
-                active=True,
-                valid_from__lte=timezone.now(),
-                valid_to__gte=timezone.now(),
-            )
-            
-            if coupon.uses_count >= coupon.max_uses:
-                 raise ValidationError({"message": "This coupon has exceeded its total usage limit."})
-            
-            user_uses_count = CouponUsage.objects.filter(user=user, coupon=coupon).count()
-            if user_uses_count >= coupon.max_uses_per_user:
-                raise ValidationError({"message": "Coupon usage limit reached for this user."})
-            
-        except Coupon.DoesNotExist:
-            raise ValidationError({"message": "Invalid or expired coupon."})
-
-    for supplier_id, items in items_by_supplier.items():
-        shipment_total = sum(item.Product.UnitPrice * item.Quantity for item in items)
-        shipment_discount = Decimal('0.00')
-
-        if coupon and coupon.supplier.user.id == supplier_id:
-            if shipment_total < coupon.min_purchase_amount:
-                raise ValidationError({"message": f"Minimum purchase amount of {coupon.min_purchase_amount} not met for this coupon."})
-                
-            if coupon.discount_type == Coupon.DiscountType.PERCENTAGE:
-                shipment_discount = (coupon.discount / Decimal('100.00')) * shipment_total
-            elif coupon.discount_type == Coupon.DiscountType.FIXED_AMOUNT:
-                shipment_discount = min(coupon.discount, shipment_total)
-
-        current_delivery_fee = Decimal('0.00')
-        supplier_address = supplier_addresses[supplier_id]
-        customer_state = customer_address.State
-        supplier_state = supplier_address.State
-        
-        if supplier_state == customer_state:
-            warehouse = get_warehouse_by_name(customer_state)
-            current_delivery_fee = warehouse.delivery_fee
-        else:
-            warehouse_dest = get_warehouse_by_name(customer_state)
-            warehouse_source = get_warehouse_by_name(supplier_state)
-            current_delivery_fee = warehouse_dest.delivery_fee + warehouse_source.delivery_fee + Decimal('20.00')
-        
-        total_amount += shipment_total
-        discount_amount += shipment_discount
-        delivery_fee += current_delivery_fee
-    
-    final_amount = total_amount - discount_amount + delivery_fee
-    
-    return {
-        'total_amount': total_amount,
-        'discount_amount': discount_amount,
-        'delivery_fee': delivery_fee,
-        'final_amount': final_amount
-    }
-
-def _create_shipment_helper(order, supplier, from_address, to_address, cart_items, status, delivery_fee, order_items_map, shipment_total):
-    shipment = Shipment.objects.create(
+        coupon = coupon_redemptions.lookup(coupon_code)
+        coupon_redemptions.check(coupon, user)
+
+    lines = [
+        PricedLine(
+            price=item.Product.UnitPrice,
+            quantity=item.Quantity,
+            supplier_id=item.Product.Supplier.user_id,
+            supplier_state=supplier_addresses[item.Product.Supplier.user_id].State,
+            product_id=item.Product_id,
+            category_id=item.Product.Category_id,
+        ) for item in cart_items
+    ]
+    coupon_terms = None
+    if coupon:
+        coupon_terms = CouponTerms(
+            supplier_id=coupon.supplier.user_id,
+            discount_type=coupon.discount_type,
+            discount=coupon.discount,
+            min_purchase_amount=coupon.min_purchase_amount,
+            scope=coupon_index.scope(coupon),
+        )
+
+    return price_order(lines, customer_address.State, routing_table.delivery_fee, coupon_terms)
+
+def _cart_fingerprint(cart_items):
+    return tuple(sorted(
+        (item.id, item.Product_id, item.Quantity, str(item.Product.UnitPrice)) for item in cart_items
+    ))
+
+def get_cart_quote(cart, cart_items, address, coupon_code, user, supplier_addresses=None):
+    """
+    Returns the totals of a cart, shared by the quote endpoint, checkout and
+    order creation. Entries are keyed by the cart content version, which every
+    cart mutation bumps, and carry a fingerprint of everything the price
+    depends on besides: the priced lines, the coupon's version, the customer's
+    and the suppliers' states and the routing table version, so that a price
+    change, a coupon edit, a moved address or a new delivery fee never serves
+    a stale quote. Concurrent requests for the same quote, e.g. a
+    double-submitted checkout, compute it once.
+    """
+    cart_items = _load_cart_lines(cart_items)
+    if supplier_addresses is None:
+        supplier_addresses = _get_supplier_addresses_helper(cart_items, user)
+    cache_key = f"cart_quote:{cart.id}:{cart.version}:{address.id}:{coupon_code or ''}"
+    coupon_version = None
+    if coupon_code:
+        # Coupon saves bump updated_at, so edits to the discount, minimum or scope give a new fingerprint.
+        coupon = coupon_redemptions.lookup(coupon_code)
+        coupon_version = (coupon.pk, coupon.updated_at)
+    supplier_states = tuple(sorted(
+        (supplier_id, supplier_address.State) for supplier_id, supplier_address in supplier_addresses.items()
+    ))
+    fingerprint = (
+        _cart_fingerprint(cart_items), coupon_version, address.State, supplier_states, routing_table.version(),
+    )
+
+    entry = cart_quote_guard.get(
+        cache_key,
+        lambda: {
+            'fingerprint': fingerprint,
+            'totals': _calculate_all_order_totals_helper(cart_items, coupon_code, address, user, supplier_addresses),
+        },
+        CART_QUOTE_TTL,
+        lambda entries: {key: entry for key, entry in entries.items() if entry['fingerprint'] == fingerprint},
+    )
+    return entry['totals']
+
+def _build_shipment_helper(order, supplier, from_address, to_address, cart_items, status, order_items_map, shipment_total):
+    """
+    Builds an unsaved shipment and its shipment items so callers can bulk_create them.
+    """
+    shipment = Shipment(
         order=order,
         supplier=supplier,
         from_state=from_address.State,
@@ -263,78 +306,214 @@ def _create_shipment_helper(order, supplier, from_address, to_address, cart_item
         from_address=from_address,
         to_address=to_address,
         status=status,
-        order_total_value=shipment_total
+        order_total_value=shipment_total,
+        confirmation_code=Shipment.generate_confirmation_code(),
     )
-    ShipmentItem.objects.bulk_create([
+    shipment_items = [
         ShipmentItem(
             shipment=shipment,
-            order_item=order_items_map[item.Product.id],
+            order_item=order_items_map[item.id],
             quantity=item.Quantity
         ) for item in cart_items
-    ])
-    return shipment
+    ]
+    return shipment, shipment_items
 
 def _get_supplier_addresses_helper(cart_items, user):
+    supplier_ids = {item.Product.Supplier.user_id for item in cart_items}
+    addresses_by_supplier = defaultdict(list)
+    for address in Address.objects.filter(user_id__in=supplier_ids):
+        addresses_by_supplier[address.user_id].append(address)
+
     supplier_addresses = {}
-    supplier_ids = {item.Product.Supplier.user.id for item in cart_items}
     for supplier_id in supplier_ids:
-        addresses = Address.objects.filter(user=supplier_id)
-        if not addresses.exists() or addresses.count() > 1:
+        addresses = addresses_by_supplier.get(supplier_id, [])
+        if len(addresses) != 1:
             raise ValidationError({"message": f"Address not found or multiple addresses found for supplier with ID {supplier_id}."})
-        supplier_addresses[supplier_id] = addresses.first()
+        supplier_addresses[supplier_id] = addresses[0]
     return supplier_addresses
 
-def _process_payments(user, shipment, warehouse):
-        Craft = get_craft_user_by_email("CraftEG@craft.com")
-        delivery_fee_share = warehouse.delivery_fee * Decimal('0.85')
-        craft_delivery_cut = warehouse.delivery_fee * Decimal('0.15')
-        
-        order_items = shipment.items.all()
-        supplier_total = sum(item.order_item.price * item.order_item.quantity for item in order_items)
-        
-        supplier_revenue = supplier_total * Decimal('0.85')
-        craft_supplier_cut = supplier_total * Decimal('0.15')
-
-        if shipment.order.payment_method in [Order.PaymentMethod.BALANCE, Order.PaymentMethod.CREDIT_CARD]:
-            user.Balance += delivery_fee_share
-            Craft.Balance += craft_delivery_cut
-            Transaction.objects.create(user=user, transaction_type=Transaction.TransactionType.DELIVERY_FEE, amount=delivery_fee_share)
-            Transaction.objects.create(user=Craft, transaction_type=Transaction.TransactionType.DELIVERY_FEE, amount=craft_delivery_cut)
-
-            shipment.supplier.user.Balance += supplier_revenue
-            Craft.Balance += craft_supplier_cut
-            Transaction.objects.create(user=shipment.supplier.user, transaction_type=Transaction.TransactionType.PURCHASED_PRODUCTS, amount=supplier_revenue)
-            Transaction.objects.create(user=Craft, transaction_type=Transaction.TransactionType.SUPPLIER_TRANSFORM, amount=craft_supplier_cut)
-                
-        elif shipment.order.payment_method == Order.PaymentMethod.CASH_ON_DELIVERY:
-            user.Balance -= (supplier_total + warehouse.delivery_fee)
-            shipment.supplier.user.Balance += supplier_revenue
-            Craft.Balance += craft_supplier_cut + craft_delivery_cut
-            
-            Transaction.objects.create(user=user, transaction_type=Transaction.TransactionType.DELIVERY_FEE, amount=-(supplier_total + warehouse.delivery_fee))
-            Transaction.objects.create(user=shipment.supplier.user, transaction_type=Transaction.TransactionType.PURCHASED_PRODUCTS, amount=supplier_revenue)
-            Transaction.objects.create(user=Craft, transaction_type=Transaction.TransactionType.SUPPLIER_TRANSFORM, amount=craft_supplier_cut)
-            Transaction.objects.create(user=Craft, transaction_type=Transaction.TransactionType.DELIVERY_FEE, amount=craft_delivery_cut)
-
-def _handle_payment_and_Transaction_helper(user, payment_method, final_amount, is_paid=False):
-    Craft = get_craft_user_by_email("CraftEG@craft.com")
+def _handle_payment_and_Transaction_helper(user, payment_method, final_amount, is_paid=False, order=None):
+    legs = []
     if payment_method == Order.PaymentMethod.BALANCE:
-        if user.Balance < final_amount:
-            raise ValidationError({"message": "Insufficient balance for this order."})
-        
-        user.Balance -= final_amount
-        Craft.Balance += final_amount
-        Transaction.objects.create(user=user, transaction_type=Transaction.TransactionType.PURCHASED_PRODUCTS, amount=-final_amount)
-        Transaction.objects.create(user=Craft, transaction_type=Transaction.TransactionType.PURCHASED_PRODUCTS, amount=final_amount)
+        legs.append(ledger.Leg(user.id, Transaction.TransactionType.PURCHASED_PRODUCTS, -final_amount, guard=True))
+        legs.append(ledger.Leg(ledger.platform_account_id(), Transaction.TransactionType.PURCHASED_PRODUCTS, final_amount))
         
     cashback_amount = final_amount * Decimal('0.05')
-    user.Balance += cashback_amount    
-    Transaction.objects.create(user=user, transaction_type=Transaction.TransactionType.CASH_BACK, amount=cashback_amount)
+    legs.append(ledger.Leg(user.id, Transaction.TransactionType.CASH_BACK, cashback_amount))
+
+    memo = f"Payment of order {order.order_number}" if order else "Order payment"
+    try:
+        ledger.post(legs, memo=memo, related_object=order)
+    except ledger.InsufficientBalance:
+        raise ValidationError({"message": "Insufficient balance for this order."})
     
-def _update_product_stock_helper(cart_items):
+class _StockShortage(Exception):
+    pass
+
+def _aggregate_line_quantities(cart_items):
+    quantities = defaultdict(int)
     for item in cart_items:
-        item.Product.Stock = F('Stock') - item.Quantity
-        item.Product.save(update_fields=['Stock'])
+        quantities[item.Product_id] += item.Quantity
+    return quantities
+
+def _reserve_stock_helper(quantities):
+    """
+    Decrements the stock of every product with a single guarded statement:
+
+        UPDATE product SET Stock = Stock - qty WHERE id IN (...) AND Stock >= qty
+
+    If any product cannot cover its quantity nothing is decremented and a
+    ValidationError naming the short products is raised.
+    """
+    if not quantities:
+        return
+
+    requested = Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    try:
+        with transaction.atomic():
+            updated = Product.objects.filter(id__in=quantities.keys(), Stock__gte=requested).update(
+                Stock=F('Stock') - requested,
+                OutOfStock=Case(
+                    *[When(id=product_id, Stock=quantity, then=Value(True)) for product_id, quantity in quantities.items()],
+                    default=Value(False),
+                ),
+            )
+            if updated != len(quantities):
+                raise _StockShortage()
+            Product.objects.stock_changed(quantities.keys())
+    except _StockShortage:
+        short_products = Product.objects.filter(
+            id__in=quantities.keys(), Stock__lt=requested
+        ).values_list('ProductName', flat=True)
+        names = ", ".join(short_products) or "some products"
+        raise ValidationError({"message": f"Quantity of {names} exceeds available stock."})
+
+def _restock_helper(quantities):
+    """
+    Gives quantities back to their products with a single UPDATE. On Postgres
+    the quantities are joined in as a VALUES list,
+
+        UPDATE product SET Stock = Stock + v.qty FROM (VALUES (id, qty), ...) AS v WHERE id = v.id
+
+    which stays linear in the number of products where a CASE per product does not.
+    """
+    if not quantities:
+        return
+
+    if connection.vendor == 'postgresql':
+        qn = connection.ops.quote_name
+        table = qn(Product._meta.db_table)
+        stock = qn(Product._meta.get_field('Stock').column)
+        out_of_stock = qn(Product._meta.get_field('OutOfStock').column)
+        pk = qn(Product._meta.pk.column)
+        values = ', '.join(['(%s::integer, %s::integer)'] * len(quantities))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} AS p SET {stock} = p.{stock} + v.quantity, {out_of_stock} = false "
+                f"FROM (VALUES {values}) AS v(id, quantity) WHERE p.{pk} = v.id",
+                [value for row in quantities.items() for value in row],
+            )
+        Product.objects.stock_changed(quantities.keys())
+        return
+
+    Product.objects.filter(id__in=quantities.keys()).update(
+        Stock=F('Stock') + Case(
+            *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+            output_field=IntegerField(),
+        ),
+        OutOfStock=False,
+    )
+    Product.objects.stock_changed(quantities.keys())
+
+def _update_product_stock_helper(cart_items):
+    _reserve_stock_helper(_aggregate_line_quantities(cart_items))
+
+def reserve_cart_stock(user, cart_items, ttl=None):
+    """
+    Takes the stock for a pending checkout out of circulation until the
+    reservation is consumed by an order or released when it expires.
+    """
+    ttl = ttl or settings.STOCK_RESERVATION_TTL
+    quantities = _aggregate_line_quantities(_load_cart_lines(cart_items))
+    if not quantities:
+        raise ValidationError({"message": "Cart is empty. Cannot create order."})
+
+    with transaction.atomic():
+        _reserve_stock_helper(quantities)
+        reservation = StockReservation.objects.create(user=user, expires_at=timezone.now() + ttl)
+        StockReservationItem.objects.bulk_create([
+            StockReservationItem(reservation=reservation, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items()
+        ])
+    return reservation
+
+def _reserved_quantities(reservation_ids):
+    return dict(
+        StockReservationItem.objects.filter(reservation_id__in=reservation_ids)
+        .values('product_id')
+        .annotate(total=Sum('quantity'))
+        .values_list('product_id', 'total')
+    )
+
+def _consume_stock_reservation_helper(reservation, cart_items):
+    """
+    Turns a held reservation into the stock taken by the order. If the cart
+    changed since the reservation was made the difference is settled in the
+    same transaction; if the reservation was already released the stock is
+    taken again with the usual guarded update.
+    """
+    quantities = _aggregate_line_quantities(cart_items)
+    claimed = StockReservation.objects.filter(
+        id=reservation.id, status=StockReservation.ReservationStatus.HELD
+    ).update(status=StockReservation.ReservationStatus.CONSUMED, updated_at=timezone.now())
+
+    if not claimed:
+        _reserve_stock_helper(quantities)
+        return
+
+    held = _reserved_quantities([reservation.id])
+    if held != dict(quantities):
+        _restock_helper(held)
+        _reserve_stock_helper(quantities)
+
+def release_stock_reservation(reservation):
+    """
+    Returns the stock of a held reservation. Returns False if it was already consumed or released.
+    """
+    with transaction.atomic():
+        released = StockReservation.objects.filter(
+            id=reservation.id, status=StockReservation.ReservationStatus.HELD
+        ).update(status=StockReservation.ReservationStatus.RELEASED, updated_at=timezone.now())
+        if not released:
+            return False
+        _restock_helper(_reserved_quantities([reservation.id]))
+    return True
+
+def release_expired_stock_reservations(batch_size=500):
+    """
+    Releases every held reservation past its expiry, one batch per transaction,
+    with a single aggregated restock per batch.
+    """
+    released_count = 0
+    while True:
+        with transaction.atomic():
+            reservation_ids = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(status=StockReservation.ReservationStatus.HELD, expires_at__lte=timezone.now())
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not reservation_ids:
+                break
+
+            StockReservation.objects.filter(id__in=reservation_ids).update(
+                status=StockReservation.ReservationStatus.RELEASED, updated_at=timezone.now()
+            )
+            _restock_helper(_reserved_quantities(reservation_ids))
+        released_count += len(reservation_ids)
+    return released_count
 
 def _validate_request_data(cart, address_id, payment_method):
         if not address_id:
@@ -360,7 +539,5 @@ def _get_supplier_addresses(cart_items):
         return supplier_addresses
 
 def _update_product_stock(cart_items):
-        for item in cart_items:
-            item.Product.Stock = F('Stock') - item.Quantity
-            item.Product.save(update_fields=['Stock'])
+        _update_product_stock_helper(cart_items)
 
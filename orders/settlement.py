@@ -0,0 +1,169 @@
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from returnrequest import ledger
+from returnrequest.models import Transaction
+
+from .models import Order, Shipment, ShipmentItem
+from .routing import routing_table
+
+SETTLEMENT_PENDING_CACHE_KEY = "orders:settlement:pending"
+SETTLEMENT_METRICS_CACHE_KEY = "orders:settlement:metrics"
+
+PAYEE_SHARE = Decimal('0.85')
+PLATFORM_SHARE = Decimal('0.15')
+
+
+def settlement_queue():
+    """Delivered order shipments whose payments have not been posted yet, oldest first."""
+    return Shipment.objects.filter(
+        status=Shipment.ShipmentStatus.DELIVERED_SUCCESSFULLY,
+        settled_at__isnull=True,
+        settlement_error='',
+        order__isnull=False,
+        delivery_person__isnull=False,
+    ).order_by('delivery_confirmed_at')
+
+
+def retry_failed_settlements(to_states=None):
+    """
+    Puts the shipments that could not be settled back in the queue, only
+    those delivered to `to_states` if given, and returns how many.
+    """
+    failed = Shipment.objects.filter(settled_at__isnull=True).exclude(settlement_error='')
+    if to_states is not None:
+        failed = failed.filter(to_state__in=to_states)
+    return failed.update(settlement_error='')
+
+
+def queue_shipment_for_settlement():
+    """
+    Called once a shipment is delivered. The shipment is already queued by its
+    status; this only counts it and starts a batch early once enough are waiting.
+    """
+    if cache.add(SETTLEMENT_PENDING_CACHE_KEY, 1, None):
+        pending = 1
+    else:
+        try:
+            pending = cache.incr(SETTLEMENT_PENDING_CACHE_KEY)
+        except ValueError:
+            pending = 1
+
+    if pending >= settings.SETTLEMENT_BATCH_SIZE:
+        from .tasks import settle_delivered_shipments_task
+
+        cache.delete(SETTLEMENT_PENDING_CACHE_KEY)
+        settle_delivered_shipments_task.delay()
+
+
+def settlement_legs(payment_method, courier_id, supplier_id, platform_id, delivery_fee, supplier_total):
+    """The ledger legs that pay out one delivered shipment."""
+    delivery_fee_share = delivery_fee * PAYEE_SHARE
+    craft_delivery_cut = delivery_fee * PLATFORM_SHARE
+    supplier_revenue = supplier_total * PAYEE_SHARE
+    craft_supplier_cut = supplier_total * PLATFORM_SHARE
+
+    if payment_method in [Order.PaymentMethod.BALANCE, Order.PaymentMethod.CREDIT_CARD]:
+        return [
+            ledger.Leg(courier_id, Transaction.TransactionType.DELIVERY_FEE, delivery_fee_share),
+            ledger.Leg(platform_id, Transaction.TransactionType.DELIVERY_FEE, craft_delivery_cut),
+            ledger.Leg(supplier_id, Transaction.TransactionType.PURCHASED_PRODUCTS, supplier_revenue),
+            ledger.Leg(platform_id, Transaction.TransactionType.SUPPLIER_TRANSFORM, craft_supplier_cut),
+        ]
+    if payment_method == Order.PaymentMethod.CASH_ON_DELIVERY:
+        # The courier collected the cash and owes it to the platform.
+        return [
+            ledger.Leg(courier_id, Transaction.TransactionType.DELIVERY_FEE, -(supplier_total + delivery_fee)),
+            ledger.Leg(supplier_id, Transaction.TransactionType.PURCHASED_PRODUCTS, supplier_revenue),
+            ledger.Leg(platform_id, Transaction.TransactionType.SUPPLIER_TRANSFORM, craft_supplier_cut),
+            ledger.Leg(platform_id, Transaction.TransactionType.DELIVERY_FEE, craft_delivery_cut),
+        ]
+    return []
+
+
+def settle_delivered_shipments(batch_size=None):
+    """
+    Settles up to `batch_size` queued shipments in one transaction.
+
+    Queued rows are claimed with SKIP LOCKED so concurrent workers take
+    disjoint batches, the supplier totals of the whole batch come from one
+    aggregate query, and the ledger rows are posted with post_many(). Marking
+    the shipments settled in the same transaction makes each shipment settle
+    exactly once however often it is enqueued. Shipments that cannot be
+    settled, such as those to a state without a warehouse, get a
+    settlement_error and leave the queue, so they never hold up the batches
+    behind them. Returns the batch metrics.
+    """
+    batch_size = batch_size or settings.SETTLEMENT_BATCH_SIZE
+    started = time.monotonic()
+
+    with transaction.atomic():
+        shipment_ids = list(
+            settlement_queue().select_for_update(skip_locked=True).values_list('id', flat=True)[:batch_size]
+        )
+        shipments = Shipment.objects.filter(id__in=shipment_ids).values_list(
+            'id', 'order__payment_method', 'order__order_number', 'supplier__user_id',
+            'delivery_person__user_id', 'to_state', 'delivery_confirmed_at',
+        )
+        supplier_totals = dict(
+            ShipmentItem.objects.filter(shipment_id__in=shipment_ids)
+            .values('shipment_id')
+            .annotate(total=Sum(F('order_item__price') * F('order_item__quantity'), output_field=DecimalField()))
+            .values_list('shipment_id', 'total')
+        )
+
+        now = timezone.now()
+        platform_id = ledger.platform_account_id()
+        postings = []
+        settled_ids = []
+        failed = {}
+        oldest_delivery = None
+        for shipment_id, payment_method, order_number, supplier_id, courier_id, to_state, delivered_at in shipments:
+            try:
+                delivery_fee = routing_table.warehouse(to_state).delivery_fee
+            except ValidationError as e:
+                error = str(e.detail[0])[:250]
+                print(f"Could not settle shipment {shipment_id}: {error}")
+                failed.setdefault(error, []).append(shipment_id)
+                continue
+
+            legs = settlement_legs(
+                payment_method, courier_id, supplier_id, platform_id,
+                delivery_fee, supplier_totals.get(shipment_id) or Decimal('0.00'),
+            )
+            postings.append(ledger.Posting(legs, f"Settlement of order {order_number}", Shipment(pk=shipment_id)))
+            settled_ids.append(shipment_id)
+            if delivered_at and (oldest_delivery is None or delivered_at < oldest_delivery):
+                oldest_delivery = delivered_at
+
+        rows = ledger.post_many(postings)
+        Shipment.objects.filter(id__in=settled_ids).update(settled_at=now)
+        for error, ids in failed.items():
+            Shipment.objects.filter(id__in=ids).update(settlement_error=error)
+
+    elapsed = time.monotonic() - started
+    metrics = {
+        'claimed': len(shipment_ids),
+        'batch_size': len(settled_ids),
+        'failed': sum(len(ids) for ids in failed.values()),
+        'ledger_rows': len(rows),
+        'rows_per_second': round(len(rows) / elapsed, 1) if elapsed else 0,
+        'lag_seconds': round((now - oldest_delivery).total_seconds(), 1) if oldest_delivery else 0,
+        'duration_seconds': round(elapsed, 3),
+        'finished_at': now.isoformat(),
+    }
+    if settled_ids:
+        cache.set(SETTLEMENT_METRICS_CACHE_KEY, metrics, None)
+    return metrics
+
+
+def settlement_metrics():
+    """Metrics of the last non-empty settlement batch, or None before the first one."""
+    return cache.get(SETTLEMENT_METRICS_CACHE_KEY)
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.models import Address
+from Handcrafts.response_cache import response_cache
+from .dispatch import dispatch_board
+from .inbox import sync_supplier_inbox
+from .redemption import coupon_redemptions
+from .models import Coupon, Shipment, Warehouse
+from .routing import WAREHOUSES_TAG, routing_table
+from .settlement import retry_failed_settlements
+
+
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+def invalidate_routing_table_on_warehouse_change(sender, instance, **kwargs):
+    transaction.on_commit(routing_table.invalidate)
+    transaction.on_commit(lambda: response_cache.invalidate(WAREHOUSES_TAG))
+    if kwargs.get('signal') is post_save:
+        # Shipments to this state that failed to settle for want of a warehouse can settle now.
+        transaction.on_commit(lambda: retry_failed_settlements([instance.name]))
+
+
+@receiver(post_save, sender=Address)
+def invalidate_routing_table_on_warehouse_address_change(sender, instance, created, **kwargs):
+    if not created and routing_table.is_warehouse_address(instance.pk):
+        transaction.on_commit(routing_table.invalidate)
+
+
+@receiver(post_save, sender=Shipment)
+def update_dispatch_board_on_shipment_save(sender, instance, **kwargs):
+    transaction.on_commit(lambda: dispatch_board.sync([instance]))
+
+
+@receiver(post_delete, sender=Shipment)
+def update_dispatch_board_on_shipment_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: dispatch_board.sync([instance], deleted=True))
+
+
+@receiver(post_save, sender=Shipment)
+def update_supplier_inbox_on_shipment_save(sender, instance, **kwargs):
+    if instance.order_id:
+        sync_supplier_inbox([instance.order_id])
+
+
+@receiver(post_delete, sender=Shipment)
+def update_supplier_inbox_on_shipment_delete(sender, instance, **kwargs):
+    # Deferred to commit: when the whole order is being deleted there is nothing left to sync.
+    if instance.order_id:
+        order_id = instance.order_id
+        transaction.on_commit(lambda: sync_supplier_inbox([order_id], prune=True))
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def forget_coupon_code_on_coupon_change(sender, instance, **kwargs):
+    code = instance.code
+    transaction.on_commit(lambda: coupon_redemptions.forget(code))
+
+
+@receiver(m2m_changed, sender=Coupon.products.through)
+def touch_coupon_on_product_list_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # The eligibility index keys a coupon's product list by updated_at.
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        coupon_ids = [instance.pk]
+    elif reverse and action in ('post_add', 'post_remove'):
+        coupon_ids = list(pk_set)
+    elif reverse and action == 'pre_clear':
+        coupon_ids = list(sender.objects.filter(product_id=instance.pk).values_list('coupon_id', flat=True))
+    else:
+        return
+    Coupon.objects.filter(pk__in=coupon_ids).update(updated_at=timezone.now())
+    # The cached coupons still carry the old updated_at.
+    for code in Coupon.objects.filter(pk__in=coupon_ids).values_list('code', flat=True):
+        transaction.on_commit(lambda code=code: coupon_redemptions.forget(code))
@@ -1,8 +1,8 @@
 from celery import shared_task
 from .services import (
-    _process_payments,
     _update_product_stock,
     cancel_pending_credit_card_orders as cancel_pending_orders,
+    release_expired_stock_reservations,
 )
 from .models import Order
 from notifications.services import create_notification_for_user
@@ -47,18 +47,25 @@ def send_order_notification_task(user_id, message, order_id=None):
 
 
 @shared_task
-def process_payments_task(user_id, shipment_id, warehouse_id):
+def settle_delivered_shipments_task(max_batches=20):
     """
-    Asynchronous task to process payments.
+    Periodic (and size-triggered) task to settle delivered shipments in batches.
     """
-    from .services import _process_payments
-    from .models import Shipment, Warehouse
-    from accounts.models import User
+    from django.conf import settings
+    from .settlement import settle_delivered_shipments
 
-    user = User.objects.get(id=user_id)
-    shipment = Shipment.objects.get(id=shipment_id)
-    warehouse = Warehouse.objects.get(id=warehouse_id)
-    _process_payments(user, shipment, warehouse)
+    for _ in range(max_batches):
+        metrics = settle_delivered_shipments()
+        if metrics['batch_size']:
+            print(
+                f"Settled {metrics['batch_size']} shipment(s): {metrics['ledger_rows']} ledger rows "
+                f"at {metrics['rows_per_second']} rows/s, lag {metrics['lag_seconds']}s."
+            )
+        if metrics['failed']:
+            print(f"Could not settle {metrics['failed']} shipment(s); see their settlement_error.")
+        # A short claim means the queue is drained; failed shipments have left it.
+        if metrics['claimed'] < settings.SETTLEMENT_BATCH_SIZE:
+            break
 
 
 @shared_task
@@ -75,4 +82,60 @@ def cancel_pending_credit_card_orders_task():
     """
     Periodic task to cancel pending credit card orders.
     """
-    cancel_pending_orders()
\ No newline at end of file
+    job = cancel_pending_orders()
+    if job.cancelled_count:
+        print(
+            f"Cancellation job {job.id}: cancelled {job.cancelled_count} order(s), "
+            f"restocked {job.restocked_units} unit(s), refunded {job.refunded_amount}."
+        )
+
+
+@shared_task
+def release_expired_stock_reservations_task():
+    """
+    Periodic task to give back the stock of card checkouts that were never paid.
+    """
+    released = release_expired_stock_reservations()
+    if released:
+        print(f"Released {released} expired stock reservation(s).")
+
+
+@shared_task
+def flush_cart_store_task(max_batches=20):
+    """
+    Periodic task to write the carts changed in Redis back to the database.
+    """
+    from django.conf import settings
+    from .cart_store import cart_store
+
+    written = 0
+    for _ in range(max_batches):
+        flushed = cart_store.flush()
+        written += flushed
+        if flushed < settings.CART_FLUSH_BATCH_SIZE:
+            break
+    if written:
+        print(f"Wrote back {written} cart(s).")
+
+
+@shared_task
+def reconcile_coupon_counters_task():
+    """
+    Periodic task to reset the Redis coupon counters from the database.
+    """
+    from .redemption import coupon_redemptions
+
+    reconciled = coupon_redemptions.reconcile()
+    if reconciled:
+        print(f"Reconciled the counters of {reconciled} coupon(s).")
+
+
+@shared_task
+def generate_campaign_codes_task(campaign_id):
+    """
+    Asynchronous task to write the codes of a coupon campaign.
+    """
+    from .campaigns import generate_campaign_codes
+
+    campaign = generate_campaign_codes(campaign_id)
+    print(f"Coupon campaign {campaign.name}: {campaign.codes_generated} code(s) ready.")
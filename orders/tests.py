@@ -1,3 +1,522 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import SkipTest, mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework.exceptions import ValidationError
+
+from accounts.models import Address, Customer, Delivery, Supplier, User
+from products.models import Category, Product
+from returnrequest import ledger
+from returnrequest.models import Transaction
+
+from .cart_store import DIRTY_CARTS_KEY, cart_store
+from .dispatch import claim_shipment
+from .models import Cart, CartItems, Coupon, CouponUsage, Order, OrderItem, Shipment, Warehouse
+from .numbering import order_numbers
+from .pricing import FIXED_AMOUNT, PERCENTAGE, SCOPE_CATEGORY, CouponScope, CouponTerms, PricedLine, price_order
+from .redemption import COUNTER_KEY, EXHAUSTED_MESSAGE, USER_COUNTERS_KEY, USER_LIMIT_MESSAGE, coupon_redemptions
+from .routing import routing_table
+from .services import _reserve_stock_helper, create_order_from_cart, get_cart_quote
+from .settlement import retry_failed_settlements, settle_delivered_shipments, settlement_queue
+
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "order_numbers": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "order_numbers"},
+}
+TEST_CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+def flat_fee(supplier_state, customer_state):
+    return Decimal('50.00') if supplier_state == customer_state else Decimal('120.00')
+
+
+class PriceOrderTests(TestCase):
+    """The pricing kernel takes plain values, so it needs no database rows."""
+
+    lines = [
+        PricedLine(Decimal('10.00'), 3, supplier_id=1, supplier_state='Cairo', product_id=1, category_id=7),
+        PricedLine(Decimal('25.00'), 2, supplier_id=1, supplier_state='Cairo', product_id=2, category_id=8),
+        PricedLine(Decimal('40.00'), 1, supplier_id=2, supplier_state='Giza', product_id=3, category_id=7),
+    ]
+
+    def test_totals_without_coupon(self):
+        totals = price_order(self.lines, 'Cairo', flat_fee)
+        self.assertEqual(totals['total_amount'], Decimal('120.00'))
+        self.assertEqual(totals['discount_amount'], Decimal('0.00'))
+        self.assertEqual(totals['delivery_fee'], Decimal('170.00'))
+        self.assertEqual(totals['final_amount'], Decimal('290.00'))
+
+    def test_percentage_coupon_discounts_its_supplier_only(self):
+        coupon = CouponTerms(1, PERCENTAGE, Decimal('10'), Decimal('0'))
+        totals = price_order(self.lines, 'Cairo', flat_fee, coupon)
+        self.assertEqual(totals['discount_amount'], Decimal('8.00'))
+        self.assertEqual(totals['final_amount'], Decimal('282.00'))
+
+    def test_scoped_coupon_discounts_covered_lines_only(self):
+        coupon = CouponTerms(1, PERCENTAGE, Decimal('50'), Decimal('0'), CouponScope(SCOPE_CATEGORY, category_id=7))
+        totals = price_order(self.lines, 'Cairo', flat_fee, coupon)
+        self.assertEqual(totals['discount_amount'], Decimal('15.00'))
+
+    def test_fixed_coupon_is_capped_at_the_eligible_total(self):
+        coupon = CouponTerms(2, FIXED_AMOUNT, Decimal('100'), Decimal('0'))
+        totals = price_order(self.lines, 'Cairo', flat_fee, coupon)
+        self.assertEqual(totals['discount_amount'], Decimal('40.00'))
+
+    def test_minimum_purchase_applies_to_the_coupon_supplier(self):
+        coupon = CouponTerms(2, FIXED_AMOUNT, Decimal('5'), Decimal('50'))
+        with self.assertRaises(ValidationError):
+            price_order(self.lines, 'Cairo', flat_fee, coupon)
+
+
+class OrderFixtures:
+    """A craft account with warehouses, a customer in Cairo and suppliers in Cairo and Giza."""
+
+    def setUp(self):
+        # Both are kept per process and would outlive the rows of the previous test.
+        routing_table.invalidate()
+        ledger._shard_ids.clear()
+
+        craft = self.make_user('CraftEG@craft.com')
+        for state in ('Cairo', 'Giza'):
+            address = Address.objects.create(user=craft, State=state, City=state, Street='Main')
+            Warehouse.objects.create(name=state, Address=address, delivery_fee=Decimal('50'))
+
+        self.customer = self.make_user('customer@example.com', is_customer=True)
+        Customer.objects.create(user=self.customer, CreditCVV='123')
+        self.address = Address.objects.create(user=self.customer, State='Cairo', City='Cairo', Street='Main')
+
+        self.category = Category.objects.create(Title='Pottery')
+        self.suppliers = []
+        for index, state in enumerate(('Cairo', 'Giza')):
+            user = self.make_user(f'supplier{index}@example.com', is_supplier=True)
+            Address.objects.create(user=user, State=state, City=state, Street='Main')
+            self.suppliers.append(Supplier.objects.create(user=user, CategoryTitle='Pottery'))
+
+    def make_user(self, email, **fields):
+        return User.objects.create(email=email, first_name='Test', last_name='User', password='x', **fields)
+
+    def make_product(self, supplier, price='10.00', stock=100):
+        return Product.objects.create(
+            ProductName=f'Clay pot {Product.objects.count()}', ProductDescription='Handmade pottery',
+            Supplier=supplier, Category=self.category, QuantityPerUnit='1',
+            UnitPrice=Decimal(price), UnitWeight=Decimal('1'), Stock=stock,
+        )
+
+    def make_cart(self, products, quantity=1):
+        cart, _ = Cart.objects.get_or_create(User=self.customer)
+        CartItems.objects.bulk_create([
+            CartItems(CartID=cart, Product=product, Quantity=quantity, Color='', Size='') for product in products
+        ])
+        return cart
+
+    def make_courier(self, governorate='Cairo', name='courier'):
+        user = self.make_user(f'{name}@example.com', is_delivery=True)
+        return Delivery.objects.create(user=user, VehicleModel='Bike', plateNO='123', governorate=governorate)
+
+    def place_order(self, cart):
+        return create_order_from_cart(
+            self.customer, cart, self.address.id, None, Order.PaymentMethod.CASH_ON_DELIVERY,
+        )
+
+
+@override_settings(CACHES=TEST_CACHES, CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class OrderTestCase(OrderFixtures, TestCase):
+
+    def setUp(self):
+        # Local memory caches outlive the test that filled them.
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        super().setUp()
+
+
+@override_settings(CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class RedisTestCase(OrderFixtures, TestCase):
+    """Runs against the Redis of the default cache, and is skipped when the default cache is not Redis."""
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.redis = get_redis_connection("default")
+            cls.redis.ping()
+        except Exception:
+            raise SkipTest("The default cache is not a reachable Redis.")
+        super().setUpClass()
+
+
+class CreateOrderFromCartTests(OrderTestCase):
+
+    def test_query_count_does_not_grow_with_cart_lines(self):
+        # Loads the routing table and the ledger's system accounts, which later orders reuse.
+        self.place_order(self.make_cart([self.make_product(self.suppliers[0])]))
+
+        cart = self.make_cart([self.make_product(self.suppliers[0])])
+        with CaptureQueriesContext(connection) as single:
+            self.place_order(cart)
+
+        products = [self.make_product(self.suppliers[index % 2]) for index in range(10)]
+        cart = self.make_cart(products)
+        with self.assertNumQueries(len(single)):
+            self.place_order(cart)
+
+    def test_order_is_split_into_shipments_per_supplier(self):
+        products = [self.make_product(self.suppliers[index % 2], price='12.50') for index in range(4)]
+        order = self.place_order(self.make_cart(products, quantity=2))
+
+        self.assertEqual(order.total_amount, Decimal('100.00'))
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 4)
+        # The Cairo supplier ships directly, the Giza one through both warehouses.
+        self.assertEqual(Shipment.objects.filter(order=order, supplier=self.suppliers[0]).count(), 1)
+        self.assertEqual(Shipment.objects.filter(order=order, supplier=self.suppliers[1]).count(), 2)
+        self.assertFalse(CartItems.objects.filter(CartID__User=self.customer).exists())
+        self.assertEqual(Product.objects.get(pk=products[0].pk).Stock, 98)
+
+
+class OrderNumberTests(OrderTestCase):
+
+    def test_lost_sequence_skips_the_numbers_already_used(self):
+        orders = [self.place_order(self.make_cart([self.make_product(self.suppliers[0])])) for _ in range(3)]
+        # A flushed cache restarts the minute's counter, whose next number is taken already.
+        caches['order_numbers'].clear()
+
+        order = self.place_order(self.make_cart([self.make_product(self.suppliers[0])]))
+
+        self.assertGreater(order.order_number, max(order.order_number for order in orders))
+        self.assertEqual(order_numbers.fallbacks(), 0)
+
+    def test_repeated_clashes_fall_back_to_a_random_number(self):
+        for _ in range(3):
+            self.place_order(self.make_cart([self.make_product(self.suppliers[0])]))
+        caches['order_numbers'].clear()
+
+        with mock.patch.object(order_numbers, 'skip_past'):
+            order = self.place_order(self.make_cart([self.make_product(self.suppliers[0])]))
+
+        self.assertEqual(Order.objects.filter(order_number=order.order_number).count(), 1)
+        self.assertEqual(order_numbers.fallbacks(), 1)
+
+
+class CartQuoteTests(OrderTestCase):
+
+    def quote(self, cart):
+        return get_cart_quote(cart, CartItems.objects.filter(CartID=cart), self.address, None, self.customer)
+
+    def test_moved_address_is_quoted_again(self):
+        cart = self.make_cart([self.make_product(self.suppliers[0])])
+        self.assertEqual(self.quote(cart)['delivery_fee'], routing_table.delivery_fee('Cairo', 'Cairo'))
+
+        self.address.State = 'Giza'
+        self.address.save()
+
+        self.assertEqual(self.quote(cart)['delivery_fee'], routing_table.delivery_fee('Cairo', 'Giza'))
+
+    def test_warehouse_fee_change_is_quoted_again(self):
+        cart = self.make_cart([self.make_product(self.suppliers[0])])
+        self.assertEqual(self.quote(cart)['delivery_fee'], Decimal('50.00'))
+
+        warehouse = Warehouse.objects.get(name='Cairo')
+        warehouse.delivery_fee = Decimal('80')
+        with self.captureOnCommitCallbacks(execute=True):
+            warehouse.save()
+
+        self.assertEqual(self.quote(cart)['delivery_fee'], Decimal('80.00'))
+
+
+class ReserveStockTests(OrderTestCase):
+
+    def test_stock_is_decremented_and_emptied_products_marked(self):
+        plenty = self.make_product(self.suppliers[0], stock=10)
+        last = self.make_product(self.suppliers[0], stock=3)
+
+        _reserve_stock_helper({plenty.id: 4, last.id: 3})
+
+        plenty.refresh_from_db()
+        last.refresh_from_db()
+        self.assertEqual((plenty.Stock, plenty.OutOfStock), (6, False))
+        self.assertEqual((last.Stock, last.OutOfStock), (0, True))
+
+    def test_shortage_takes_no_stock_and_names_the_product(self):
+        plenty = self.make_product(self.suppliers[0], stock=10)
+        short = self.make_product(self.suppliers[1], stock=2)
+
+        with self.assertRaises(ValidationError) as raised:
+            _reserve_stock_helper({plenty.id: 4, short.id: 3})
+
+        self.assertIn(short.ProductName, str(raised.exception.detail['message']))
+        self.assertEqual(Product.objects.get(pk=plenty.pk).Stock, 10)
+        self.assertEqual(Product.objects.get(pk=short.pk).Stock, 2)
+
+    def test_order_over_stock_is_rejected_whole(self):
+        plenty = self.make_product(self.suppliers[0], stock=10)
+        short = self.make_product(self.suppliers[1], stock=1)
+        cart = self.make_cart([plenty, short], quantity=2)
+
+        with self.assertRaises(ValidationError):
+            self.place_order(cart)
+
+        self.assertEqual(Product.objects.get(pk=plenty.pk).Stock, 10)
+        self.assertFalse(Order.objects.filter(user=self.customer).exists())
+        self.assertEqual(CartItems.objects.filter(CartID=cart).count(), 2)
+
+
+class LedgerTests(OrderTestCase):
+
+    def balance(self, user):
+        return ledger.get_balance(user.id)
+
+    def test_post_many_moves_balances_by_net_delta(self):
+        supplier = self.suppliers[0].user
+        ledger.post_many([
+            ledger.Posting([ledger.Leg(self.customer.id, Transaction.TransactionType.RETURN_CREDIT, Decimal('100'))]),
+            ledger.Posting([
+                ledger.Leg(self.customer.id, Transaction.TransactionType.PURCHASED_PRODUCTS, Decimal('-30.004')),
+                ledger.Leg(supplier.id, Transaction.TransactionType.PURCHASED_PRODUCTS, Decimal('30')),
+            ]),
+        ])
+
+        self.assertEqual(self.balance(self.customer), Decimal('70.00'))
+        self.assertEqual(self.balance(supplier), Decimal('30.00'))
+        # The unbalanced credit is booked against the clearing account, so every entry sums to zero.
+        self.assertEqual(list(ledger.iter_unbalanced_entries()), [])
+        self.assertEqual(list(ledger.iter_balance_mismatches()), [])
+
+    def test_guarded_debit_over_balance_posts_nothing(self):
+        ledger.post([ledger.Leg(self.customer.id, Transaction.TransactionType.RETURN_CREDIT, Decimal('20'))])
+        transactions = Transaction.objects.count()
+
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.post_many([
+                ledger.Posting([ledger.Leg(self.suppliers[0].user_id, Transaction.TransactionType.RETURN_CREDIT, Decimal('5'))]),
+                ledger.Posting([ledger.Leg(
+                    self.customer.id, Transaction.TransactionType.PURCHASED_PRODUCTS, Decimal('-25'), guard=True,
+                )]),
+            ])
+
+        self.assertEqual(self.balance(self.customer), Decimal('20.00'))
+        self.assertEqual(self.balance(self.suppliers[0].user), Decimal('0.00'))
+        self.assertEqual(Transaction.objects.count(), transactions)
+
+    def test_platform_postings_spread_over_shards_and_roll_up(self):
+        shard_ids = ledger.shard_account_ids(settings.PLATFORM_ACCOUNT_EMAIL)
+        self.assertEqual(len(set(shard_ids)), settings.LEDGER_ACCOUNT_SHARDS)
+
+        ledger.post_many([
+            ledger.Posting([ledger.Leg(
+                ledger.platform_account_id(), Transaction.TransactionType.PURCHASED_PRODUCTS, Decimal('10'),
+            )])
+            for _ in range(20)
+        ])
+        craft = User.objects.get(email__iexact=settings.PLATFORM_ACCOUNT_EMAIL)
+        self.assertEqual(self.balance(craft), Decimal('0.00'))
+        self.assertEqual(sum(ledger.get_balance(shard_id) for shard_id in shard_ids), Decimal('200.00'))
+
+        ledger.roll_up(settings.PLATFORM_ACCOUNT_EMAIL)
+
+        self.assertEqual(self.balance(craft), Decimal('200.00'))
+        self.assertFalse(User.objects.filter(pk__in=shard_ids).exclude(Balance=0).exists())
+        self.assertEqual(list(ledger.iter_balance_mismatches()), [])
+
+
+class SettlementTests(OrderTestCase):
+
+    def deliver(self, order, courier):
+        Shipment.objects.filter(order=order).update(
+            status=Shipment.ShipmentStatus.DELIVERED_SUCCESSFULLY, delivery_person=courier,
+            delivery_confirmed_at=timezone.now(),
+        )
+
+    def test_delivered_shipments_are_paid_out_once(self):
+        courier = self.make_courier()
+        for _ in range(2):
+            order = self.place_order(self.make_cart([self.make_product(self.suppliers[0])], quantity=2))
+            self.deliver(order, courier)
+
+        metrics = settle_delivered_shipments()
+        self.assertEqual((metrics['claimed'], metrics['batch_size'], metrics['failed']), (2, 2, 0))
+        self.assertEqual(settle_delivered_shipments()['claimed'], 0)
+
+        # Cash on delivery: the supplier gets 85% of 2 x 20.00, the courier owes the cash and the fees.
+        self.assertEqual(ledger.get_balance(self.suppliers[0].user_id), Decimal('34.00'))
+        self.assertEqual(ledger.get_balance(courier.user_id), Decimal('-140.00'))
+        self.assertFalse(settlement_queue().exists())
+        self.assertEqual(list(ledger.iter_balance_mismatches()), [])
+
+    def test_unroutable_shipment_leaves_the_queue_until_retried(self):
+        courier = self.make_courier()
+        stuck = self.place_order(self.make_cart([self.make_product(self.suppliers[0])]))
+        self.deliver(stuck, courier)
+        Shipment.objects.filter(order=stuck).update(to_state='Atlantis')
+        fine = self.place_order(self.make_cart([self.make_product(self.suppliers[0])]))
+        self.deliver(fine, courier)
+
+        metrics = settle_delivered_shipments(batch_size=1)
+        self.assertEqual((metrics['claimed'], metrics['failed']), (1, 1))
+        # The failed shipment no longer blocks the head of the queue.
+        self.assertEqual(settle_delivered_shipments(batch_size=1)['batch_size'], 1)
+        self.assertFalse(settlement_queue().exists())
+        self.assertTrue(Shipment.objects.get(order=stuck).settlement_error)
+
+        self.assertEqual(retry_failed_settlements(to_states=['Atlantis']), 1)
+        self.assertEqual(list(settlement_queue().values_list('order_id', flat=True)), [stuck.id])
+
+
+class ClaimShipmentTests(OrderTestCase):
+
+    def ready_shipment(self):
+        order = self.place_order(self.make_cart([self.make_product(self.suppliers[0])]))
+        shipment = Shipment.objects.get(order=order)
+        Shipment.objects.filter(pk=shipment.pk).update(status=Shipment.ShipmentStatus.READY_TO_SHIP)
+        return order, shipment
+
+    def test_only_the_first_courier_gets_the_shipment(self):
+        order, shipment = self.ready_shipment()
+        first, second = self.make_courier(name='first'), self.make_courier(name='second')
+
+        self.assertEqual(claim_shipment(shipment.pk, first), (order.id, self.suppliers[0].pk))
+        self.assertIsNone(claim_shipment(shipment.pk, second))
+        self.assertIsNone(claim_shipment(shipment.pk, first))
+
+        shipment.refresh_from_db()
+        self.assertEqual(shipment.delivery_person, first)
+        self.assertEqual(shipment.status, Shipment.ShipmentStatus.ON_MY_WAY)
+
+    def test_unclaimable_shipments_are_refused(self):
+        _, shipment = self.ready_shipment()
+        courier = self.make_courier()
+        self.assertIsNone(claim_shipment(shipment.pk, self.make_courier(governorate='Giza', name='elsewhere')))
+        self.assertIsNone(claim_shipment('not-a-uuid', courier))
+
+        Shipment.objects.filter(pk=shipment.pk).update(status=Shipment.ShipmentStatus.CREATED)
+        self.assertIsNone(claim_shipment(shipment.pk, courier))
+        self.assertIsNone(Shipment.objects.get(pk=shipment.pk).delivery_person)
+
+
+@skipUnless(connection.features.test_db_allows_multiple_connections, "The couriers need connections of their own.")
+@override_settings(CACHES=TEST_CACHES, CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class ClaimShipmentRaceTests(OrderFixtures, TransactionTestCase):
+
+    def test_racing_couriers_claim_a_shipment_once(self):
+        order = self.place_order(self.make_cart([self.make_product(self.suppliers[0])]))
+        shipment = Shipment.objects.get(order=order)
+        Shipment.objects.filter(pk=shipment.pk).update(status=Shipment.ShipmentStatus.READY_TO_SHIP)
+        couriers = [self.make_courier(name=f'courier{index}') for index in range(8)]
+        start = threading.Barrier(len(couriers))
+        claims = []
+
+        def claim(courier):
+            try:
+                start.wait()
+                claims.append(claim_shipment(shipment.pk, courier))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim, args=(courier,)) for courier in couriers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(claims), len(couriers))
+        self.assertEqual(sum(1 for row in claims if row is not None), 1)
+        self.assertIn(Shipment.objects.get(pk=shipment.pk).delivery_person, couriers)
+
+
+class CartStoreTests(RedisTestCase):
+
+    def tearDown(self):
+        cart_store.clear(self.customer.id)
+        super().tearDown()
+
+    def stored_lines(self):
+        return sorted(CartItems.objects.filter(CartID__User=self.customer).values_list('Product_id', 'Quantity', 'Color'))
+
+    def test_persist_writes_the_stored_cart_back(self):
+        pot, vase = self.make_product(self.suppliers[0]), self.make_product(self.suppliers[1])
+        cart_store.add(self.customer, pot, 2, color='red')
+        cart_store.add(self.customer, vase, 1)
+        cart_store.add(self.customer, pot, 1, color='red')
+        self.assertEqual(self.stored_lines(), [])
+        self.assertTrue(self.redis.sismember(DIRTY_CARTS_KEY, self.customer.id))
+
+        cart_store.persist(self.customer)
+
+        self.assertEqual(self.stored_lines(), [(pot.id, 3, 'red'), (vase.id, 1, '')])
+        self.assertFalse(self.redis.sismember(DIRTY_CARTS_KEY, self.customer.id))
+        self.assertEqual(Cart.objects.get(User=self.customer).version, 1)
+
+    def test_write_back_applies_changes_and_drops_deleted_products(self):
+        pot, vase, bowl = (self.make_product(self.suppliers[0]) for _ in range(3))
+        self.make_cart([pot, vase])
+        _, lines = cart_store.get(self.customer)
+        self.assertEqual(len(lines), 2)
+
+        pot_line = next(line for line in lines if line.Product_id == pot.id)
+        vase_line = next(line for line in lines if line.Product_id == vase.id)
+        cart_store.update(self.customer, pot_line.id, 4)
+        cart_store.remove(self.customer, vase_line.id)
+        cart_store.add(self.customer, bowl, 1)
+        bowl.delete()
+
+        cart_store.persist(self.customer)
+        self.assertEqual(self.stored_lines(), [(pot.id, 4, '')])
+
+        # Nothing changed since, so the cart version stays.
+        version = Cart.objects.get(User=self.customer).version
+        cart_store.persist(self.customer)
+        self.assertEqual(Cart.objects.get(User=self.customer).version, version)
+
+
+class CouponRedemptionTests(RedisTestCase):
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.coupon = Coupon.objects.create(
+            supplier=self.suppliers[0], code='CLAY10', discount=Decimal('10'), valid_from=now - timedelta(days=1),
+            valid_to=now + timedelta(days=1), max_uses=2, max_uses_per_user=1, terms='Test coupon',
+        )
+
+    def tearDown(self):
+        self.redis.delete(COUNTER_KEY.format(self.coupon.pk), USER_COUNTERS_KEY.format(self.coupon.pk))
+        coupon_redemptions.forget(self.coupon.code)
+        super().tearDown()
+
+    def redeem(self, user):
+        with coupon_redemptions.redeem(self.coupon.code, user) as redemption:
+            redemption.record()
+
+    def assertRefused(self, user, message):
+        with self.assertRaises(ValidationError) as raised:
+            self.redeem(user)
+        self.assertEqual(raised.exception.detail['message'], message)
+
+    def test_script_keeps_the_total_and_per_user_limits(self):
+        other = self.make_user('other@example.com', is_customer=True)
+        late = self.make_user('late@example.com', is_customer=True)
+
+        self.redeem(self.customer)
+        self.assertRefused(self.customer, USER_LIMIT_MESSAGE)
+        self.redeem(other)
+        self.assertRefused(late, EXHAUSTED_MESSAGE)
+
+        self.assertEqual(int(self.redis.get(COUNTER_KEY.format(self.coupon.pk))), 2)
+        self.assertEqual(Coupon.objects.get(pk=self.coupon.pk).uses_count, 2)
+        self.assertEqual(CouponUsage.objects.filter(coupon=self.coupon).count(), 2)
+
+    def test_failed_order_gives_the_use_back(self):
+        with self.assertRaises(RuntimeError):
+            with coupon_redemptions.redeem(self.coupon.code, self.customer):
+                raise RuntimeError("The order failed.")
+
+        self.assertEqual(int(self.redis.get(COUNTER_KEY.format(self.coupon.pk))), 0)
+        self.assertEqual(int(self.redis.hget(USER_COUNTERS_KEY.format(self.coupon.pk), self.customer.id)), 0)
+        # Checking a coupon takes nothing either.
+        coupon_redemptions.check(self.coupon, self.customer)
+        self.redeem(self.customer)
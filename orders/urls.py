@@ -9,6 +9,7 @@ router.register('carts', views.CartViewSet, basename='cart')
 router.register('cartitems', views.CartItemViewSet, basename='cartitem')
 router.register('orders', views.OrderViewSet, basename="order")
 router.register('coupons', views.CouponViewSet, basename='coupon')
+router.register('coupon-campaigns', views.CouponCampaignViewSet, basename='coupon-campaign')
 router.register('shipments', views.ShipmentViewSet, basename='shipment')
 router.register('return-orders-products', views.ReturnOrdersProductsViewSet, basename='return-orders-products')
 
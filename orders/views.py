@@ -1,41 +1,47 @@
+import csv
 import datetime
 from decimal import Decimal
 
-from django.core.cache import cache
 from django.db import transaction
 from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from rest_framework import generics, mixins, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from accounts.models import Address
+from accounts.models import Address, Supplier
+from Handcrafts.response_cache import response_cache
 from notifications.services import create_notification_for_user
-from products.models import Product
-from products.views import StandardResultsSetPagination
+from products.pagination import CatalogPagination, OptionalPageNumberPagination, StandardResultsSetPagination
 from returnrequest.models import Transaction
 
-from .models import Cart, CartItems, Coupon, Order, Shipment, Warehouse, Wishlist, WishlistItem
+from .models import (
+    CampaignCode, Cart, CartItems, Coupon, CouponCampaign, Order, Shipment, SupplierOrderInbox, Warehouse,
+    Wishlist, WishlistItem
+)
 from .permissions import DeliveryContractProvided, IsSupplier
+from .routing import WAREHOUSES_TAG
 from .serializers import (
     AddCartItemSerializer, AddWishlistItemSerializer, CartItemSerializer,
-    CartSerializer, CouponSerializer, OrderCreateSerializer,
+    CartLineSerializer, CartSerializer, CouponCampaignSerializer, CouponSerializer, OrderCreateSerializer,
     OrderRetrieveSerializer, OrderSimpleListSerializer,
     ReturnRequestListRetrieveSerializer, ShipmentSerializer,
     SupplierOrderRetrieveSerializer, UpdateCartItemSerializer,
     WarehouseSerializer, WishlistItemSerializer, WishlistSerializer
 )
 from .services import (
-    _calculate_all_order_totals_helper, _validate_cart_stock,
-    _validate_request_data, get_craft_user_by_email, get_warehouse_by_name
-)
-from .tasks import (
-    create_order_task, process_payments_task, send_order_notification_task
+    _validate_cart_stock, _validate_request_data, get_cart_quote,
+    get_craft_user_by_email
 )
+from .cancellation import CANCELLABLE_STATUSES, cancel_orders
+from .cart_store import attach_products, cart_store
+from .dispatch import claim_shipment, dispatch_board, roll_up_order_status
+from .settlement import queue_shipment_for_settlement
+from .tasks import create_order_task, generate_campaign_codes_task, send_order_notification_task
 
 
 class WishlistViewSet(viewsets.ModelViewSet):
@@ -81,6 +87,25 @@ class CartViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Cart.objects.filter(User=self.request.user)
 
+    def _stored_cart(self):
+        cart_id, lines = cart_store.get(self.request.user)
+        lines = attach_products(lines)
+        items = CartLineSerializer(lines, many=True, context=self.get_serializer_context()).data
+        return {"id": cart_id, "items": items, "grand_total": sum((line.sub_total for line in lines), Decimal('0.00'))}
+
+    def list(self, request, *args, **kwargs):
+        if not cart_store.available():
+            return super().list(request, *args, **kwargs)
+        return Response([self._stored_cart()])
+
+    def retrieve(self, request, *args, **kwargs):
+        if not cart_store.available():
+            return super().retrieve(request, *args, **kwargs)
+        cart = self._stored_cart()
+        if str(cart["id"]) != str(kwargs.get("pk")):
+            return Response({"message": "Cart not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(cart)
+
     def perform_create(self, serializer):
         user = self.request.user
         existing_cart = Cart.objects.filter(User=user).first()
@@ -89,6 +114,10 @@ class CartViewSet(viewsets.ModelViewSet):
         serializer.save(User=user)
         return Response({"message": "Cart created successfully"}, status=status.HTTP_201_CREATED)
 
+    def perform_destroy(self, instance):
+        instance.delete()
+        cart_store.clear(instance.User_id)
+
 
 class CartItemViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
@@ -106,12 +135,60 @@ class CartItemViewSet(viewsets.ModelViewSet):
             return UpdateCartItemSerializer
         return CartItemSerializer
 
+    def list(self, request, *args, **kwargs):
+        if not cart_store.available():
+            return super().list(request, *args, **kwargs)
+        _, lines = cart_store.get(request.user)
+        return Response(CartLineSerializer(attach_products(lines), many=True, context=self.get_serializer_context()).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not cart_store.available():
+            return super().retrieve(request, *args, **kwargs)
+        line = cart_store.get_line(request.user, kwargs["pk"])
+        lines = attach_products([line]) if line else []
+        if not lines:
+            return Response({"message": "Cart item not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(CartLineSerializer(lines[0], context=self.get_serializer_context()).data)
+
+    def update(self, request, *args, **kwargs):
+        if not cart_store.available():
+            return super().update(request, *args, **kwargs)
+        serializer = UpdateCartItemSerializer(data=request.data, partial=kwargs.pop("partial", False))
+        serializer.is_valid(raise_exception=True)
+        quantity = serializer.validated_data.get("Quantity")
+        if quantity is None:
+            line = cart_store.get_line(request.user, kwargs["pk"])
+        else:
+            line = cart_store.update(request.user, kwargs["pk"], quantity)
+        if line is None and quantity != 0:
+            return Response({"message": "Cart item not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"Quantity": line.Quantity if line else 0})
+
     def perform_create(self, serializer):
+        if cart_store.available():
+            serializer.save()
+            return
         user = self.request.user
         cart, created = Cart.objects.get_or_create(User=user)
         serializer.save(CartID=cart)
 
+    def perform_update(self, serializer):
+        cart_item = serializer.save()
+        cart_item.CartID.bump_version()
+
+    def perform_destroy(self, instance):
+        cart = instance.CartID
+        instance.delete()
+        cart.bump_version()
+
     def destroy(self, request, *args, **kwargs):
+        if cart_store.available():
+            if not cart_store.remove(request.user, kwargs["pk"]):
+                return Response({"message": "Cart item not found."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(
+                {"message": "Cart item deleted successfully."},
+                status=status.HTTP_200_OK,
+            )
         instance = self.get_object()
         if instance.CartID.User != request.user:
             return Response(
@@ -132,11 +209,21 @@ else:
     print("User not found.")
 
 
+class SupplierInboxPagination(CursorPagination):
+    """Keyset pages over a supplier's inbox: each page is one range scan of its index, however deep."""
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-order_created_at', '-order_id')
+
+
 class OrderViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = OrderCreateSerializer
     queryset = Order.objects.all()
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = CatalogPagination
+    keyset_orderings = ('created_at',)
+    keyset_default_ordering = '-created_at'
 
     def get_queryset(self):
         user = self.request.user
@@ -157,48 +244,49 @@ class OrderViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Li
             return OrderSimpleListSerializer
         return OrderCreateSerializer
 
-    @action(detail=False, methods=['get'], url_path='completed-supplier-orders',
-            permission_classes=[IsAuthenticated, IsSupplier])
-    def list_completed_supplier_orders(self, request):
-        user = self.request.user
-        queryset = Order.objects.for_supplier(user).exclude(
-            shipments__status=Shipment.ShipmentStatus.CREATED
-        ).distinct().order_by('-created_at')
+    def list(self, request, *args, **kwargs):
+        orders = None
+        if hasattr(request.user, 'delivery'):
+            orders = dispatch_board.waiting_orders(request.user.delivery)
+        if orders is None:
+            return super().list(request, *args, **kwargs)
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        page = self.paginate_queryset(orders)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    def _supplier_inbox_response(self, status_bucket):
+        inbox = SupplierOrderInbox.objects.filter(
+            supplier=self.request.user.supplier, status_bucket=status_bucket
+        ).select_related('order')
 
-    @action(detail=False, methods=['get'], url_path='uncompleted-supplier-orders',
-            permission_classes=[IsAuthenticated, IsSupplier])
-    def list_uncompleted_supplier_orders(self, request):
-        queryset = Order.objects.for_supplier(request.user).filter(
-            shipments__status=Shipment.ShipmentStatus.CREATED
-        ).distinct().order_by('-created_at')
+        page = self.paginate_queryset(inbox)
+        serializer = self.get_serializer([row.order for row in page], many=True)
+        return self.get_paginated_response(serializer.data)
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+    @action(detail=False, methods=['get'], url_path='completed-supplier-orders',
+            permission_classes=[IsAuthenticated, IsSupplier], pagination_class=SupplierInboxPagination)
+    def list_completed_supplier_orders(self, request):
+        return self._supplier_inbox_response(SupplierOrderInbox.StatusBucket.COMPLETED)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    @action(detail=False, methods=['get'], url_path='uncompleted-supplier-orders',
+            permission_classes=[IsAuthenticated, IsSupplier], pagination_class=SupplierInboxPagination)
+    def list_uncompleted_supplier_orders(self, request):
+        return self._supplier_inbox_response(SupplierOrderInbox.StatusBucket.UNCOMPLETED)
 
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsSupplier],
             url_path='supplier-orders-details')
     def retrieve_supplier_order(self, request, pk=None):
-        try:
-            order = Order.objects.for_supplier(request.user).filter(pk=pk).first()
-            serializer = self.get_serializer(order)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Order.DoesNotExist:
+        inbox_row = SupplierOrderInbox.objects.filter(
+            supplier=request.user.supplier, order_id=pk
+        ).select_related('order').first()
+        if inbox_row is None:
             return Response({"message": "Order not found or you don't have permission to view it."},
                             status=status.HTTP_404_NOT_FOUND)
 
+        serializer = self.get_serializer(inbox_row.order)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'], url_path='ready-to-ship', permission_classes=[IsAuthenticated, IsSupplier])
     def ready_to_ship(self, request, pk=None):
         user = request.user
@@ -226,37 +314,7 @@ class OrderViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Li
         try:
             order = Order.objects.get(pk=pk, user=request.user)
 
-            if order.status in [Order.OrderStatus.CREATED, Order.OrderStatus.In_Transmit]:
-                with transaction.atomic():
-                    order.status = Order.OrderStatus.CANCELLED
-                    order.save()
-
-                    cashback_amount = order.final_amount * Decimal('0.05')
-                    user = request.user
-
-                    if order.payment_method == Order.PaymentMethod.BALANCE:
-                        user.Balance += order.final_amount
-                        user.Balance -= cashback_amount
-                        Transaction.objects.create(user=user, transaction_type=Transaction.TransactionType.CASH_BACK,
-                                                   amount=-cashback_amount)
-                        Transaction.objects.create(user=user,
-                                                   transaction_type=Transaction.TransactionType.RETURNED_PRODUCT,
-                                                   amount=order.final_amount)
-                    elif order.payment_method == Order.PaymentMethod.CREDIT_CARD and order.paid:
-                        user.Balance += order.final_amount
-                        user.Balance -= cashback_amount
-                        Transaction.objects.create(user=user,
-                                                   transaction_type=Transaction.TransactionType.RETURNED_CASH_BACK,
-                                                   amount=-cashback_amount)
-                        Transaction.objects.create(user=user,
-                                                   transaction_type=Transaction.TransactionType.RETURNED_PRODUCT,
-                                                   amount=order.final_amount)
-                    elif order.payment_method == Order.PaymentMethod.CASH_ON_DELIVERY:
-                        user.Balance -= cashback_amount
-                        Transaction.objects.create(user=user,
-                                                   transaction_type=Transaction.TransactionType.RETURNED_CASH_BACK,
-                                                   amount=-cashback_amount)
-
+            if order.status in CANCELLABLE_STATUSES and cancel_orders([order.id])['cancelled']:
                 return Response({"message": "Order has been cancelled."}, status=status.HTTP_200_OK)
             else:
                 return Response(
@@ -268,24 +326,20 @@ class OrderViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Li
 
     @action(detail=False, methods=['post'], url_path='calculate-totals')
     def calculate_totals(self, request, *args, **kwargs):
+        cart_store.persist(request.user)
         cart = Cart.objects.get(User=request.user)
         address_id = request.data.get("address_id")
         coupon_code = request.data.get("coupon_code")
 
-        cache_key = f"cart_totals:{cart.id}:{address_id}:{coupon_code}"
-        totals = cache.get(cache_key)
-
-        if not totals:
-            _validate_request_data(cart, address_id, "")
-            address = Address.objects.filter(user=request.user, id=address_id).first()
-            if not address:
-                raise ValidationError("Address not found or does not belong to the user.")
+        _validate_request_data(cart, address_id, "")
+        address = Address.objects.filter(user=request.user, id=address_id).first()
+        if not address:
+            raise ValidationError("Address not found or does not belong to the user.")
 
-            cart_items = CartItems.objects.filter(CartID=cart)
-            _validate_cart_stock(cart_items)
+        cart_items = list(CartItems.objects.filter(CartID=cart).select_related('Product__Supplier__user'))
+        _validate_cart_stock(cart_items)
 
-            totals = _calculate_all_order_totals_helper(cart_items, coupon_code, address, request.user)
-            cache.set(cache_key, totals, 60 * 15)
+        totals = get_cart_quote(cart, cart_items, address, coupon_code, request.user)
 
         return Response({
             "message": "Order totals calculated successfully",
@@ -293,6 +347,7 @@ class OrderViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Li
         }, status=status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
+        cart_store.persist(request.user)
         cart = Cart.objects.get(User=request.user)
         address_id = request.data.get("address_id")
         coupon_code = request.data.get("coupon_code")
@@ -300,7 +355,7 @@ class OrderViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Li
 
         _validate_request_data(cart, address_id, payment_method)
         address = Address.objects.filter(user=request.user, id=address_id).first()
-        cart_items = CartItems.objects.filter(CartID=cart)
+        cart_items = list(CartItems.objects.filter(CartID=cart).select_related('Product__Supplier__user'))
 
         _validate_cart_stock(cart_items)
 
@@ -311,7 +366,7 @@ class OrderViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Li
             }, status=status.HTTP_200_OK)
 
         if payment_method == Order.PaymentMethod.BALANCE:
-            totals = _calculate_all_order_totals_helper(cart_items, coupon_code, address, request.user)
+            totals = get_cart_quote(cart, cart_items, address, coupon_code, request.user)
             if request.user.Balance < totals['final_amount']:
                 raise ValidationError({"message": "Insufficient balance for this order."})
 
@@ -332,6 +387,8 @@ class ShipmentViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets
     serializer_class = ShipmentSerializer
     permission_classes = [IsAuthenticated, DeliveryContractProvided]
     queryset = Shipment.objects.all()
+    # Courier clients expect a bare list; pages are opt-in.
+    pagination_class = OptionalPageNumberPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -344,33 +401,45 @@ class ShipmentViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets
             Q(delivery_person=user.delivery) & Q(status=Shipment.ShipmentStatus.ON_MY_WAY)
         ).order_by('-created_at')
 
+    def list(self, request, *args, **kwargs):
+        shipments = None
+        if hasattr(request.user, 'delivery'):
+            shipments = dispatch_board.claimable_shipments(request.user.delivery)
+        if shipments is None:
+            return super().list(request, *args, **kwargs)
+
+        page = self.paginate_queryset(shipments)
+        if page is None:
+            return Response(self.get_serializer(shipments, many=True).data)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['post'], url_path='accept')
     def accept(self, request, pk=None):
-        try:
-            shipment = self.get_queryset().get(pk=pk, delivery_person=None)
-        except Shipment.DoesNotExist:
+        if not hasattr(request.user, 'delivery'):
             return Response({'message': 'Shipment not found or is already taken.'}, status=status.HTTP_404_NOT_FOUND)
 
         with transaction.atomic():
-            shipment.delivery_person = request.user.delivery
-            shipment.status = Shipment.ShipmentStatus.ON_MY_WAY
-            shipment.save()
-
-            if shipment.order:
-                order = shipment.order
-                if not order.shipments.exclude(status=Shipment.ShipmentStatus.ON_MY_WAY).exists():
-                    order.status = Order.OrderStatus.ON_MY_WAY
-                    order.save()
+            claimed = claim_shipment(pk, request.user.delivery)
+            if claimed is None:
+                return Response({'message': 'Shipment not found or is already taken.'}, status=status.HTTP_404_NOT_FOUND)
+
+            order_id, supplier_id = claimed
+            if order_id:
+                user_id, order_number = roll_up_order_status(
+                    order_id, Shipment.ShipmentStatus.ON_MY_WAY, Order.OrderStatus.ON_MY_WAY
+                )
+                supplier_user_id = Supplier.objects.filter(pk=supplier_id).values_list('user_id', flat=True).first()
 
                 send_order_notification_task.delay(
-                    user_id=order.user.id,
-                    message=f"A delivery person is on their way with a shipment for your order #{order.order_number}.",
-                    order_id=str(order.id)
+                    user_id=user_id,
+                    message=f"A delivery person is on their way with a shipment for your order #{order_number}.",
+                    order_id=str(order_id)
                 )
                 send_order_notification_task.delay(
-                    user_id=shipment.supplier.user.id,
-                    message=f"Your shipment for order #{order.order_number} has been picked up by a delivery person.",
-                    order_id=str(order.id)
+                    user_id=supplier_user_id,
+                    message=f"Your shipment for order #{order_number} has been picked up by a delivery person.",
+                    order_id=str(order_id)
                 )
 
         return Response({'status': 'Shipment accepted and status updated to on my way'})
@@ -388,24 +457,21 @@ class ShipmentViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets
             return Response({"message": "Invalid confirmation code."}, status=status.HTTP_400_BAD_REQUEST)
 
         with transaction.atomic():
-            warehouse = get_warehouse_by_name(shipment.to_state)
-
             shipment.status = Shipment.ShipmentStatus.DELIVERED_SUCCESSFULLY
             shipment.delivery_confirmed_at = timezone.now()
             shipment.save()
 
-            if shipment.order:
-                order = shipment.order
-                if all(s.status == Shipment.ShipmentStatus.DELIVERED_SUCCESSFULLY for s in order.shipments.all()):
-                    order.status = Order.OrderStatus.DELIVERED_SUCCESSFULLY
-                    order.save()
+            if shipment.order_id:
+                user_id, order_number = roll_up_order_status(
+                    shipment.order_id, Shipment.ShipmentStatus.DELIVERED_SUCCESSFULLY, Order.OrderStatus.DELIVERED_SUCCESSFULLY
+                )
 
-                process_payments_task.delay(request.user.id, str(shipment.id), str(warehouse.id))
+                transaction.on_commit(queue_shipment_for_settlement)
 
                 send_order_notification_task.delay(
-                    user_id=order.user.id,
-                    message=f"A shipment for your order #{order.order_number} has been successfully delivered!",
-                    order_id=str(order.id)
+                    user_id=user_id,
+                    message=f"A shipment for your order #{order_number} has been successfully delivered!",
+                    order_id=str(shipment.order_id)
                 )
 
         return Response({'message': 'Shipment status updated to delivered successfully'}, status=status.HTTP_200_OK)
@@ -428,14 +494,14 @@ class CouponViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        # The rules coupons of campaigns are managed through their campaign.
+        coupons = Coupon.objects.filter(campaign__isnull=True)
         if hasattr(self.request.user, 'supplier'):
-            return Coupon.objects.filter(supplier=self.request.user.supplier)
-        return Coupon.objects.filter(active=True)
+            return coupons.filter(supplier=self.request.user.supplier)
+        return coupons.filter(active=True)
 
     def perform_create(self, serializer):
-        coupon = serializer.save(supplier=self.request.user.supplier)
-        supplier_products = Product.objects.filter(Supplier=self.request.user.supplier)
-        coupon.products.set(supplier_products)
+        serializer.save(supplier=self.request.user.supplier)
 
     def perform_update(self, serializer):
         instance = self.get_object()
@@ -443,8 +509,6 @@ class CouponViewSet(viewsets.ModelViewSet):
             return Response({"message": "You do not have permission to perform this action."},
                             status=status.HTTP_403_FORBIDDEN)
         serializer.save()
-        supplier_products = Product.objects.filter(Supplier=self.request.user.supplier)
-        instance.products.set(supplier_products)
 
     def perform_destroy(self, instance):
         if instance.supplier != self.request.user.supplier:
@@ -454,10 +518,52 @@ class CouponViewSet(viewsets.ModelViewSet):
         return Response({"message": "Coupon deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
 
+class _Echo:
+    """A file-like object whose write() returns the line, so csv.writer can feed a streamed response."""
+
+    def write(self, value):
+        return value
+
+
+class CouponCampaignViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin,
+                            viewsets.GenericViewSet):
+    serializer_class = CouponCampaignSerializer
+    permission_classes = [IsAuthenticated, IsSupplier]
+    pagination_class = StandardResultsSetPagination
+
+    def get_queryset(self):
+        return CouponCampaign.objects.filter(supplier=self.request.user.supplier).select_related('coupon')
+
+    def perform_create(self, serializer):
+        campaign = serializer.save()
+        transaction.on_commit(lambda: generate_campaign_codes_task.delay(campaign.id))
+
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """Streams the campaign's codes as CSV, reading them from the database in chunks."""
+        campaign = self.get_object()
+        codes = (
+            CampaignCode.objects.filter(campaign=campaign)
+            .order_by('id')
+            .values_list('code', 'redeemed_at')
+            .iterator(chunk_size=5000)
+        )
+        writer = csv.writer(_Echo())
+
+        def rows():
+            yield writer.writerow(['code', 'redeemed_at'])
+            for code, redeemed_at in codes:
+                yield writer.writerow([code, redeemed_at.isoformat() if redeemed_at else ''])
+
+        response = StreamingHttpResponse(rows(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="campaign-{campaign.id}-codes.csv"'
+        return response
+
+
 class WarehouseListView(generics.ListAPIView):
     queryset = Warehouse.objects.all()
     serializer_class = WarehouseSerializer
 
-    @method_decorator(cache_page(60 * 60 * 24)) 
+    @response_cache.page([WAREHOUSES_TAG])
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
\ No newline at end of file
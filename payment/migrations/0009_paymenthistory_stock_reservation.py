@@ -0,0 +1,20 @@
+# Generated by Django 5.0.3 on 2026-10-18 20:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0046_stockreservation_stockreservationitem_and_more'),
+        ('payment', '0008_paymenthistory_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenthistory',
+            name='stock_reservation',
+            field=models.OneToOneField(blank=True, help_text='The stock held for this checkout until it is paid or expires.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='orders.stockreservation'),
+        ),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models
 from accounts.models import User,Address
-from orders.models import Order, Cart
+from orders.models import Order, Cart, StockReservation
 from course.models import Course, Enrollment
 import uuid
 
@@ -43,6 +43,13 @@ class PaymentHistory(models.Model):
         null=True,
         help_text="The coupon code used for the order."
     )
+    stock_reservation = models.OneToOneField(
+        StockReservation,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        help_text="The stock held for this checkout until it is paid or expires."
+    )
     course = models.ForeignKey(
         Course,
         on_delete=models.SET_NULL,
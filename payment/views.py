@@ -6,11 +6,12 @@ from rest_framework import status, viewsets
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
+from orders.cart_store import cart_store
 from orders.models import Cart, CartItems
 from course.models import Course, Enrollment
 from .serializers import CourseInformationSerializer
 from .models import PaymentHistory
-from orders.services import _calculate_all_order_totals_helper
+from orders.services import get_cart_quote, release_stock_reservation, reserve_cart_stock
 from accounts.models import Address
 from notifications.services import create_notification_for_user
 
@@ -25,6 +26,7 @@ class PaymentViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["post"])
     def process_order_payment(self, request):
         user = request.user
+        cart_store.persist(user)
         cart = get_object_or_404(Cart, User=user)
         address_id = request.data.get("address_id")
         coupon_code = request.data.get("coupon_code")
@@ -34,12 +36,13 @@ class PaymentViewSet(viewsets.ViewSet):
         except Address.DoesNotExist:
             raise ValidationError("Address not found or does not belong to the user.")
 
-        cart_items = CartItems.objects.filter(CartID=cart)
+        cart_items = list(CartItems.objects.filter(CartID=cart).select_related('Product__Supplier__user'))
 
-        if not cart_items.exists():
+        if not cart_items:
             raise ValidationError({"message": "Cart is empty. Cannot create order."})
 
-        totals = _calculate_all_order_totals_helper(cart_items, coupon_code, address, user)
+        totals = get_cart_quote(cart, cart_items, address, coupon_code, user)
+        reservation = reserve_cart_stock(user, cart_items)
 
         payment_history = PaymentHistory.objects.create(
             user=user,
@@ -47,6 +50,7 @@ class PaymentViewSet(viewsets.ViewSet):
             payment_status='pending',
             address_id=address,
             coupon_code=coupon_code,
+            stock_reservation=reservation,
         )
 
         success_url = f"crafterapp://payment/success?session_id={{CHECKOUT_SESSION_ID}}"
@@ -57,6 +61,7 @@ class PaymentViewSet(viewsets.ViewSet):
             "client_reference_id": str(payment_history.id),
             "success_url": success_url,
             "cancel_url": cancel_url,
+            "expires_at": int(reservation.expires_at.timestamp()),
             "line_items": [],
         }
 
@@ -113,6 +118,7 @@ class PaymentViewSet(viewsets.ViewSet):
         except stripe.error.StripeError as e:
             payment_history.payment_status = 'failed'
             payment_history.save()
+            release_stock_reservation(reservation)
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class CoursePaymentViewSet(viewsets.ViewSet):
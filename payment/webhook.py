@@ -3,7 +3,7 @@ from django.conf import settings
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from orders.models import Order
-from orders.services import create_order_from_cart
+from orders.services import create_order_from_cart, release_stock_reservation
 from course.models import Course, Enrollment
 from django.contrib.auth import get_user_model
 from .models import PaymentHistory
@@ -79,7 +79,10 @@ def stripe_webhook(request):
             address_object = payment_history.address_id
             coupon_code = payment_history.coupon_code
             
-            order = create_order_from_cart(user, cart, address_object.id, coupon_code, Order.PaymentMethod.CREDIT_CARD, is_paid=True)
+            order = create_order_from_cart(
+                user, cart, address_object.id, coupon_code, Order.PaymentMethod.CREDIT_CARD,
+                is_paid=True, reservation=payment_history.stock_reservation
+            )
             
             payment_history.order = order
             payment_history.save()
@@ -93,4 +96,16 @@ def stripe_webhook(request):
             
             return HttpResponse(status=200)
 
+    if event['type'] == 'checkout.session.expired':
+        session = event['data']['object']
+        payment_history = PaymentHistory.objects.filter(
+            stripe_session_id=session.get('id'), payment_status='pending'
+        ).select_related('stock_reservation').first()
+
+        if payment_history:
+            payment_history.payment_status = 'failed'
+            payment_history.save(update_fields=['payment_status'])
+            if payment_history.stock_reservation:
+                release_stock_reservation(payment_history.stock_reservation)
+
     return HttpResponse(status=200)
\ No newline at end of file
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+class ProductsConfig(AppConfig):
+    name = 'products'
+
+    def ready(self):
+        import products.signals
@@ -0,0 +1,385 @@
+import heapq
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+from django_redis import get_redis_connection
+
+from .models import Category, Product
+
+PRODUCT, CATEGORY = 'product', 'category'
+# Cached per prefix: twice a page of suggestions, so entries changed since the build can be skipped.
+TOP_SIZE = 20
+# Prefixes matching at most this many names are answered by scanning them; longer ones have a cached top list.
+SCAN_LIMIT = 256
+# Changes kept in the overlay before they are merged into a new index.
+MAX_OVERLAY = 1000
+CHANGES_KEY = "products:autocomplete:changes"
+MAX_CHANGES = 10000
+_AFTER_ALL = '\U0010ffff'
+
+Suggestion = namedtuple('Suggestion', ['kind', 'pk', 'text', 'slug'])
+
+
+def normalize(text):
+    """The form names are matched in: case and accents folded, whitespace collapsed."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ' '.join(''.join(c for c in text if not unicodedata.combining(c)).casefold().split())
+
+
+def entry_ref(kind, pk):
+    # Products and categories share one int id space: the low bit tells them apart.
+    return pk * 2 + (kind == CATEGORY)
+
+
+def split_ref(ref):
+    return (CATEGORY if ref & 1 else PRODUCT), ref >> 1
+
+
+class AutocompleteIndex:
+    """
+    An immutable index of (ref, text, score) entries: the normalized texts
+    in one sorted list, with refs, texts and scores in parallel arrays.
+
+    The entries starting with a prefix are one contiguous range found by
+    two binary searches. Short ranges are scanned; for every prefix that
+    matches more than SCAN_LIMIT entries the best positions of its TOP_SIZE
+    best distinct keys are computed at build time, bottom-up like the nodes
+    of a trie, so no query looks at more than a few hundred entries whatever
+    the catalog size. Entries with the same key (one product name from
+    several suppliers) sort next to each other and count once, by their
+    best entry.
+    """
+
+    def __init__(self, entries):
+        rows = sorted(
+            (key, ref, text, score)
+            for ref, text, score in entries
+            if (key := normalize(text))
+        )
+        self.keys = [row[0] for row in rows]
+        self.texts = [row[2] for row in rows]
+        self.refs = array('q', (row[1] for row in rows))
+        self.scores = array('d', (row[3] for row in rows))
+        self.top = {}
+        if len(rows) > SCAN_LIMIT:
+            self._cache_top(0, len(rows), 0)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def entries(self):
+        return zip(self.refs, self.texts, self.scores)
+
+    def _best(self, positions, n):
+        """The best position of each of the `n` best distinct keys among `positions`, best first."""
+        best = {}
+        for position in positions:
+            key = self.keys[position]
+            if key not in best or self.scores[position] > self.scores[best[key]]:
+                best[key] = position
+        return heapq.nlargest(n, best.values(), key=self.scores.__getitem__)
+
+    def _best_of_key(self, key, skip):
+        """The best position with `key` whose ref is not in `skip`, or None."""
+        lo = bisect_left(self.keys, key)
+        hi = bisect_left(self.keys, key + '\0', lo)
+        positions = [position for position in range(lo, hi) if self.refs[position] not in skip]
+        return max(positions, key=self.scores.__getitem__, default=None)
+
+    def _cache_top(self, lo, hi, depth):
+        """The best positions in keys[lo:hi], which share their first `depth` characters."""
+        if hi - lo <= SCAN_LIMIT:
+            return self._best(range(lo, hi), TOP_SIZE)
+
+        prefix = self.keys[lo][:depth]
+        # Keys equal to the prefix sort first; the rest are split by their next character.
+        start = bisect_left(self.keys, prefix + '\0', lo, hi)
+        candidates = self._best(range(lo, start), TOP_SIZE)
+        while start < hi:
+            child = self.keys[start][:depth + 1]
+            end = bisect_left(self.keys, child + _AFTER_ALL, start, hi)
+            candidates.extend(self._cache_top(start, end, depth + 1))
+            start = end
+
+        top = self._best(candidates, TOP_SIZE)
+        if depth:
+            self.top[prefix] = top
+        return top
+
+    def best(self, prefix, n, skip=()):
+        """
+        Positions of the `n` best distinct keys starting with `prefix`, best
+        first, leaving out refs in `skip`.
+        """
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + _AFTER_ALL, lo)
+        if hi - lo > SCAN_LIMIT and prefix in self.top:
+            top = self.top[prefix]
+            # Keys outside the cached list score at most as much as its last one.
+            floor = self.scores[top[-1]] if len(top) == TOP_SIZE else float('-inf')
+            candidates = []
+            for position in top:
+                if self.refs[position] in skip:
+                    # The key may still have another entry that is not skipped.
+                    position = self._best_of_key(self.keys[position], skip)
+                    if position is None or self.scores[position] < floor:
+                        continue
+                candidates.append(position)
+            if len(candidates) >= n:
+                return heapq.nlargest(n, candidates, key=self.scores.__getitem__)
+        positions = range(lo, hi)
+        if skip:
+            positions = (position for position in positions if self.refs[position] not in skip)
+        return self._best(positions, n)
+
+
+def popularity(units_sold, rating):
+    # Units sold, with the rating breaking ties.
+    return float(units_sold or 0) + float(rating or 0) / 10
+
+
+def catalog_entries(slugs):
+    """(ref, text, score) for every product and active category; fills `slugs` with the category slugs."""
+    from orders.models import OrderItem
+
+    sold = dict(OrderItem.objects.values_list('product_id').annotate(units=Sum('quantity')).order_by())
+    category_scores = {}
+    products = Product.objects.values_list('id', 'ProductName', 'Category_id', 'Rating')
+    for pk, name, category_id, rating in products.iterator(chunk_size=5000):
+        score = popularity(sold.get(pk), rating)
+        category_scores[category_id] = category_scores.get(category_id, 0) + score
+        yield entry_ref(PRODUCT, pk), name, score
+    for pk, title, slug in Category.objects.filter(Active=True).values_list('CategoryID', 'Title', 'Slug'):
+        slugs[entry_ref(CATEGORY, pk)] = slug
+        yield entry_ref(CATEGORY, pk), title, category_scores.get(pk, 0)
+
+
+class ProductAutocomplete:
+    """
+    Search suggestions from an AutocompleteIndex held in each worker's
+    memory, so answering one touches neither the database nor Redis.
+
+    The index is built in a background thread on the worker's first
+    request (see signals.py) and rebuilt every AUTOCOMPLETE_REBUILD_INTERVAL
+    seconds; suggest() returns None until the first build is done. Saved
+    and deleted products and categories go into an overlay that queries
+    merge over the index, and are published on a Redis stream that every
+    other worker reads at most once per AUTOCOMPLETE_SYNC_INTERVAL. Past
+    MAX_OVERLAY changes the overlay is merged into a new index in the
+    background. Queryset updates send no signals and show up with the next
+    rebuild.
+    """
+
+    def __init__(self, sync=True):
+        self.sync = sync
+        self._lock = threading.Lock()
+        self._index = None
+        # ref -> (text or None when removed, normalized text, score, slug, seq); replaced on write, never mutated.
+        self._overlay = {}
+        self._slugs = {}
+        self._seq = 0
+        self._building = False
+        self._built_at = 0.0
+        self._synced_at = 0.0
+        self._last_change_id = None
+
+    def _client(self):
+        if not self.sync:
+            return None
+        try:
+            return get_redis_connection("default")
+        except NotImplementedError:
+            return None
+
+    @property
+    def ready(self):
+        return self._index is not None
+
+    def warm(self):
+        """Starts building the index in the background unless it is built and fresh, or being built."""
+        if self._building or (self._index is not None and
+                              time.monotonic() - self._built_at < settings.AUTOCOMPLETE_REBUILD_INTERVAL):
+            return
+        self._rebuild(from_database=True)
+
+    def _rebuild(self, from_database):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._build, args=(from_database,), daemon=True).start()
+
+    def _build(self, from_database):
+        try:
+            started_seq = self._seq
+            if from_database:
+                # Changes published from here on are applied after the build, the earlier ones are in the database.
+                last_change_id = self._stream_tail()
+                slugs = {}
+                index = AutocompleteIndex(catalog_entries(slugs))
+            else:
+                last_change_id, slugs = self._last_change_id, dict(self._slugs)
+                index = AutocompleteIndex(self._merged_entries(slugs))
+            self.install(index, slugs, started_seq, last_change_id)
+        except Exception as e:
+            print(f"Autocomplete index build failed: {e}")
+        finally:
+            self._building = False
+            if from_database:
+                connection.close()
+
+    def _merged_entries(self, slugs):
+        index, overlay = self._index, self._overlay
+        for ref, text, score in index.entries():
+            if ref not in overlay:
+                yield ref, text, score
+        for ref, (text, _, score, slug, _) in overlay.items():
+            if text:
+                if slug:
+                    slugs[ref] = slug
+                yield ref, text, score
+
+    def install(self, index, slugs=None, started_seq=None, last_change_id=None):
+        """Swaps in `index`, keeping only the overlay entries that came after `started_seq`."""
+        with self._lock:
+            self._index = index
+            self._slugs = slugs or {}
+            if started_seq is None:
+                self._overlay = {}
+            else:
+                self._overlay = {ref: entry for ref, entry in self._overlay.items() if entry[4] > started_seq}
+            self._built_at = time.monotonic()
+            if last_change_id is not None:
+                self._last_change_id = last_change_id
+
+    def _stream_tail(self):
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            latest = client.xrevrange(CHANGES_KEY, count=1)
+        except Exception as e:
+            print(f"Autocomplete change stream unavailable: {e}")
+            return None
+        return latest[0][0].decode() if latest else '0-0'
+
+    def _apply(self, ref, text, score, slug):
+        with self._lock:
+            self._seq += 1
+            self._overlay = {**self._overlay, ref: (text or None, normalize(text), score, slug, self._seq)}
+            merge = len(self._overlay) > MAX_OVERLAY and self._index is not None
+        if merge:
+            self._rebuild(from_database=False)
+
+    def _publish(self, ref, text, score, slug):
+        self._apply(ref, text, score, slug)
+        client = self._client()
+        if client is None:
+            return
+        try:
+            client.xadd(
+                CHANGES_KEY,
+                {'ref': ref, 'text': text or '', 'score': score, 'slug': slug or ''},
+                maxlen=MAX_CHANGES, approximate=True,
+            )
+        except Exception as e:
+            print(f"Autocomplete change could not be published: {e}")
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < settings.AUTOCOMPLETE_SYNC_INTERVAL:
+            return
+        self._synced_at = now
+        client = self._client()
+        if client is None:
+            return
+        try:
+            changes = client.xrange(
+                CHANGES_KEY, min=f"({self._last_change_id}" if self._last_change_id else '-', count=MAX_CHANGES
+            )
+        except Exception as e:
+            print(f"Autocomplete change stream unavailable: {e}")
+            return
+        for change_id, fields in changes:
+            fields = {field.decode(): value.decode() for field, value in fields.items()}
+            self._apply(int(fields['ref']), fields['text'], float(fields['score']), fields['slug'] or None)
+            self._last_change_id = change_id.decode()
+
+    def product_saved(self, product):
+        if not (self._index is not None or self._client()):
+            return
+        from orders.models import OrderItem
+
+        sold = OrderItem.objects.filter(product_id=product.pk).aggregate(units=Sum('quantity'))['units']
+        self._publish(entry_ref(PRODUCT, product.pk), product.ProductName, popularity(sold, product.Rating), None)
+
+    def product_deleted(self, pk):
+        self._publish(entry_ref(PRODUCT, pk), None, 0.0, None)
+
+    def category_saved(self, category):
+        if not category.Active:
+            self.category_deleted(category.pk)
+            return
+        if not (self._index is not None or self._client()):
+            return
+        from orders.models import OrderItem
+
+        sold = OrderItem.objects.filter(product__Category_id=category.pk).aggregate(units=Sum('quantity'))['units']
+        ratings = Product.objects.filter(Category_id=category.pk).aggregate(total=Sum('Rating'))['total']
+        self._publish(entry_ref(CATEGORY, category.pk), category.Title, popularity(sold, ratings), category.Slug)
+
+    def category_deleted(self, pk):
+        self._publish(entry_ref(CATEGORY, pk), None, 0.0, None)
+
+    def suggest(self, text, limit=10):
+        """
+        The `limit` most popular distinct products and categories whose
+        name starts with `text`, or None while the index is being built.
+        """
+        index = self._index
+        if index is None:
+            self.warm()
+            return None
+        if time.monotonic() - self._built_at >= settings.AUTOCOMPLETE_REBUILD_INTERVAL:
+            self.warm()
+        self._sync()
+
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        if text[-1].isspace():
+            prefix += ' '
+
+        overlay, slugs = self._overlay, self._slugs
+        matches = [
+            (index.scores[position], index.keys[position], index.refs[position], index.texts[position])
+            for position in index.best(prefix, limit, skip=overlay)
+        ]
+        matches.extend(
+            (score, key, ref, entry_text)
+            for ref, (entry_text, key, score, _, _) in overlay.items()
+            if entry_text and key.startswith(prefix)
+        )
+        matches.sort(key=lambda match: (-match[0], match[1]))
+
+        suggestions, seen = [], set()
+        for _, key, ref, entry_text in matches:
+            if key in seen:
+                continue
+            seen.add(key)
+            kind, pk = split_ref(ref)
+            slug = overlay[ref][3] if ref in overlay else slugs.get(ref)
+            suggestions.append(Suggestion(kind, pk, entry_text, slug))
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+
+product_autocomplete = ProductAutocomplete()
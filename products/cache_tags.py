@@ -0,0 +1,73 @@
+from django.db import transaction
+
+from Handcrafts.response_cache import response_cache
+from .facets import wants_facets
+from .models import Category, Product
+
+# Every product listing that is not limited to one category, material or supplier.
+PRODUCTS_TAG = 'products'
+CATEGORIES_TAG = 'categories'
+MATERIALS_TAG = 'materials'
+# The product fields that limit a listing to one scope, with the name of the scope in its tag.
+PRODUCT_SCOPES = {'Category_id': 'category', 'MatCategory_id': 'material', 'Supplier_id': 'supplier'}
+# Listing filters that limit the products to one scope.
+SCOPE_FILTERS = {'Category': 'category', 'MatCategory': 'material', 'Supplier': 'supplier'}
+
+
+def products_tag(scope, pk):
+    return f"products:{scope}:{pk}"
+
+
+def collections_tag(supplier_id):
+    return f"collections:supplier:{supplier_id}"
+
+
+def product_tags(scope_rows):
+    """
+    The tags of the listings that products with `scope_rows`, tuples of
+    their PRODUCT_SCOPES values, can appear in.
+    """
+    tags = {PRODUCTS_TAG}
+    for row in scope_rows:
+        tags.update(products_tag(scope, pk) for scope, pk in zip(PRODUCT_SCOPES.values(), row) if pk is not None)
+    return tags
+
+
+def invalidate_products(product_ids, previous=()):
+    """
+    Drops the cached listings of the products, in the scopes they are in
+    now and in the `previous` scope rows read before they changed or were
+    deleted, so a product moved to another category leaves both listings.
+    """
+    rows = list(previous)
+    if product_ids:
+        rows += Product.objects.filter(pk__in=product_ids).values_list(*PRODUCT_SCOPES)
+    response_cache.invalidate(*product_tags(rows))
+
+
+def invalidate_products_on_commit(product_ids, previous=(), using=None):
+    product_ids, previous = list(product_ids), list(previous)
+    transaction.on_commit(lambda: invalidate_products(product_ids, previous), using=using)
+
+
+def catalog_tags(view, request):
+    """
+    Tags of a product listing: the scope of its ?Category=, ?MatCategory=
+    or ?Supplier= filter, the whole catalog otherwise. Facets also show the
+    titles of categories and materials.
+    """
+    params = request.query_params
+    tags = [CATEGORIES_TAG, MATERIALS_TAG] if wants_facets(params) else []
+    for param, scope in SCOPE_FILTERS.items():
+        value = params.get(param, '')
+        if value.isdigit():
+            return tags + [products_tag(scope, int(value))]
+    return tags + [PRODUCTS_TAG]
+
+
+def category_products_tags(view, request):
+    """Tags of the listing of one category, found by the slug in the URL."""
+    category_id = Category.objects.filter(Slug=view.kwargs.get('Slug')).values_list('pk', flat=True).first()
+    if category_id is None:
+        return [CATEGORIES_TAG]
+    return [CATEGORIES_TAG, products_tag('category', category_id)]
@@ -0,0 +1,110 @@
+import time
+
+from django.db.models import OuterRef, Q, Subquery
+
+from .cache_tags import PRODUCT_SCOPES, invalidate_products
+from .models import ProductCard, ProImage, Product
+
+CARD_CHUNK_SIZE = 1000
+CARD_UPDATE_FIELDS = [
+    'name', 'price', 'discount', 'image', 'image_id', 'supplier', 'supplier_name', 'supplier_photo',
+    'category', 'rating', 'in_stock', 'published',
+]
+
+
+def _first_image():
+    return (
+        ProImage.objects.filter(product=OuterRef('pk'))
+        .exclude(Q(image='') | Q(image__isnull=True))
+        .order_by('id')
+    )
+
+
+def refresh_product_cards(product_ids):
+    """
+    Recomputes the cards of `product_ids` with one read and one upsert and
+    returns how many were written. Cards of deleted products are removed
+    with them by the cascade, so ids of deleted products are just skipped.
+    """
+    products = (
+        Product.objects.filter(pk__in=product_ids)
+        .select_related('Supplier__user')
+        .annotate(
+            first_image_id=Subquery(_first_image().values('id')[:1]),
+            first_image=Subquery(_first_image().values('image')[:1]),
+        )
+    )
+    cards = [
+        ProductCard(
+            product_id=product.pk,
+            name=product.ProductName,
+            price=product.UnitPrice,
+            discount=product.Discount,
+            image=product.first_image or '',
+            image_id=product.first_image_id,
+            supplier_id=product.Supplier_id,
+            supplier_name=product.Supplier.user.get_full_name,
+            supplier_photo=product.Supplier.SupplierPhoto.name or '',
+            category_id=product.Category_id,
+            rating=product.Rating,
+            in_stock=not product.OutOfStock and product.Stock > 0,
+            published=product.Publish_Date,
+        )
+        for product in products
+    ]
+    ProductCard.objects.bulk_create(
+        cards, update_conflicts=True, unique_fields=['product'], update_fields=CARD_UPDATE_FIELDS
+    )
+    return len(cards)
+
+
+def refresh_stock_state(product_ids):
+    """
+    Refreshes the cards of those of `product_ids` whose card no longer says
+    whether they are in stock, drops their cached listings and returns how
+    many there were. Stock changes that leave a product in stock, or out of
+    it, change neither.
+    """
+    in_stock = Q(OutOfStock=False, Stock__gt=0)
+    crossed = list(
+        Product.objects.filter(pk__in=product_ids)
+        .filter(Q(card__in_stock=True) & ~in_stock | Q(card__in_stock=False) & in_stock)
+        .values_list('pk', *PRODUCT_SCOPES)
+    )
+    if crossed:
+        refresh_product_cards([row[0] for row in crossed])
+        invalidate_products([], [row[1:] for row in crossed])
+    return len(crossed)
+
+
+def refresh_supplier_cards(supplier_id, chunk_size=CARD_CHUNK_SIZE):
+    """Recomputes the cards of every product of a supplier, e.g. after its name or photo changed."""
+    return rebuild_product_cards(chunk_size, Product.objects.filter(Supplier_id=supplier_id))
+
+
+def rebuild_product_cards(chunk_size=CARD_CHUNK_SIZE, products=None, progress=None):
+    """
+    Recomputes the cards of `products` (the whole catalog by default) in
+    primary key chunks and returns how many were written. `progress` is
+    called after every chunk with the cards written so far and the seconds
+    the chunk took.
+    """
+    products = (Product.objects.all() if products is None else products).order_by('pk')
+    written, last_pk = 0, 0
+    while True:
+        started = time.monotonic()
+        pks = list(products.filter(pk__gt=last_pk).values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return written
+        written += refresh_product_cards(pks)
+        last_pk = pks[-1]
+        if progress:
+            progress(written, time.monotonic() - started)
+
+
+def card_image_url(product):
+    """URL of the first image of `product`, from its card."""
+    try:
+        return product.card.image_url
+    except ProductCard.DoesNotExist:
+        return None
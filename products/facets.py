@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+# Lower bounds of the price buckets; bucket i holds prices from PRICE_BUCKETS[i] up to the next bound.
+PRICE_BUCKETS = (Decimal('0'), Decimal('100'), Decimal('250'), Decimal('500'), Decimal('1000'),
+                 Decimal('2500'), Decimal('5000'))
+# Rating bucket i holds ratings from i up to i + 1; the top bucket also holds 5.
+RATING_BUCKETS = (0, 1, 2, 3, 4)
+
+
+def wants_facets(params):
+    return params.get('facets') in ('1', 'true')
+
+
+def price_bucket_expression():
+    return Case(
+        *[When(UnitPrice__gte=lower, then=Value(index)) for index, lower in reversed(list(enumerate(PRICE_BUCKETS)))],
+        output_field=IntegerField(),
+    )
+
+
+def rating_bucket_expression():
+    return Case(
+        *[When(Rating__gte=lower, then=Value(lower)) for lower in reversed(RATING_BUCKETS)],
+        output_field=IntegerField(),
+    )
+
+
+def price_bucket_range(index):
+    """The (lowest, highest exclusive or None) prices of price bucket `index`."""
+    upper = PRICE_BUCKETS[index + 1] if index + 1 < len(PRICE_BUCKETS) else None
+    return PRICE_BUCKETS[index], upper
+
+
+def product_facets(queryset):
+    """
+    Counts of the products in `queryset` per Category, MatCategory, price
+    bucket and rating bucket, from one grouped query: the products are
+    grouped by all four at once and the combinations are summed up here,
+    so the database scans the filtered products a single time and returns
+    at most one row per combination that actually occurs.
+    """
+    combinations = (
+        queryset.order_by()
+        .values(
+            category=F('Category_id'), category_title=F('Category__Title'),
+            material=F('MatCategory_id'), material_title=F('MatCategory__Title'),
+            price=price_bucket_expression(), rating=rating_bucket_expression(),
+        )
+        .annotate(products=Count('pk'))
+    )
+
+    categories, materials, prices, ratings = {}, {}, {}, {}
+    for row in combinations:
+        entry = categories.setdefault(row['category'], {'value': row['category'], 'label': row['category_title'], 'count': 0})
+        entry['count'] += row['products']
+        entry = materials.setdefault(row['material'], {'value': row['material'], 'label': row['material_title'], 'count': 0})
+        entry['count'] += row['products']
+        prices[row['price']] = prices.get(row['price'], 0) + row['products']
+        ratings[row['rating']] = ratings.get(row['rating'], 0) + row['products']
+
+    by_count = lambda entry: (-entry['count'], entry['label'] or '')
+    price_facets = []
+    for index in sorted(prices):
+        lower, upper = price_bucket_range(index)
+        price_facets.append({
+            'value': index, 'min': str(lower), 'max': str(upper) if upper is not None else None, 'count': prices[index],
+        })
+    return {
+        'Category': sorted(categories.values(), key=by_count),
+        'MatCategory': sorted(materials.values(), key=by_count),
+        'price': price_facets,
+        'rating': [{'value': lower, 'count': ratings[lower]} for lower in sorted(ratings)],
+    }
@@ -1,21 +1,58 @@
-from django.contrib.postgres.search import SearchVector
 import django_filters
+from rest_framework.filters import SearchFilter
+from .facets import PRICE_BUCKETS, RATING_BUCKETS, price_bucket_range
 from .models import Product
+from .search import fuzzy_search_products, is_fuzzy, search_products
 
 class ProductFilter(django_filters.FilterSet):
     search = django_filters.CharFilter(method='filter_by_search', label='Search') 
     min_price = django_filters.NumberFilter(field_name="UnitPrice", lookup_expr='gte')
     max_price = django_filters.NumberFilter(field_name="UnitPrice", lookup_expr='lte')
     rating = django_filters.NumberFilter(field_name="Rating", lookup_expr='gte') 
+    price_bucket = django_filters.NumberFilter(method='filter_by_price_bucket', label='Price bucket')
+    rating_bucket = django_filters.NumberFilter(method='filter_by_rating_bucket', label='Rating bucket')
     
     class Meta:
         model = Product
-        fields = ['Category', 'Supplier', 'search', 'min_price', 'max_price', 'rating'] 
+        fields = ['Category', 'MatCategory', 'Supplier', 'search', 'min_price', 'max_price', 'rating',
+                  'price_bucket', 'rating_bucket'] 
 
     def filter_by_search(self, queryset, name, value):
         """
-        Annotates the queryset with a search vector and filters based on it.
+        Filters on the stored search vector and orders the matches by rank;
+        with ?fuzzy=1 misspelled product names match as well.
         """
-        return queryset.annotate(
-            search=SearchVector('ProductName', 'ProductDescription'),
-        ).filter(search=value)
\ No newline at end of file
+        if is_fuzzy(self.data):
+            return fuzzy_search_products(queryset, value)
+        return search_products(queryset, value)
+
+    def filter_by_price_bucket(self, queryset, name, value):
+        """Limits the products to one of the price buckets reported in the facets."""
+        index = int(value)
+        if not 0 <= index < len(PRICE_BUCKETS):
+            return queryset.none()
+        lower, upper = price_bucket_range(index)
+        queryset = queryset.filter(UnitPrice__gte=lower)
+        return queryset.filter(UnitPrice__lt=upper) if upper is not None else queryset
+
+    def filter_by_rating_bucket(self, queryset, name, value):
+        """Limits the products to one of the rating buckets reported in the facets."""
+        lower = int(value)
+        if lower not in RATING_BUCKETS:
+            return queryset.none()
+        if lower == RATING_BUCKETS[-1]:
+            return queryset.filter(Rating__gte=lower)
+        return queryset.filter(Rating__gte=lower, Rating__lt=lower + 1)
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    SearchFilter over the view's search_fields, switching to ranked,
+    typo-tolerant search with ?fuzzy=1.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if is_fuzzy(request.query_params):
+            text = request.query_params.get(self.search_param, '').strip()
+            return fuzzy_search_products(queryset, text) if text else queryset
+        return super().filter_queryset(request, queryset, view)
\ No newline at end of file
@@ -0,0 +1,73 @@
+from django.db.models import Prefetch
+
+from accounts.fragments import supplier_tag
+from Handcrafts.response_cache import fragment_cache
+from .cache_tags import collections_tag, products_tag
+from .models import Collection, CollectionItem, ProductCard
+from .serializers import LatestCollectionSerializer, TrendingProductSerializer
+
+# How many of its newest products and collections each supplier contributes to the feeds.
+FEED_SIZE = 10
+
+
+def _supplier_id(name):
+    return int(name.rsplit(':', 1)[1])
+
+
+def latest_supplier_products(supplier_ids):
+    """
+    The newest product cards of each supplier as (publish date, serialized
+    card) pairs, by supplier id. Shared by every follower of the supplier.
+    """
+
+    def build(names):
+        return {
+            name: [
+                (card.published, TrendingProductSerializer(card).data)
+                for card in ProductCard.objects.filter(supplier_id=_supplier_id(name)).order_by('-published')[:FEED_SIZE]
+            ]
+            for name in names
+        }
+
+    fragments = fragment_cache.get_many(
+        [f"supplier_latest_products:{pk}" for pk in supplier_ids], build,
+        lambda name: [products_tag('supplier', _supplier_id(name))],
+    )
+    return {_supplier_id(name): products for name, products in fragments.items()}
+
+
+def latest_supplier_collections(supplier_ids):
+    """
+    The newest collections of each supplier as (creation date, serialized
+    collection) pairs, by supplier id. Shared by every follower of the supplier.
+    """
+    items = Prefetch('items', queryset=CollectionItem.objects.select_related('product__card').order_by('id'))
+
+    def build(names):
+        fragments = {}
+        for name in names:
+            collections = (
+                Collection.objects.filter(supplier_id=_supplier_id(name))
+                .select_related('supplier__user').prefetch_related(items)
+                .order_by('-created_at')[:FEED_SIZE]
+            )
+            fragments[name] = [
+                (collection.created_at, LatestCollectionSerializer(collection).data) for collection in collections
+            ]
+        return fragments
+
+    fragments = fragment_cache.get_many(
+        [f"supplier_latest_collections:{pk}" for pk in supplier_ids], build,
+        lambda name: [
+            collections_tag(_supplier_id(name)), products_tag('supplier', _supplier_id(name)),
+            supplier_tag(_supplier_id(name)),
+        ],
+    )
+    return {_supplier_id(name): collections for name, collections in fragments.items()}
+
+
+def newest(fragments, count=FEED_SIZE):
+    """The `count` newest entries of the (date, data) lists in `fragments`, newest first."""
+    entries = [entry for entries in fragments.values() for entry in entries]
+    entries.sort(key=lambda entry: entry[0], reverse=True)
+    return [data for _, data in entries[:count]]
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from products.search import BACKFILL_CHUNK_SIZE, backfill_search_vectors
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills Product.search_vector in primary key chunks. The migration that adds the column fills "
+        "the existing catalog; use this for products written around the ORM, or with --all after the "
+        "weights change. Only products without a vector are touched unless --all is given, so the "
+        "command can be re-run after an interruption."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=BACKFILL_CHUNK_SIZE, help="Products per UPDATE.")
+        parser.add_argument('--all', action='store_true', help="Recompute the vectors of every product.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Search vectors need PostgreSQL.")
+
+        def progress(done, seconds):
+            self.stdout.write(f"{done} product(s) indexed, last chunk took {seconds:.2f}s")
+
+        done = backfill_search_vectors(
+            chunk_size=options['chunk_size'], only_missing=not options['all'], progress=progress
+        )
+        self.stdout.write(self.style.SUCCESS(f"Indexed {done} product(s)."))
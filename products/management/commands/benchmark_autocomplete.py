@@ -0,0 +1,73 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.autocomplete import (CATEGORY, PRODUCT, AutocompleteIndex,
+                                   ProductAutocomplete, entry_ref)
+
+ADJECTIVES = [
+    "Handmade", "Vintage", "Rustic", "Embroidered", "Painted", "Carved", "Woven", "Hammered",
+    "Glazed", "Beaded", "Knitted", "Engraved", "Pharaonic", "Nubian", "Bedouin", "Minimal",
+]
+MATERIALS = [
+    "Oak", "Olive Wood", "Copper", "Brass", "Leather", "Linen", "Cotton", "Clay", "Ceramic",
+    "Glass", "Silver", "Palm Leaf", "Alabaster", "Wool", "Bamboo", "Marble",
+]
+ITEMS = [
+    "Bowl", "Lamp", "Lantern", "Rug", "Basket", "Vase", "Mug", "Tray", "Necklace", "Bracelet",
+    "Bag", "Wallet", "Scarf", "Cushion", "Mirror", "Coaster", "Plate", "Candle Holder", "Box", "Frame",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the autocomplete index over synthetic product names and measures the latency "
+        "of top-10 suggestions for random prefixes. Touches neither the database nor Redis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--names', type=int, default=1000000, help="Number of product names to index.")
+        parser.add_argument('--queries', type=int, default=20000, help="Number of suggestion queries.")
+        parser.add_argument('--changes', type=int, default=500, help="Saved products in the overlay.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        names = [
+            f"{rng.choice(ADJECTIVES)} {rng.choice(MATERIALS)} {rng.choice(ITEMS)} {rng.randrange(10000)}"
+            for _ in range(options['names'])
+        ]
+        entries = [(entry_ref(PRODUCT, pk), name, rng.paretovariate(1.2)) for pk, name in enumerate(names, 1)]
+        entries.extend((entry_ref(CATEGORY, pk), title, 1000.0) for pk, title in enumerate(ITEMS, 1))
+
+        started = time.perf_counter()
+        index = AutocompleteIndex(entries)
+        built = time.perf_counter() - started
+        self.stdout.write(
+            f"Indexed {len(index)} names in {built:.1f}s, {len(index.top)} cached prefixes."
+        )
+
+        autocomplete = ProductAutocomplete(sync=False)
+        autocomplete.install(index)
+        for pk in rng.sample(range(1, len(names) + 1), options['changes']):
+            autocomplete._apply(entry_ref(PRODUCT, pk), f"Renamed {names[pk - 1]}", rng.paretovariate(1.2), None)
+
+        prefixes = []
+        for _ in range(options['queries']):
+            name = rng.choice(names)
+            prefixes.append(name[:rng.randint(1, min(len(name), 24))])
+
+        timings = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            autocomplete.suggest(prefix)
+            timings.append(time.perf_counter() - started)
+
+        timings.sort()
+        percentile = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))] * 1e3
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(timings)} queries: mean {statistics.fmean(timings) * 1e3:.3f} ms, "
+            f"p50 {percentile(0.5):.3f} ms, p99 {percentile(0.99):.3f} ms, max {timings[-1] * 1e3:.3f} ms."
+        ))
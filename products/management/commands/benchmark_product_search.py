@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from accounts.models import Supplier
+from products.management.commands.benchmark_autocomplete import ADJECTIVES, ITEMS, MATERIALS
+from products.models import Product
+from products.search import fuzzy_search_products, search_products
+
+INSERT_CHUNK_SIZE = 5000
+
+
+def misspell(word, rng):
+    """`word` with one typo: two letters swapped, one dropped, or one doubled."""
+    position = rng.randrange(1, len(word) - 1)
+    typo = rng.choice(('swap', 'drop', 'double'))
+    if typo == 'swap':
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    if typo == 'drop':
+        return word[:position] + word[position + 1:]
+    return word[:position] + word[position] + word[position:]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the latency and hit rate of full-text and fuzzy (?fuzzy=1) product search for "
+        "misspelled craft terms. --products adds that many synthetic products first, inside a "
+        "transaction that is rolled back at the end unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=0, help="Synthetic products to add, e.g. 100000 or 1000000.")
+        parser.add_argument('--queries', type=int, default=200, help="Number of misspelled searches.")
+        parser.add_argument('--keep', action='store_true', help="Keep the synthetic products.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Product search needs PostgreSQL.")
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            if options['products']:
+                self._add_products(options['products'], rng)
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE products_product")
+
+            words = [word for name in ITEMS + MATERIALS for word in name.split() if len(word) > 3]
+            searches = [(word, misspell(word, rng)) for word in (rng.choice(words) for _ in range(options['queries']))]
+            queryset = Product.objects.filter(Stock__gt=0).only('id', 'ProductName')
+            for label, search in (('full-text', search_products), ('fuzzy', fuzzy_search_products)):
+                timings, hits = [], 0
+                for word, typo in searches:
+                    started = time.perf_counter()
+                    names = [product.ProductName for product in search(queryset, typo)[:10]]
+                    timings.append(time.perf_counter() - started)
+                    hits += any(word.lower() in name.lower() for name in names)
+                timings.sort()
+                self.stdout.write(self.style.SUCCESS(
+                    f"{label:>9}: {hits}/{len(searches)} misspelled searches found the product, "
+                    f"p50 {statistics.median(timings) * 1e3:.1f} ms, "
+                    f"p99 {timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e3:.1f} ms."
+                ))
+
+            if options['products'] and not options['keep']:
+                transaction.set_rollback(True)
+
+    def _add_products(self, count, rng):
+        supplier = Supplier.objects.first()
+        if supplier is None:
+            raise CommandError("Synthetic products need at least one supplier.")
+        started = time.perf_counter()
+        for offset in range(0, count, INSERT_CHUNK_SIZE):
+            Product.objects.bulk_create([
+                Product(
+                    ProductName=f"{rng.choice(ADJECTIVES)} {rng.choice(MATERIALS)} {rng.choice(ITEMS)}",
+                    ProductDescription=f"{rng.choice(ADJECTIVES)} {rng.choice(ITEMS).lower()} made by hand.",
+                    Supplier=supplier,
+                    QuantityPerUnit='1',
+                    UnitPrice=Decimal(rng.randint(1000, 100000)) / 100,
+                    UnitWeight=Decimal('1.00'),
+                    Stock=rng.randint(0, 50),
+                )
+                for _ in range(min(INSERT_CHUNK_SIZE, count - offset))
+            ])
+        self.stdout.write(f"Added {count} products in {time.perf_counter() - started:.1f}s.")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from Handcrafts.cache_guard import METRICS
+from Handcrafts.response_cache import fragment_guard, response_guard
+from orders.services import cart_quote_guard
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints the hits, misses, stale serves, early refreshes and lock waits of the cached "
+        "responses, fragments and cart quotes over the last minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=15, help="Length of the window, in minutes.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Last {options['minutes']} minute(s):")
+        for guard in (response_guard, fragment_guard, cart_quote_guard):
+            metrics = guard.metrics(options['minutes'])
+            self.stdout.write(f"{guard.name}:")
+            for metric in METRICS:
+                self.stdout.write(f"  {metric:>15}: {metrics[metric]}")
+            self.stdout.write(f"  {metrics['hit_rate']:.2%} of lookups answered from the cache")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.cards import CARD_CHUNK_SIZE, rebuild_product_cards
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the ProductCard of every product in primary key chunks. Cards are upserted, so "
+        "the command can be re-run at any time, e.g. after an interruption or a bulk import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CARD_CHUNK_SIZE, help="Products per upsert.")
+
+    def handle(self, *args, **options):
+        def progress(written, seconds):
+            self.stdout.write(f"{written} card(s) written, last chunk took {seconds:.2f}s")
+
+        written = rebuild_product_cards(chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} product card(s)."))
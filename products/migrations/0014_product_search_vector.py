@@ -0,0 +1,50 @@
+# Generated by Django 5.0.3 on 2026-10-18 21:13
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+BACKFILL_CHUNK_SIZE = 2000
+
+
+def fill_search_vectors(apps, schema_editor):
+    # The same vector as products.models.search_vector_expression(), from the historical
+    # model, in primary key chunks like products.search.backfill_search_vectors().
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Product = apps.get_model('products', 'Product')
+    products = Product.objects.using(schema_editor.connection.alias).order_by('pk')
+    vector = SearchVector('ProductName', weight='A') + SearchVector('ProductDescription', weight='B')
+    last_pk = 0
+    while True:
+        pks = list(products.filter(pk__gt=last_pk).values_list('pk', flat=True)[:BACKFILL_CHUNK_SIZE])
+        if not pks:
+            return
+        products.filter(pk__in=pks).update(search_vector=vector)
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_product_products_pr_product_971b37_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_Product_971b37_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # Filled before the index is built, so search finds the existing catalog as soon as this is applied.
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+        ),
+    ]
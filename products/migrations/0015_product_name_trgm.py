@@ -0,0 +1,20 @@
+# Generated by Django 5.0.3 on 2026-10-18 21:18
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_product_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ProductName'], name='product_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
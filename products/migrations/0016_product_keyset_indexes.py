@@ -0,0 +1,33 @@
+# Generated by Django 5.0.3 on 2026-10-18 21:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_product_name_trgm'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_UnitPri_618b96_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_Rating_5236fa_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['UnitPrice', 'id'], name='product_price_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['Rating', 'id'], name='product_rating_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['Publish_Date', 'id'], name='product_published_keyset'),
+        ),
+    ]
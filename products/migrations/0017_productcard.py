@@ -0,0 +1,72 @@
+# Generated by Django 5.0.3 on 2026-10-18 21:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Q, Subquery
+
+
+def fill_cards(apps, schema_editor):
+    # The same fields as products.cards.refresh_product_cards(), from the historical models.
+    Product = apps.get_model('products', 'Product')
+    ProImage = apps.get_model('products', 'ProImage')
+    ProductCard = apps.get_model('products', 'ProductCard')
+    first_image = ProImage.objects.filter(product=OuterRef('pk')).exclude(Q(image='') | Q(image__isnull=True)).order_by('id')
+    products = Product.objects.select_related('Supplier__user').annotate(
+        first_image_id=Subquery(first_image.values('id')[:1]),
+        first_image=Subquery(first_image.values('image')[:1]),
+    ).order_by('pk')
+    cards = []
+    for product in products.iterator(chunk_size=1000):
+        user = product.Supplier.user
+        cards.append(ProductCard(
+            product_id=product.pk,
+            name=product.ProductName,
+            price=product.UnitPrice,
+            discount=product.Discount,
+            image=product.first_image or '',
+            image_id=product.first_image_id,
+            supplier_id=product.Supplier_id,
+            supplier_name=f"{user.first_name.title()} {user.last_name.title()}",
+            supplier_photo=product.Supplier.SupplierPhoto.name or '',
+            category_id=product.Category_id,
+            rating=product.Rating,
+            in_stock=not product.OutOfStock and product.Stock > 0,
+            published=product.Publish_Date,
+        ))
+        if len(cards) == 1000:
+            ProductCard.objects.bulk_create(cards)
+            cards = []
+    ProductCard.objects.bulk_create(cards)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_alter_user_balance'),
+        ('products', '0016_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='products.product')),
+                ('name', models.CharField(max_length=100)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discount', models.DecimalField(decimal_places=2, default=0.0, max_digits=5)),
+                ('image', models.CharField(blank=True, max_length=255)),
+                ('image_id', models.IntegerField(blank=True, null=True)),
+                ('supplier_name', models.CharField(max_length=150)),
+                ('supplier_photo', models.CharField(blank=True, max_length=255)),
+                ('rating', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('in_stock', models.BooleanField()),
+                ('published', models.DateTimeField()),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.category')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_cards', to='accounts.supplier')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['supplier', '-published'], name='card_supplier_published_idx'), models.Index(fields=['category', 'in_stock', '-published'], name='card_category_published_idx')],
+            },
+        ),
+        migrations.RunPython(fill_cards, migrations.RunPython.noop),
+    ]
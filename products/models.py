@@ -1,4 +1,6 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connections, models, transaction
 from accounts.models import Supplier
 from django.utils.text import slugify
 from accounts .models import User
@@ -29,6 +31,135 @@ class MatCategory(models.Model):
     def __str__(self):
         return self.Title
     
+# Only the fields that feed Product.search_vector, with their weights.
+SEARCH_VECTOR_WEIGHTS = {'ProductName': 'A', 'ProductDescription': 'B'}
+# The fields copied into ProductCard.
+CARD_FIELDS = {'ProductName', 'UnitPrice', 'Discount', 'Rating', 'Stock', 'OutOfStock',
+               'Category', 'Category_id', 'Supplier', 'Supplier_id', 'Publish_Date'}
+# The fields no cached listing or card shows.
+UNLISTED_FIELDS = {'width', 'height', 'watt', 'search_vector'}
+# The fields that decide which listings a product is in.
+SCOPE_FIELDS = {'Category', 'Category_id', 'MatCategory', 'MatCategory_id', 'Supplier', 'Supplier_id'}
+# Stock moves with every order; the listings follow it only when a product runs out or comes back.
+STOCK_FIELDS = {'Stock', 'OutOfStock'}
+
+
+def search_vector_expression(values=None):
+    """
+    The weighted tsvector of a product. Fields in `values` are taken from
+    there instead of the row, so an UPDATE that changes them can set the
+    vector from the new values in the same statement.
+    """
+    values = values or {}
+    vector = None
+    for field, weight in SEARCH_VECTOR_WEIGHTS.items():
+        part = SearchVector(values.get(field, field), weight=weight)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def has_search_vector(using):
+    # tsvector is PostgreSQL only; elsewhere the column is left empty.
+    return connections[using].vendor == 'postgresql'
+
+
+def refresh_cards_on_commit(product_ids, using):
+    from .cards import refresh_product_cards
+
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: refresh_product_cards(product_ids), using=using)
+
+
+def invalidate_listings_on_commit(product_ids, previous=(), using=None):
+    from .cache_tags import invalidate_products_on_commit
+
+    invalidate_products_on_commit(product_ids, previous, using)
+
+
+def refresh_stock_state_on_commit(product_ids, using=None):
+    from .cards import refresh_stock_state
+
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: refresh_stock_state(product_ids), using=using)
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Keeps search_vector, ProductCard and the cached product listings in step
+    with bulk writes that bypass Product.save().
+
+    Updates of Stock and OutOfStock alone leave the cards and listings to
+    stock_changed(), which the stock writers call with the products they
+    touched, so an order only drops the listings of products that ran out.
+    """
+
+    def update(self, **kwargs):
+        fields = set(kwargs)
+        changed = {field: kwargs[field] for field in SEARCH_VECTOR_WEIGHTS if field in kwargs}
+        if changed and 'search_vector' not in kwargs and has_search_vector(self.db):
+            kwargs['search_vector'] = search_vector_expression({
+                field: value if hasattr(value, 'resolve_expression') else models.Value(value)
+                for field, value in changed.items()
+            })
+        if fields <= STOCK_FIELDS or fields <= UNLISTED_FIELDS:
+            return super().update(**kwargs)
+
+        if fields & SCOPE_FIELDS:
+            # The rows move to other listings and may no longer match the filter once updated,
+            # so they are read first, with the category, material and supplier they are listed under.
+            previous = list(self.values_list('pk', 'Category_id', 'MatCategory_id', 'Supplier_id'))
+            product_ids, scopes = [row[0] for row in previous], [row[1:] for row in previous]
+            moved_ids = product_ids
+        else:
+            # The rows stay in their listings: the distinct listings are enough.
+            product_ids = list(self.values_list('pk', flat=True)) if fields & CARD_FIELDS else []
+            scopes = list(self.order_by().values_list('Category_id', 'MatCategory_id', 'Supplier_id').distinct())
+            moved_ids = []
+        rows = super().update(**kwargs)
+        if fields & CARD_FIELDS:
+            refresh_cards_on_commit(product_ids, self.db)
+        invalidate_listings_on_commit(moved_ids, scopes, self.db)
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        product_ids = [obj.pk for obj in objs]
+        if set(fields) <= STOCK_FIELDS:
+            rows = super().bulk_update(objs, fields, batch_size=batch_size)
+            self.stock_changed(product_ids)
+            return rows
+        previous = list(self.filter(pk__in=product_ids).values_list('Category_id', 'MatCategory_id', 'Supplier_id'))
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        if set(SEARCH_VECTOR_WEIGHTS).intersection(fields):
+            self.refresh_search_vectors(product_ids)
+        if CARD_FIELDS.intersection(fields):
+            refresh_cards_on_commit(product_ids, self.db)
+        invalidate_listings_on_commit(product_ids, previous, self.db)
+        return rows
+
+    def stock_changed(self, product_ids):
+        """
+        Once committed, refreshes the cards and drops the cached listings of
+        those of `product_ids` that ran out of stock or came back.
+        """
+        refresh_stock_state_on_commit(product_ids, self.db)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        self.refresh_search_vectors([obj.pk for obj in objs if obj.pk is not None])
+        refresh_cards_on_commit([obj.pk for obj in objs if obj.pk is not None], self.db)
+        invalidate_listings_on_commit([obj.pk for obj in objs if obj.pk is not None], using=self.db)
+        return objs
+
+    def refresh_search_vectors(self, pks=None):
+        """Recomputes search_vector for `pks`, or for the whole queryset, and returns the rows updated."""
+        if not has_search_vector(self.db):
+            return 0
+        queryset = self if pks is None else self.filter(pk__in=pks)
+        return super(ProductQuerySet, queryset).update(search_vector=search_vector_expression())
+
+
 class Product(models.Model):
     id = models.AutoField(primary_key=True)
     ProductName = models.CharField(max_length=100)
@@ -49,12 +180,19 @@ class Product(models.Model):
     width = models.DecimalField(max_digits=10, decimal_places=2,blank=True, null=True,validators=(MinValueValidator(0.0), MaxValueValidator(1000.0)))
     height = models.DecimalField(max_digits=10, decimal_places=2,blank=True, null=True,validators=(MinValueValidator(0.0), MaxValueValidator(1000.0)))
     watt = models.DecimalField(max_digits=10, decimal_places=2,blank=True, null=True,validators=(MinValueValidator(0.0), MaxValueValidator(1000.0)))
-    
+    # Weighted tsvector of ProductName (A) and ProductDescription (B), kept up to date by save() and ProductQuerySet.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         indexes = [
-            models.Index(fields=['ProductName', 'ProductDescription']),
-            models.Index(fields=['UnitPrice']),
-            models.Index(fields=['Rating']),
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+            GinIndex(fields=['ProductName'], name='product_name_trgm', opclasses=['gin_trgm_ops']),
+            # One per keyset ordering (see pagination.py); they serve lookups on the sort key alone too.
+            models.Index(fields=['UnitPrice', 'id'], name='product_price_keyset'),
+            models.Index(fields=['Rating', 'id'], name='product_rating_keyset'),
+            models.Index(fields=['Publish_Date', 'id'], name='product_published_keyset'),
         ]
         
     def __str__(self):
@@ -73,6 +211,10 @@ class Product(models.Model):
         else:
             self.Discount = 0.0
         super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(SEARCH_VECTOR_WEIGHTS).intersection(update_fields):
+            Product.objects.using(self._state.db).refresh_search_vectors([self.pk])
         
 @receiver(pre_save, sender=Product)
 def toggle_out_of_stock(sender, instance, **kwargs):
@@ -88,6 +230,45 @@ class ProImage(models.Model):
     def __str__(self):
         return self.product.ProductName
 
+class ProductCard(models.Model):
+    """
+    What product listings show of a product, in one row: kept current from
+    Product, ProImage, Supplier and the supplier's User by cards.py, so a
+    listing reads cards instead of joining and fetching images per product.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='card')
+    name = models.CharField(max_length=100)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount = models.DecimalField(max_digits=5, decimal_places=2, default=0.0)
+    # Storage name and id of the product's first image, blank without one.
+    image = models.CharField(max_length=255, blank=True)
+    image_id = models.IntegerField(blank=True, null=True)
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='product_cards')
+    supplier_name = models.CharField(max_length=150)
+    supplier_photo = models.CharField(max_length=255, blank=True)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    rating = models.DecimalField(max_digits=10, decimal_places=2)
+    in_stock = models.BooleanField()
+    published = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['supplier', '-published'], name='card_supplier_published_idx'),
+            models.Index(fields=['category', 'in_stock', '-published'], name='card_category_published_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def image_url(self):
+        return ProImage._meta.get_field('image').storage.url(self.image) if self.image else None
+
+    @property
+    def supplier_photo_url(self):
+        return Supplier._meta.get_field('SupplierPhoto').storage.url(self.supplier_photo) if self.supplier_photo else None
+
+
 class ProColors(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name = "Colors")
     Color = models.CharField(max_length=20,blank=True, null=True) 
@@ -0,0 +1,205 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+INVALID_CURSOR_MESSAGE = "Invalid cursor."
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class OptionalPageNumberPagination(StandardResultsSetPagination):
+    """
+    Pages only when the client asks for it with ?page= or ?page_size=, so an
+    endpoint that used to return a bare list keeps doing so for the clients
+    that do not.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.page_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+def approximate_count(queryset):
+    """
+    The planner's estimate of the rows in `queryset` instead of a COUNT(*):
+    pg_class.reltuples for a whole table, the EXPLAIN row estimate for a
+    filtered queryset. Exact on other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    queryset = queryset.order_by()
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+            # -1 means the table was never analyzed.
+            if row and row[0] >= 0:
+                return row[0]
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pages over (sort key, id): the cursor holds the sort key and id
+    of the last row shown and the next page is the rows after it, so every
+    page is one index range scan however deep it is, and there is no
+    COUNT(*). ?count=approx adds an estimated total from approximate_count().
+
+    Views list their sort keys in `keyset_orderings` and may set
+    `keyset_default_ordering`; the ordering comes from ?ordering= or else
+    from the queryset's own first ordering term.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    count_query_param = 'count'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def get_ordering(self, queryset, request, view):
+        """The ordering term to page on, e.g. '-UnitPrice', or None if the queryset can't be paged by key."""
+        allowed = getattr(view, 'keyset_orderings', ())
+        requested = request.query_params.get(self.ordering_query_param, '')
+        if requested.lstrip('-') in allowed:
+            return requested
+        if queryset.query.order_by:
+            first = queryset.query.order_by[0]
+            # Ordered by something else, such as the rank of search results.
+            return first if isinstance(first, str) and first.lstrip('-') in allowed else None
+        return getattr(view, 'keyset_default_ordering', '-pk')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return cursor['v'], cursor['id'], bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(INVALID_CURSOR_MESSAGE)
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        elif value is not None and not isinstance(value, (int, float, str)):
+            value = str(value)
+        cursor = {'v': value, 'id': str(row.pk)}
+        if reverse:
+            cursor['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = self.get_ordering(queryset, request, view)
+        if ordering is None:
+            raise NotFound(INVALID_CURSOR_MESSAGE)
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.field = ordering.lstrip('-')
+        self.count = approximate_count(queryset) if request.query_params.get(self.count_query_param) == 'approx' else None
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[2])
+        # Walking back from a cursor scans the other way and flips the page afterwards.
+        descending = ordering.startswith('-') != reverse
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}pk')
+        if cursor:
+            value, pk, _ = cursor
+            after = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{after}e': value})
+                & (Q(**{f'{self.field}__{after}': value}) | Q(**{f'pk__{after}': pk}))
+            )
+
+        size = self.get_page_size(request)
+        rows = list(queryset[:size + 1])
+        more = len(rows) > size
+        rows = rows[:size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, more
+        else:
+            self.has_next, self.has_previous = more, cursor is not None
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data}
+        if self.count is not None:
+            response = {'count': self.count, 'count_is_approximate': True, **response}
+        return Response(response)
+
+
+class CatalogPagination(StandardResultsSetPagination):
+    """
+    Page numbers as before, or keyset pages (KeysetPagination) for requests
+    that pass ?cursor=, empty for the first page. A view with
+    `keyset_pagination = True` gets keyset pages unless ?page= is given.
+    Lists that are not querysets, and querysets ordered by something other
+    than a sort key, keep page numbers.
+    """
+
+    def use_keyset(self, queryset, request, view):
+        params = request.query_params
+        wanted = KeysetPagination.cursor_query_param in params or (
+            getattr(view, 'keyset_pagination', False) and self.page_query_param not in params
+        )
+        if not wanted or not isinstance(queryset, QuerySet):
+            return False
+        return KeysetPagination().get_ordering(queryset, request, view) is not None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(queryset, request, view):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
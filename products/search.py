@@ -0,0 +1,86 @@
+import time
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, Q
+
+from .models import Product
+
+BACKFILL_CHUNK_SIZE = 2000
+# Weights of the full-text rank and of the trigram similarity in the rank of fuzzy results.
+FULL_TEXT_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.5
+
+
+def search_products(queryset, text):
+    """
+    Filters `queryset` to the products matching `text` and orders them by
+    relevance. The match is answered from the GIN index on search_vector,
+    and SearchRank weighs hits in ProductName above ProductDescription.
+    """
+    query = SearchQuery(text, search_type='websearch')
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', '-id')
+    )
+
+
+def is_fuzzy(params):
+    return str(params.get('fuzzy', '')).lower() in ('1', 'true', 'yes')
+
+
+def fuzzy_search_products(queryset, text):
+    """
+    Like search_products(), but also matches product names that are within
+    typing distance of `text`. A name matches when the trigram word
+    similarity of `text` to some part of it reaches
+    FUZZY_SEARCH_THRESHOLD (set on every connection, see signals.py), which
+    the pg_trgm GIN index on ProductName answers; the results are ordered
+    by the full-text rank and the similarity together.
+    """
+    query = SearchQuery(text, search_type='websearch')
+    return (
+        queryset.filter(Q(search_vector=query) | Q(ProductName__trigram_word_similar=text))
+        .annotate(
+            rank=FULL_TEXT_WEIGHT * SearchRank(F('search_vector'), query)
+            + TRIGRAM_WEIGHT * TrigramWordSimilarity(text, 'ProductName'),
+        )
+        .order_by('-rank', '-id')
+    )
+
+
+def set_trigram_threshold(connection):
+    """Applies FUZZY_SEARCH_THRESHOLD to the trigram operators of a new PostgreSQL connection."""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)", [str(settings.FUZZY_SEARCH_THRESHOLD)]
+        )
+
+
+def backfill_search_vectors(chunk_size=BACKFILL_CHUNK_SIZE, only_missing=True, progress=None):
+    """
+    Computes search_vector for the catalog in chunks of `chunk_size`
+    products, walking the primary key so every chunk is one short UPDATE
+    and the table is never locked as a whole. With `only_missing` the
+    products that already have a vector are skipped, so an interrupted run
+    can simply be started again. `progress` is called after every chunk
+    with the products done so far and the seconds the chunk took. Returns
+    the number of products updated.
+    """
+    products = Product.objects.order_by('pk')
+    if only_missing:
+        products = products.filter(search_vector__isnull=True)
+
+    done, last_pk = 0, 0
+    while True:
+        started = time.monotonic()
+        pks = list(products.filter(pk__gt=last_pk).values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return done
+        done += Product.objects.refresh_search_vectors(pks)
+        last_pk = pks[-1]
+        if progress:
+            progress(done, time.monotonic() - started)
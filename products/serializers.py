@@ -1,6 +1,8 @@
+from django.db import transaction
 from rest_framework import serializers
 from . models  import  *
 from rest_framework.exceptions import AuthenticationFailed
+from .cards import card_image_url
 
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -73,24 +75,25 @@ class ProductSerializer(serializers.ModelSerializer):
         uploaded_Sizes = validated_data.pop('uploaded_Sizes',[]) 
         
 
-    # Create the product instance
-        product = Product.objects.create(**validated_data)
+    # Create the product instance; atomically, so its card is built once the images exist
+        with transaction.atomic():
+            product = Product.objects.create(**validated_data)
 
-        ProImage.objects.bulk_create([
-            ProImage(product=product, image=image) for image in uploaded_images
-        ])
+            ProImage.objects.bulk_create([
+                ProImage(product=product, image=image) for image in uploaded_images
+            ])
 
-        # Create product colors
-        for color in uploaded_Colors:
-            colors = color.split(',')  # Split sizes by comma
-            for color in colors:
-                ProColors.objects.create(product=product, Color=color.strip())
+            # Create product colors
+            for color in uploaded_Colors:
+                colors = color.split(',')  # Split sizes by comma
+                for color in colors:
+                    ProColors.objects.create(product=product, Color=color.strip())
 
-        # Create product sizes
-        for size in uploaded_Sizes:
-            sizes = size.split(',')  # Split sizes by comma
-            for size in sizes:
-                ProSizes.objects.create(product=product, Size=size.strip())
+            # Create product sizes
+            for size in uploaded_Sizes:
+                sizes = size.split(',')  # Split sizes by comma
+                for size in sizes:
+                    ProSizes.objects.create(product=product, Size=size.strip())
 
         return product
 
@@ -100,19 +103,23 @@ class PostersSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 class TrendingProductSerializer(serializers.ModelSerializer):
-    images = ProductImageSerializer(many=True, read_only=True)
-    supplier_full_name = serializers.CharField(source='Supplier.user.get_full_name', read_only=True)
-    supplier_photo = serializers.ImageField(source='Supplier.SupplierPhoto', read_only=True)
+    """
+    A product in the followed-suppliers feed, read from its ProductCard.
+    """
+    id = serializers.IntegerField(source='product_id')
+    images = serializers.SerializerMethodField()
+    ProductName = serializers.CharField(source='name')
+    UnitPrice = serializers.DecimalField(source='price', max_digits=10, decimal_places=2)
+    supplier_full_name = serializers.CharField(source='supplier_name')
+    supplier_photo = serializers.CharField(source='supplier_photo_url')
 
     class Meta:
-        model = Product
+        model = ProductCard
         fields = ['id', 'images', 'ProductName', 'UnitPrice', 'supplier_full_name', 'supplier_photo']
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        if data['images']:
-            data['images'] = [data['images'][0]]  
-        return data
+    def get_images(self, card):
+        # Only the first image, shaped like ProductImageSerializer.
+        return [{'id': card.image_id, 'image': card.image_url}] if card.image else []
     
 class ProductAutocompleteSerializer(serializers.ModelSerializer):
     """
@@ -136,10 +143,7 @@ class ProductSearchSerializer(serializers.ModelSerializer):
         """
         Returns the URL of the first image of the product.
         """
-        first_image = obj.images.first()
-        if first_image and first_image.image:
-            return first_image.image.url
-        return None
+        return card_image_url(obj)
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -172,10 +176,7 @@ class CollectionProductSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'image', 'price']  
 
     def get_image(self, obj):
-        first_image = obj.images.first()
-        if first_image and first_image.image:
-            return first_image.image.url
-        return None
+        return card_image_url(obj)
     
 class CollectionSerializer(serializers.ModelSerializer):
     images = serializers.SerializerMethodField()  # For the first 4 images, if needed
@@ -194,10 +195,9 @@ class CollectionSerializer(serializers.ModelSerializer):
         first_items = obj.items.all()[:4]  
         image_urls = []
         for item in first_items:
-            if item.product and item.product.images.exists():
-                first_image = item.product.images.first()
-                if first_image.image:
-                    image_urls.append(first_image.image.url)
+            image_url = card_image_url(item.product) if item.product else None
+            if image_url:
+                image_urls.append(image_url)
         return image_urls if image_urls else None
 
     def to_representation(self, instance):
@@ -291,12 +291,10 @@ class LatestCollectionSerializer(serializers.ModelSerializer):
         fields = ['id', 'image', 'name', 'supplier_full_name', 'supplier_photo']
 
     def get_image(self, obj):
-        # Get the first image of the first product in the collection
-        first_item = obj.items.first()
-        if first_item and first_item.product.images.exists():
-            first_image = first_item.product.images.first()
-            if first_image.image:  # Ensure the image exists
-                return first_image.image.url  # Return the URL of the image
+        # Get the first image of the first product in the collection, from the prefetched items
+        items = obj.items.all()
+        if items:
+            return card_image_url(items[0].product)
         return None  # Return None if no image is available
     def get_supplier_full_name(self, obj):
         # Get the full name of the supplier who owns the collection
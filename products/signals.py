@@ -1,7 +1,18 @@
-from django.db.models.signals import post_save, post_delete
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
+from accounts.models import Supplier, User
+from Handcrafts.response_cache import invalidate_tags, response_cache
 from reviews.models import Review
-from .tasks import update_product_rating_task
+from .autocomplete import product_autocomplete
+from .cache_tags import (CATEGORIES_TAG, MATERIALS_TAG, PRODUCT_SCOPES, collections_tag,
+                         invalidate_products_on_commit)
+from .cards import refresh_product_cards
+from .models import Category, Collection, CollectionItem, MatCategory, ProColors, ProImage, Product, ProSizes
+from .search import set_trigram_threshold
+from .tasks import refresh_supplier_cards_task, update_product_rating_task
 
 
 @receiver(post_save, sender=Review)
@@ -15,4 +26,122 @@ def update_product_rating_on_save(sender, instance, **kwargs):
 def update_product_rating_on_delete(sender, instance, **kwargs):
     if instance.product:
         # ✨ Offload rating calculation to Celery
-        update_product_rating_task.delay(instance.product.id)
\ No newline at end of file
+        update_product_rating_task.delay(instance.product.id)
+
+
+@receiver(connection_created)
+def apply_fuzzy_search_threshold(sender, connection, **kwargs):
+    set_trigram_threshold(connection)
+
+
+@receiver(request_started)
+def warm_autocomplete_index(sender, **kwargs):
+    # Builds the suggestion index in the background on a worker's first request; a no-op afterwards.
+    product_autocomplete.warm()
+
+
+@receiver(post_save, sender=Product)
+def update_autocomplete_on_product_save(sender, instance, **kwargs):
+    transaction.on_commit(lambda: product_autocomplete.product_saved(instance))
+
+
+@receiver(post_delete, sender=Product)
+def update_autocomplete_on_product_delete(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: product_autocomplete.product_deleted(pk))
+
+
+@receiver(post_save, sender=Category)
+def update_autocomplete_on_category_save(sender, instance, **kwargs):
+    transaction.on_commit(lambda: product_autocomplete.category_saved(instance))
+
+
+@receiver(post_delete, sender=Category)
+def update_autocomplete_on_category_delete(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: product_autocomplete.category_deleted(pk))
+
+
+@receiver(post_save, sender=Product)
+def refresh_card_on_product_save(sender, instance, **kwargs):
+    transaction.on_commit(lambda: refresh_product_cards([instance.pk]))
+
+
+@receiver(post_save, sender=ProImage)
+@receiver(post_delete, sender=ProImage)
+def refresh_card_on_image_change(sender, instance, **kwargs):
+    product_id = instance.product_id
+    transaction.on_commit(lambda: refresh_product_cards([product_id]))
+
+
+@receiver(post_save, sender=Supplier)
+def refresh_cards_on_supplier_save(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: refresh_supplier_cards_task.delay(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def refresh_cards_on_supplier_rename(sender, instance, created, update_fields=None, **kwargs):
+    # Cards show the supplier's name; logins and other saves that leave it alone are skipped.
+    if created or (update_fields is not None and not {'first_name', 'last_name'} & set(update_fields)):
+        return
+    if not instance.is_supplier:
+        return
+    supplier_id = Supplier.objects.filter(user_id=instance.pk).values_list('id', flat=True).first()
+    if supplier_id is not None:
+        transaction.on_commit(lambda: refresh_supplier_cards_task.delay(supplier_id))
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_listings(sender, instance, **kwargs):
+    # The category, material and supplier the product is listed under until this save.
+    instance._previous_scope = (
+        list(Product.objects.filter(pk=instance.pk).values_list(*PRODUCT_SCOPES)) if instance.pk else []
+    )
+
+
+@receiver(post_save, sender=Product)
+def invalidate_listings_on_product_save(sender, instance, **kwargs):
+    invalidate_products_on_commit([instance.pk], getattr(instance, '_previous_scope', ()))
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_listings_on_product_delete(sender, instance, **kwargs):
+    invalidate_products_on_commit([], [(instance.Category_id, instance.MatCategory_id, instance.Supplier_id)])
+
+
+@receiver(post_save, sender=ProImage)
+@receiver(post_delete, sender=ProImage)
+@receiver(post_save, sender=ProColors)
+@receiver(post_delete, sender=ProColors)
+@receiver(post_save, sender=ProSizes)
+@receiver(post_delete, sender=ProSizes)
+def invalidate_listings_on_product_detail_change(sender, instance, **kwargs):
+    invalidate_products_on_commit([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_listings(sender, instance, **kwargs):
+    transaction.on_commit(lambda: response_cache.invalidate(CATEGORIES_TAG))
+
+
+@receiver(post_save, sender=MatCategory)
+@receiver(post_delete, sender=MatCategory)
+def invalidate_material_listings(sender, instance, **kwargs):
+    transaction.on_commit(lambda: response_cache.invalidate(MATERIALS_TAG))
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+def invalidate_collection_fragments(sender, instance, **kwargs):
+    tag = collections_tag(instance.supplier_id)
+    transaction.on_commit(lambda: invalidate_tags(tag))
+
+
+@receiver(post_save, sender=CollectionItem)
+@receiver(post_delete, sender=CollectionItem)
+def invalidate_collection_fragments_on_item_change(sender, instance, **kwargs):
+    supplier_id = Collection.objects.filter(pk=instance.collection_id).values_list('supplier_id', flat=True).first()
+    if supplier_id is not None:
+        transaction.on_commit(lambda: invalidate_tags(collections_tag(supplier_id)))
@@ -67,4 +67,18 @@ def update_product_rating_task(product_id):
         product = Product.objects.get(id=product_id)
         product.update_rating()
     except Product.DoesNotExist:
-        pass
\ No newline at end of file
+        pass
+
+
+@shared_task
+def refresh_supplier_cards_task(supplier_id):
+    """
+    Recomputes the product cards of a supplier whose name or photo changed,
+    then drops the cached fragments built from the old cards.
+    """
+    from Handcrafts.response_cache import invalidate_tags
+    from .cache_tags import products_tag
+    from .cards import refresh_supplier_cards
+
+    refresh_supplier_cards(supplier_id)
+    invalidate_tags(products_tag('supplier', supplier_id))
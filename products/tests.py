@@ -1,3 +1,86 @@
-from django.test import TestCase
+from decimal import Decimal
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import Supplier, User
+
+from .models import Category, Product
+from .pagination import CatalogPagination, KeysetPagination
+
+TEST_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+TEST_CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+class CatalogView:
+    keyset_orderings = ('UnitPrice', 'Rating', 'Publish_Date')
+    keyset_default_ordering = '-Publish_Date'
+
+
+@override_settings(CACHES=TEST_CACHES, CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        user = User.objects.create(email='supplier@example.com', first_name='Test', last_name='User',
+                                   password='x', is_supplier=True)
+        supplier = Supplier.objects.create(user=user, CategoryTitle='Pottery')
+        category = Category.objects.create(Title='Pottery')
+        # Three products share each price, so pages have to break ties on the id.
+        for index in range(12):
+            Product.objects.create(
+                ProductName=f'Clay pot {index}', ProductDescription='Handmade pottery', Supplier=supplier,
+                Category=category, QuantityPerUnit='1', UnitPrice=Decimal('10.00') + index // 3,
+                UnitWeight=Decimal('1'), Stock=10,
+            )
+
+    def paginate(self, url, pagination=None):
+        pagination = pagination or KeysetPagination()
+        request = Request(self.factory.get(url))
+        page = pagination.paginate_queryset(Product.objects.order_by('-Publish_Date'), request, CatalogView())
+        return [product.pk for product in page], pagination
+
+    def follow(self, link):
+        url = urlparse(link)
+        return f'{url.path}?{url.query}'
+
+    def test_pages_cover_every_row_once_in_order(self):
+        expected = list(Product.objects.order_by('UnitPrice', 'pk').values_list('pk', flat=True))
+        seen, url = [], '/products/?ordering=UnitPrice&page_size=5'
+        while url:
+            page, pagination = self.paginate(url)
+            seen.extend(page)
+            link = pagination.get_next_link()
+            url = link and self.follow(link)
+        self.assertEqual(seen, expected)
+
+    def test_descending_pages_and_previous_link(self):
+        expected = list(Product.objects.order_by('-UnitPrice', '-pk').values_list('pk', flat=True))
+        first, pagination = self.paginate('/products/?ordering=-UnitPrice&page_size=5')
+        second, pagination = self.paginate(self.follow(pagination.get_next_link()))
+        self.assertEqual(first + second, expected[:10])
+
+        back, pagination = self.paginate(self.follow(pagination.get_previous_link()))
+        self.assertEqual(back, first)
+        self.assertIsNone(pagination.get_previous_link())
+
+    def test_invalid_cursor_is_not_found(self):
+        with self.assertRaises(NotFound):
+            self.paginate('/products/?cursor=not-a-cursor')
+
+    def test_catalog_keeps_page_numbers_without_a_cursor(self):
+        pagination = CatalogPagination()
+        page, pagination = self.paginate('/products/?page=2', pagination)
+        self.assertIsNone(pagination.keyset)
+        self.assertEqual(pagination.page.paginator.count, 12)
+        self.assertEqual(len(page), 2)
+
+    def test_catalog_switches_to_keyset_pages_with_a_cursor(self):
+        page, pagination = self.paginate('/products/?cursor=&page_size=4', CatalogPagination())
+        self.assertIsNotNone(pagination.keyset)
+        cursor = parse_qs(urlparse(pagination.keyset.get_next_link()).query)['cursor'][0]
+        self.assertEqual(len(page), 4)
+        self.assertTrue(cursor)
@@ -1,51 +1,48 @@
-from django.contrib.contenttypes.models import ContentType
 from django_filters.rest_framework import DjangoFilterBackend
-from django.contrib.postgres.search import SearchVector
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.generics import ListAPIView
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.views import APIView
 
-from accounts.models import Follow
+from accounts.fragments import followed_supplier_ids, follower_of
 from accounts.serializers import AccountProductSerializer
-from .filters import ProductFilter
+from Handcrafts.response_cache import response_cache
+from .autocomplete import CATEGORY, PRODUCT, Suggestion, product_autocomplete
+from .cache_tags import CATEGORIES_TAG, MATERIALS_TAG, catalog_tags, category_products_tags
+from .facets import product_facets, wants_facets
+from .filters import ProductFilter, ProductSearchFilter
+from .fragments import latest_supplier_collections, latest_supplier_products, newest
 from .models import Category, Collection, MatCategory, Posters, Product
+from .pagination import CatalogPagination
 from .permissions import (IsSupplier, SupplierContractProvided,
                           SupplierHasAddress)
+from .search import search_products
 from .serializers import (CategorySerializer, CollectionCreateUpdateSerializer,
-                          CollectionSerializer, LatestCollectionSerializer,
-                          MatCategorySerializer, PostersSerializer,
-                          ProductSerializer, TrendingProductSerializer,
-                          ProductAutocompleteSerializer,ProductSearchSerializer)
+                          CollectionSerializer, MatCategorySerializer,
+                          PostersSerializer, ProductSerializer,
+                          ProductSearchSerializer)
 from .tasks import (send_back_in_stock_notifications_task,
                     send_product_creation_notifications_task)
 
 
 class Categories(APIView):
-    @method_decorator(cache_page(60 * 60 * 24)) # Cache for 24 hours
+    @response_cache.page([CATEGORIES_TAG])
     def get(self, request):
         categories = Category.objects.all()
         serializer = CategorySerializer(categories, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
-
 class ProductsByCategory(ListAPIView):
     serializer_class = ProductSerializer
-    pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, SearchFilter]
-    search_fields = ['ProductName', 'Description']
+    pagination_class = CatalogPagination
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
+    search_fields = ['ProductName', 'ProductDescription']
+    keyset_orderings = ('UnitPrice', 'Rating', 'Publish_Date')
+    keyset_default_ordering = '-Publish_Date'
 
     def get_queryset(self):
         slug = self.kwargs.get("Slug")
@@ -55,18 +52,20 @@ class ProductsByCategory(ListAPIView):
         except Category.DoesNotExist:
             return Product.objects.none()
         
-    @method_decorator(cache_page(60 * 15)) 
+    @response_cache.page(category_products_tags)
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
 
 class ProductsViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.filter(Stock__gt=0).select_related('Supplier', 'Category').prefetch_related('images')
+    queryset = Product.objects.filter(Stock__gt=0).select_related('Supplier', 'Category', 'card').prefetch_related('images', 'Colors', 'Sizes')
     serializer_class = ProductSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_class = ProductFilter
-    ordering_fields = ['UnitPrice']
-    pagination_class = StandardResultsSetPagination
+    ordering_fields = ['UnitPrice', 'Rating', 'Publish_Date']
+    pagination_class = CatalogPagination
+    keyset_orderings = ('UnitPrice', 'Rating', 'Publish_Date')
+    keyset_default_ordering = '-Publish_Date'
 
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -82,9 +81,13 @@ class ProductsViewSet(viewsets.ModelViewSet):
             return ProductSerializer
         return self.serializer_class
     
-    @method_decorator(cache_page(60 * 15)) 
+    @response_cache.page(catalog_tags)
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        response = super().list(request, *args, **kwargs)
+        # ?facets=1 adds the counts per Category, MatCategory, price and rating bucket of all matching products.
+        if wants_facets(request.query_params):
+            response.data['facets'] = product_facets(self.filter_queryset(self.get_queryset()))
+        return response
     
     @action(detail=False, methods=['get'])
     def suggestions(self, request):
@@ -92,12 +95,18 @@ class ProductsViewSet(viewsets.ModelViewSet):
         if len(query) < 3:
             return Response([])
 
-        products = Product.objects.annotate(
-            search=SearchVector('ProductName', 'ProductDescription'),
-        ).filter(search=query)[:10]
-        
-        serializer = ProductAutocompleteSerializer(products, many=True)
-        return Response(serializer.data)
+        suggestions = product_autocomplete.suggest(query)
+        if suggestions is None:
+            # The index of this worker is still being built.
+            products = search_products(Product.objects.only('id', 'ProductName'), query)[:10]
+            suggestions = [Suggestion(PRODUCT, product.id, product.ProductName, None) for product in products]
+
+        return Response([
+            {'kind': PRODUCT, 'id': suggestion.pk, 'ProductName': suggestion.text}
+            if suggestion.kind == PRODUCT else
+            {'kind': CATEGORY, 'CategoryID': suggestion.pk, 'Title': suggestion.text, 'Slug': suggestion.slug}
+            for suggestion in suggestions
+        ])
     
     def perform_create(self, serializer):
         if not self.request.user.is_supplier:
@@ -140,32 +149,22 @@ class SupplierProductsViewSet(viewsets.ModelViewSet):
 
 
 class FollowedSuppliersProducts(APIView):
-    @method_decorator(cache_page(60 * 15))
     def get(self, request):
         if not request.user.is_authenticated:
             return Response({"error": "Not authorized"}, status=status.HTTP_401_UNAUTHORIZED)
 
-        follower_instance = None
-        if hasattr(request.user, 'customer'):
-            follower_instance = request.user.customer
-        elif hasattr(request.user, 'supplier'):
-            follower_instance = request.user.supplier
-        else:
+        follower_instance = follower_of(request.user)
+        if follower_instance is None:
             return Response({"error": "User must be a customer or supplier"}, status=status.HTTP_400_BAD_REQUEST)
 
-        follower_content_type = ContentType.objects.get_for_model(follower_instance)
-        followed_suppliers = Follow.objects.filter(
-            follower_content_type=follower_content_type,
-            follower_object_id=follower_instance.id
-        ).values_list('supplier', flat=True)
-
-        products = Product.objects.filter(Supplier__in=followed_suppliers).order_by('-Publish_Date')[:10]
-        serializer = TrendingProductSerializer(products, many=True)
-        return Response(serializer.data)
+        # The user's followed suppliers are their own cached overlay; each supplier's newest
+        # products are a fragment shared by all of its followers.
+        followed_suppliers = followed_supplier_ids(follower_instance)
+        return Response(newest(latest_supplier_products(followed_suppliers)))
 
 
 class Mataterials(APIView):
-    @method_decorator(cache_page(60 * 60 * 24)) # Cache for 24 hours
+    @response_cache.page([MATERIALS_TAG])
     def get(self, request):
         materials = MatCategory.objects.all()
         serializer = MatCategorySerializer(materials, many=True)
@@ -174,10 +173,12 @@ class Mataterials(APIView):
 
 class ProductsByMaterials(ListAPIView):
     serializer_class = AccountProductSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = CatalogPagination
     filter_backends = [DjangoFilterBackend, SearchFilter]
     search_fields = ['ProductName', 'ProductDescription']
     ordering_fields = ['UnitPrice']
+    keyset_orderings = ('UnitPrice', 'Rating', 'Publish_Date')
+    keyset_default_ordering = '-Publish_Date'
 
     def get_queryset(self):
         slug = self.kwargs.get("Slug")
@@ -197,7 +198,7 @@ class PostersListAPIView(generics.ListAPIView):
 
 
 class CollectionViewSet(viewsets.ModelViewSet):
-    queryset = Collection.objects.all()
+    queryset = Collection.objects.prefetch_related('items__product__card')
     permission_classes = [IsSupplier]
 
     def get_serializer_class(self):
@@ -228,7 +229,7 @@ class CollectionViewSet(viewsets.ModelViewSet):
 class CollectionDetailView(APIView):
     def get(self, request, collection_id):
         try:
-            collection = Collection.objects.prefetch_related('items__product').get(id=collection_id)
+            collection = Collection.objects.prefetch_related('items__product__card').get(id=collection_id)
             serializer = CollectionSerializer(collection, context={'request': request, 'view': self})
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Collection.DoesNotExist:
@@ -238,28 +239,13 @@ class CollectionDetailView(APIView):
 
 
 class LatestFollowedSuppliersCollections(APIView):
-    @method_decorator(cache_page(60 * 30))
     def get(self, request):
         if not request.user.is_authenticated:
             return Response({"error": "Not authorized"}, status=status.HTTP_401_UNAUTHORIZED)
         
-        follower_instance = None
-        if hasattr(request.user, 'customer'):
-            follower_instance = request.user.customer
-        elif hasattr(request.user, 'supplier'):
-            follower_instance = request.user.supplier
-        else:
+        follower_instance = follower_of(request.user)
+        if follower_instance is None:
             return Response({"error": "User must be a customer or supplier"}, status=status.HTTP_400_BAD_REQUEST)
         
-        follower_content_type = ContentType.objects.get_for_model(follower_instance)
-        followed_supplier_ids = Follow.objects.filter(
-            follower_content_type=follower_content_type,
-            follower_object_id=follower_instance.id
-        ).values_list('supplier_id', flat=True)
-
-        collections = Collection.objects.filter(
-            supplier__id__in=followed_supplier_ids
-        ).order_by('-created_at')[:10]
-
-        serializer = LatestCollectionSerializer(collections, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        followed_suppliers = followed_supplier_ids(follower_instance)
+        return Response(newest(latest_supplier_collections(followed_suppliers)), status=status.HTTP_200_OK)
\ No newline at end of file
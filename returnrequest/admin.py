@@ -3,7 +3,7 @@ from django.contrib import admin, messages
 from django.shortcuts import render
 from django.utils.html import format_html
 
-from .models import BalanceWithdrawRequest, ReturnRequest, Transaction
+from .models import BalanceWithdrawRequest, JournalEntry, ReturnRequest, Transaction
 from .services import BalanceService
 
 @admin.register(ReturnRequest)
@@ -108,6 +108,21 @@ class TransactionAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'transaction_type', 'amount', 'created_at', 'related_object')
     list_filter = ('transaction_type', 'created_at')
     search_fields = ('user__username',)
-    readonly_fields = ('id', 'created_at')
+    readonly_fields = ('id', 'entry', 'created_at')
     autocomplete_fields = ['user']
-    date_hierarchy = 'created_at'
\ No newline at end of file
+    date_hierarchy = 'created_at'
+
+class JournalEntryTransactionInline(admin.TabularInline):
+    model = Transaction
+    fields = ('user', 'transaction_type', 'amount')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+@admin.register(JournalEntry)
+class JournalEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'memo', 'created_at')
+    search_fields = ('memo',)
+    readonly_fields = ('id', 'memo', 'created_at')
+    date_hierarchy = 'created_at'
+    inlines = [JournalEntryTransactionInline]
@@ -0,0 +1,263 @@
+import random
+from collections import defaultdict, namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import F, Sum
+
+from accounts.models import User
+
+from .models import JournalEntry, Transaction
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+# One side of a journal entry. A guarded debit must be covered by the balance the
+# account had before the posting.
+Leg = namedtuple('Leg', ['user_id', 'transaction_type', 'amount', 'guard'], defaults=(False,))
+
+# A journal entry waiting to be posted.
+Posting = namedtuple('Posting', ['legs', 'memo', 'related_object'], defaults=('', None))
+
+
+class InsufficientBalance(Exception):
+    def __init__(self, user_id):
+        super().__init__(f"Insufficient balance on account {user_id}.")
+        self.user_id = user_id
+
+
+_shard_ids = {}
+
+
+def _system_account(email, first_name, last_name):
+    account, _ = User.objects.get_or_create(
+        email__iexact=email,
+        defaults={
+            'email': email.lower(),
+            'first_name': first_name,
+            'last_name': last_name,
+            'password': make_password(None),
+            'is_active': False,
+        },
+    )
+    return account
+
+
+def _shard_email(email, index):
+    local, _, domain = email.lower().partition('@')
+    return f"{local}+shard{index}@{domain}"
+
+
+def shard_account_ids(email):
+    """
+    Ids of the sub-accounts of a system account, created on first use.
+
+    Postings spread over the shards so that no single row serializes them;
+    roll_up() later folds the shards into the headline account.
+    """
+    ids = _shard_ids.get(email)
+    if ids is None:
+        emails = [_shard_email(email, index) for index in range(settings.LEDGER_ACCOUNT_SHARDS)]
+        existing = dict(User.objects.filter(email__in=emails).values_list('email', 'id'))
+        ids = [
+            existing.get(shard_email) or _system_account(shard_email, 'Ledger', f'Shard {index}').id
+            for index, shard_email in enumerate(emails)
+        ]
+        _shard_ids[email] = ids
+    return ids
+
+
+def platform_account_id():
+    """A shard of the platform account, the one that collects Craft's cut."""
+    return random.choice(shard_account_ids(settings.PLATFORM_ACCOUNT_EMAIL))
+
+
+def clearing_account_id():
+    """
+    A shard of the clearing account, which stands for money outside the
+    wallets (card payments, cash on delivery, bank payouts).
+    """
+    return random.choice(shard_account_ids(settings.LEDGER_CLEARING_ACCOUNT_EMAIL))
+
+
+def get_balance(user_id):
+    """Reads the materialized balance of an account, a single primary key lookup."""
+    return User.objects.filter(pk=user_id).values_list('Balance', flat=True).first()
+
+
+def post(legs, memo='', related_object=None):
+    """Posts a single journal entry and returns its transactions, in leg order."""
+    return post_many([Posting(legs, memo, related_object)])
+
+
+@transaction.atomic
+def post_many(postings):
+    """
+    Posts journal entries in bulk.
+
+    Amounts are rounded to cents and whatever an entry leaves unbalanced is
+    booked against one clearing shard per call. Every account then moves by
+    its net delta (see _apply_deltas), and the entries and their transactions
+    are written with one bulk insert each.
+    """
+    entries = []
+    transactions = []
+    deltas = defaultdict(Decimal)
+    required = defaultdict(Decimal)
+    clearing_id = None
+
+    for posting in postings:
+        legs = [
+            leg._replace(amount=Decimal(leg.amount).quantize(CENT, rounding=ROUND_HALF_UP))
+            for leg in posting.legs
+        ]
+        legs = [leg for leg in legs if leg.amount]
+        if not legs:
+            continue
+
+        imbalance = sum(leg.amount for leg in legs)
+        if imbalance:
+            clearing_id = clearing_id or clearing_account_id()
+            legs.append(Leg(clearing_id, legs[0].transaction_type, -imbalance))
+
+        content_type = object_id = None
+        if posting.related_object is not None:
+            content_type = ContentType.objects.get_for_model(posting.related_object)
+            object_id = posting.related_object.pk
+
+        entry = JournalEntry(memo=posting.memo)
+        entries.append(entry)
+        for leg in legs:
+            transactions.append(Transaction(
+                entry=entry,
+                user_id=leg.user_id,
+                transaction_type=leg.transaction_type,
+                amount=leg.amount,
+                content_type=content_type,
+                object_id=object_id,
+            ))
+            deltas[leg.user_id] += leg.amount
+            if leg.guard and leg.amount < 0:
+                required[leg.user_id] -= leg.amount
+
+    _apply_deltas(deltas, required)
+
+    JournalEntry.objects.bulk_create(entries)
+    return Transaction.objects.bulk_create(transactions)
+
+
+def _apply_deltas(deltas, required):
+    """
+    Moves every account by its delta with ``UPDATE ... SET Balance = Balance + delta``,
+    taken in id order so that concurrent postings lock rows in the same order.
+
+    On Postgres the accounts are first locked in id order with one SELECT, then
+    the unguarded ones move together in a single UPDATE joined to a VALUES
+    list, so a posting of thousands of entries costs a fixed number of
+    statements. Guarded accounts keep their own conditional UPDATE.
+    """
+    user_ids = sorted(user_id for user_id in deltas if deltas[user_id] or required.get(user_id))
+    if connection.vendor != 'postgresql' or len(user_ids) < 2:
+        for user_id in user_ids:
+            _apply_delta(user_id, deltas[user_id], required.get(user_id))
+        return
+
+    list(User.objects.select_for_update().filter(pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+
+    plain = [(user_id, deltas[user_id]) for user_id in user_ids if not required.get(user_id)]
+    if plain:
+        qn = connection.ops.quote_name
+        table = qn(User._meta.db_table)
+        balance = qn(User._meta.get_field('Balance').column)
+        pk = qn(User._meta.pk.column)
+        values = ', '.join(['(%s::bigint, %s::numeric)'] * len(plain))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} AS u SET {balance} = u.{balance} + v.delta "
+                f"FROM (VALUES {values}) AS v(id, delta) WHERE u.{pk} = v.id",
+                [value for row in plain for value in row],
+            )
+
+    for user_id in user_ids:
+        if required.get(user_id):
+            _apply_delta(user_id, deltas[user_id], required[user_id])
+
+
+def _apply_delta(user_id, delta, required=None):
+    if not delta and not required:
+        return
+    accounts = User.objects.filter(pk=user_id)
+    if required:
+        accounts = accounts.filter(Balance__gte=required)
+    if not accounts.update(Balance=F('Balance') + delta) and required:
+        raise InsufficientBalance(user_id)
+
+
+def roll_up(email):
+    """
+    Folds the balances of a system account's shards into its headline account
+    with a single journal entry. This is the only posting that locks the
+    headline row. Shards are found by address, so ones left over from a
+    larger LEDGER_ACCOUNT_SHARDS are folded too.
+    """
+    local, _, domain = email.lower().partition('@')
+    shards = (
+        User.objects.filter(email__startswith=f"{local}+shard", email__endswith=f"@{domain}")
+        .exclude(Balance=0)
+        .values_list('id', 'Balance')
+    )
+    legs = [Leg(user_id, Transaction.TransactionType.LEDGER_ROLLUP, -balance) for user_id, balance in shards]
+    if not legs:
+        return []
+
+    headline = _system_account(email, 'Ledger', 'Account')
+    # Only what was read is moved; postings that land on a shard meanwhile stay for the next run.
+    legs.append(Leg(headline.id, Transaction.TransactionType.LEDGER_ROLLUP, -sum(leg.amount for leg in legs)))
+    return post(legs, memo=f"Roll-up of {email.lower()} shards")
+
+
+def iter_balance_mismatches(chunk_size=10000):
+    """
+    Yields (user_id, balance, ledger_total) for every account whose Balance is
+    not the sum of its transactions.
+
+    The per-account sums are aggregated by the database and both sides are
+    streamed in user id order and merged, so memory stays flat at any size.
+    """
+    totals = (
+        Transaction.objects.values('user_id')
+        .annotate(total=Sum('amount'))
+        .order_by('user_id')
+        .values_list('user_id', 'total')
+        .iterator(chunk_size=chunk_size)
+    )
+    balances = User.objects.order_by('id').values_list('id', 'Balance').iterator(chunk_size=chunk_size)
+
+    current = next(totals, None)
+    for user_id, balance in balances:
+        while current is not None and current[0] < user_id:
+            current = next(totals, None)
+
+        total = ZERO
+        if current is not None and current[0] == user_id:
+            total = current[1]
+            current = next(totals, None)
+
+        if balance != total:
+            yield user_id, balance, total
+
+
+def iter_unbalanced_entries(chunk_size=10000):
+    """Yields (entry_id, total) for every journal entry whose transactions do not sum to zero."""
+    return (
+        Transaction.objects.filter(entry__isnull=False)
+        .values('entry_id')
+        .annotate(total=Sum('amount'))
+        .exclude(total=0)
+        .order_by()
+        .values_list('entry_id', 'total')
+        .iterator(chunk_size=chunk_size)
+    )
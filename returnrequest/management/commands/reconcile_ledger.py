@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+
+from accounts.models import User
+from returnrequest.ledger import iter_balance_mismatches, iter_unbalanced_entries
+
+
+class Command(BaseCommand):
+    help = "Checks that every User.Balance equals the sum of its transactions and that every journal entry balances."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Rows fetched per round trip.")
+        parser.add_argument('--fix', action='store_true', help="Move mismatched balances to their ledger totals.")
+        parser.add_argument('--limit', type=int, default=20, help="Mismatches to print.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        mismatches = []
+        unbalanced = 0
+
+        # Read both sides from one snapshot so postings made meanwhile do not show up as drift.
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+
+            for user_id, balance, total in iter_balance_mismatches(chunk_size):
+                if len(mismatches) < options['limit']:
+                    self.stdout.write(self.style.WARNING(f"User {user_id}: balance {balance}, ledger {total}"))
+                mismatches.append((user_id, total - balance))
+
+            for entry_id, total in iter_unbalanced_entries(chunk_size):
+                unbalanced += 1
+                if unbalanced <= options['limit']:
+                    self.stdout.write(self.style.ERROR(f"Journal entry {entry_id} is off by {total}"))
+
+        if not mismatches and not unbalanced:
+            self.stdout.write(self.style.SUCCESS("Ledger is consistent."))
+            return
+
+        self.stdout.write(f"{len(mismatches)} account(s) out of balance, {unbalanced} unbalanced journal entries.")
+
+        if options['fix'] and mismatches:
+            # Apply the difference as a delta so postings made since the snapshot are kept.
+            for start in range(0, len(mismatches), chunk_size):
+                with transaction.atomic():
+                    for user_id, difference in mismatches[start:start + chunk_size]:
+                        User.objects.filter(pk=user_id).update(Balance=F('Balance') + difference)
+            self.stdout.write(self.style.SUCCESS(f"Corrected {len(mismatches)} balance(s)."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('returnrequest', '0014_journalentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('WITHDRAWAL_REQUEST', 'Withdrawal Request'), ('WITHDRAWAL_COMPLETED', 'Withdrawal Completed'), ('WITHDRAWAL_CANCELLED', 'Withdrawal Cancelled'), ('RETURN_CREDIT', 'Return Credit'), ('RETURN_DEBIT', 'Return Debit'), ('CASH_BACK', 'Cash Back'), ('RETURNED_CASH_BACK', 'Returned Cash Back'), ('RETURNED_PRODUCT', 'Returned Product'), ('PURCHASED_PRODUCTS', 'Purchased Products'), ('DELIVERY_FEE', 'Delivery Fee'), ('SUPPLIER_TRANSFORM', 'Supplier Transform'), ('REFUND_FAILED', 'Refund Failed'), ('PURCHASED_COURSE', 'Purchased Course'), ('LEDGER_ROLLUP', 'Ledger Roll-up')], max_length=50),
+        ),
+    ]
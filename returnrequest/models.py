@@ -69,6 +69,19 @@ class ReturnRequest(models.Model):
         self.status = self.ReturnStatus.CANCELLED
         self.save()
 
+class JournalEntry(models.Model):
+    """A balanced posting: the amounts of its transactions sum to zero."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    memo = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = "Journal Entries"
+
+    def __str__(self):
+        return self.memo or str(self.id)
+
 class Transaction(models.Model):
     class TransactionType(models.TextChoices):
         
@@ -85,10 +98,12 @@ class Transaction(models.Model):
         SUPPLIER_TRANSFORM = 'SUPPLIER_TRANSFORM', _('Supplier Transform')
         REFUND_FAILED = 'REFUND_FAILED', _('Refund Failed')
         PURCHASED_COURSE = 'PURCHASED_COURSE', _('Purchased Course')
+        LEDGER_ROLLUP = 'LEDGER_ROLLUP', _('Ledger Roll-up')
 
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transactions')
+    entry = models.ForeignKey(JournalEntry, on_delete=models.PROTECT, null=True, blank=True, related_name='transactions')
     transaction_type = models.CharField(max_length=50, choices=TransactionType.choices)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -5,10 +5,12 @@ from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from accounts.models import Address, User
+from orders.dispatch import dispatch_board
 from orders.models import Shipment, ShipmentItem, Order, Product
 from orders.services import get_warehouse_by_name
 from notifications.services import create_notification_for_user
 
+from . import ledger
 from .models import BalanceWithdrawRequest, ReturnRequest, Transaction
 
 
@@ -113,21 +115,12 @@ class ReturnRequestService:
         customer = return_request.user
         supplier_user = return_request.supplier.user
 
-        customer.Balance += return_amount
-        supplier_user.Balance -= return_amount
-        customer.save(update_fields=["Balance"])
-        supplier_user.save(update_fields=["Balance"])
-
-        Transaction.objects.create(
-            user=customer,
-            transaction_type=Transaction.TransactionType.RETURN_CREDIT,
-            amount=return_amount,
-            related_object=return_request,
-        )
-        Transaction.objects.create(
-            user=supplier_user,
-            transaction_type=Transaction.TransactionType.RETURN_DEBIT,
-            amount=-return_amount,
+        ledger.post(
+            [
+                ledger.Leg(customer.id, Transaction.TransactionType.RETURN_CREDIT, return_amount),
+                ledger.Leg(supplier_user.id, Transaction.TransactionType.RETURN_DEBIT, -return_amount),
+            ],
+            memo=f"Refund of return request {return_request.id}",
             related_object=return_request,
         )
 
@@ -181,6 +174,7 @@ class ReturnRequestService:
                         f"Cannot cancel. A shipment for this return is already in progress (status: {shipment.get_status_display()})."
                     )
             shipments.update(status=Shipment.ShipmentStatus.CANCELLED)
+            transaction.on_commit(lambda: dispatch_board.sync(return_request.shipments.all()))
             return_request.cancel()
         
         create_notification_for_user(
@@ -215,20 +209,16 @@ class BalanceService:
         user_id, amount: Decimal, transfer_number: str, transfer_type: str, notes: str = None
     ) -> BalanceWithdrawRequest:
         user = get_object_or_404(User, id=user_id)
-        if user.Balance < amount:
-            raise ValidationError("Insufficient balance for this withdrawal.")
-
         if amount <= 0:
             raise ValidationError("Withdrawal amount must be positive.")
 
-        user.Balance -= amount
-        user.save(update_fields=["Balance"])
-
-        transaction_log = Transaction.objects.create(
-            user=user,
-            transaction_type=Transaction.TransactionType.WITHDRAWAL_REQUEST,
-            amount=-amount,
-        )
+        try:
+            transaction_log = ledger.post(
+                [ledger.Leg(user.id, Transaction.TransactionType.WITHDRAWAL_REQUEST, -amount, guard=True)],
+                memo=f"Withdrawal request of {user.email}",
+            )[0]
+        except ledger.InsufficientBalance:
+            raise ValidationError("Insufficient balance for this withdrawal.")
 
         withdrawal_request = BalanceWithdrawRequest.objects.create(
             user=user,
@@ -290,14 +280,9 @@ class BalanceService:
         )
 
         if original_status == BalanceWithdrawRequest.TransferStatus.AWAITING_APPROVAL:
-            user = request.user
-            user.Balance += request.amount
-            user.save(update_fields=["Balance"])
-
-            Transaction.objects.create(
-                user=user,
-                transaction_type=Transaction.TransactionType.WITHDRAWAL_CANCELLED,
-                amount=request.amount,
+            ledger.post(
+                [ledger.Leg(request.user_id, Transaction.TransactionType.WITHDRAWAL_CANCELLED, request.amount)],
+                memo=f"Rejected withdrawal {request.id}",
                 related_object=request,
             )
 
@@ -315,12 +300,12 @@ class BalanceService:
         request.transfer_status = BalanceWithdrawRequest.TransferStatus.COMPLETED
         request.save()
 
-        Transaction.objects.create(
-            user=request.user,
-            transaction_type=Transaction.TransactionType.WITHDRAWAL_COMPLETED,
-            amount=-request.amount,
-            related_object=request,
-        )
+        # The balance already left with the withdrawal request; completing it
+        # only relabels that debit instead of charging the amount a second time.
+        if request.related_transaction_id:
+            Transaction.objects.filter(pk=request.related_transaction_id).update(
+                transaction_type=Transaction.TransactionType.WITHDRAWAL_COMPLETED
+            )
 
         create_notification_for_user(
             user=request.user,
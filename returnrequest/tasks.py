@@ -1,4 +1,6 @@
 from celery import shared_task
+from django.conf import settings
+from . import ledger
 from .services import ReturnRequestService, BalanceService
 from .models import ReturnRequest, BalanceWithdrawRequest
 from django.core.exceptions import ValidationError
@@ -101,4 +103,16 @@ def reject_withdrawal_task(request_id, admin_user_id, admin_notes):
     except BalanceWithdrawRequest.DoesNotExist:
         print(f"BalanceWithdrawRequest with id {request_id} not found.")
     except ValidationError as e:
-        print(f"Validation error in reject_withdrawal_task: {e}")
\ No newline at end of file
+        print(f"Validation error in reject_withdrawal_task: {e}")
+
+
+@shared_task
+def roll_up_ledger_shards_task():
+    """
+    Periodic task to fold the platform and clearing account shards into their headline balances.
+    """
+    for email in (settings.PLATFORM_ACCOUNT_EMAIL, settings.LEDGER_CLEARING_ACCOUNT_EMAIL):
+        try:
+            ledger.roll_up(email)
+        except Exception as e:
+            print(f"An unexpected error occurred while rolling up {email}: {e}")
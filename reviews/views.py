@@ -7,7 +7,7 @@ from accounts.permissions import IsAuthenticated
 from products.models import Product
 from course.models import Course
 from accounts.models import Delivery, Supplier
-from products.views import StandardResultsSetPagination
+from products.pagination import CatalogPagination
 
 class ReviewCreateView(generics.CreateAPIView):
     """
@@ -44,7 +44,9 @@ class ReviewListView(generics.ListAPIView):
     """
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = CatalogPagination
+    keyset_orderings = ('created_at', 'rating')
+    keyset_default_ordering = '-created_at'
 
     def get_queryset(self):
         product_id = self.kwargs.get('product_id')